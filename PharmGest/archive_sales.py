@@ -0,0 +1,24 @@
+import argparse
+from src.pharmgest.config.settings import DIAS_ANTIGUEDAD_ARCHIVO, ARCHIVE_DB_PATH
+from src.pharmgest.database.migrations import upgrade_schema
+from src.pharmgest.services.archive import archive_old_sales, compact_active_db
+
+parser = argparse.ArgumentParser(description="Mueve ventas antiguas al archivo histórico")
+parser.add_argument("--dias", type=int, default=DIAS_ANTIGUEDAD_ARCHIVO,
+                    help=f"Antigüedad mínima en días (por defecto {DIAS_ANTIGUEDAD_ARCHIVO})")
+parser.add_argument("--vacuum", action="store_true",
+                    help="Compactar pharmgest.db al terminar (cerrar todas las cajas antes)")
+args = parser.parse_args()
+
+print(f"🗄️ Archivando ventas con más de {args.dias} días en '{ARCHIVE_DB_PATH}'...")
+try:
+    upgrade_schema()
+    total = archive_old_sales(days=args.dias,
+                              progress_callback=lambda n: print(f"   ... {n} ventas movidas"))
+    print(f"✅ {total} ventas archivadas.")
+    if args.vacuum:
+        print("🧹 Compactando base de datos activa...")
+        compact_active_db()
+        print("✅ Compactación terminada.")
+except Exception as e:
+    print(f"❌ ERROR CRÍTICO: {e}")
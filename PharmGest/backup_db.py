@@ -0,0 +1,26 @@
+import argparse
+from src.pharmgest.config.settings import BACKUP_DIR
+from src.pharmgest.services.backup import run_backup, restore_backup, list_backups
+
+parser = argparse.ArgumentParser(description="Respaldos en línea de PharmGest")
+sub = parser.add_subparsers(dest="comando", required=True)
+sub.add_parser("respaldar", help="Crear un respaldo ahora (se puede usar con la app abierta)")
+sub.add_parser("listar", help="Mostrar los respaldos disponibles")
+p_restore = sub.add_parser("restaurar", help="Restaurar un respaldo (cerrar todas las cajas antes)")
+p_restore.add_argument("carpeta", help=f"Nombre de la carpeta dentro de '{BACKUP_DIR}' (ej: 20260101_120000)")
+args = parser.parse_args()
+
+try:
+    if args.comando == "respaldar":
+        print("💾 Creando respaldo...")
+        folder = run_backup()
+        print(f"✅ Respaldo creado en '{folder}'." if folder else "❌ No se pudo crear el respaldo (ver logs).")
+    elif args.comando == "listar":
+        for name in sorted(list_backups(), reverse=True):
+            print(f"   📁 {name}")
+    else:
+        print(f"♻️ Validando y restaurando '{args.carpeta}'...")
+        restore_backup(f"{BACKUP_DIR}/{args.carpeta}")
+        print("✅ Respaldo restaurado.")
+except Exception as e:
+    print(f"❌ ERROR CRÍTICO: {e}")
@@ -0,0 +1,166 @@
+"""
+Benchmark: cobro mientras corren reportes, con y sin el motor de solo lectura.
+
+Uso (desde la carpeta PharmGest, con una pharmgest.db con datos):
+    python -m benchmarks.bench_analytics
+    python -m benchmarks.bench_analytics --ventas 300 --lectores 4 --dias 60
+
+Trabaja sobre una copia de pharmgest.db y pharmgest_archivo.db en una carpeta
+temporal (la BD real no se toca). Mide la latencia de checkout (venta + commit)
+en tres escenarios:
+
+1. Solo cobro (referencia).
+2. Cobro + historial de ventas en paralelo por el mismo motor (engine).
+3. Cobro + historial en paralelo por analytics_engine (mode=ro, query_only).
+
+--consulta agregado cambia el historial (mucho trabajo en Python, sujeto al
+GIL) por un GROUP BY que corre casi entero dentro de SQLite: así se ve la
+competencia por la BD sin el ruido del intérprete.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+DB_FILES = ["pharmgest.db", "pharmgest_archivo.db"]
+
+AGGREGATE_SQL = """SELECT d.product_id, SUM(d.quantity), SUM(d.subtotal)
+    FROM all_sale_details d JOIN all_sales s ON s.id = d.sale_id
+    WHERE s.date >= ? GROUP BY d.product_id"""
+
+
+def copy_databases(folder):
+    """Copia consistente con la API de backup de SQLite (funciona con la BD abierta)"""
+    for name in DB_FILES:
+        if not os.path.exists(name):
+            continue
+        source = sqlite3.connect(name)
+        target = sqlite3.connect(os.path.join(folder, name))
+        with target:
+            source.backup(target)
+        source.close()
+        target.close()
+
+
+def checkout_times(engine, line, count):
+    """Registra `count` ventas de una línea; retorna la latencia de cada una en ms"""
+    from sqlalchemy.orm import Session
+    from src.pharmgest.services import SalesService
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        with Session(engine) as session:
+            SalesService(session).checkout([line])
+            session.commit()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def run_scenario(label, write_engine, read_engine, line, sales, readers, date_from, query):
+    from sqlalchemy.orm import Session
+    from src.pharmgest.services import ReportService
+    stop = threading.Event()
+    reports = []
+
+    def report_loop():
+        while not stop.is_set():
+            if query == "agregado":
+                with read_engine.connect() as conn:
+                    conn.exec_driver_sql(AGGREGATE_SQL, (date_from,)).fetchall()
+            else:
+                with Session(read_engine) as session:
+                    ReportService(session).sales_history(date_from)
+            reports.append(1)
+
+    threads = [threading.Thread(target=report_loop, daemon=True) for _ in range(readers if read_engine else 0)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    try:
+        times = checkout_times(write_engine, line, sales)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    times.sort()
+    median = statistics.median(times)
+    p95 = times[int(len(times) * 0.95) - 1]
+    print(f"  {label:<38} mediana {median:8.2f} ms   p95 {p95:8.2f} ms   "
+          f"reportes {len(reports):>4} ({len(reports) / elapsed:5.1f}/s)")
+    return median, p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cobro en paralelo con reportes: motor compartido vs solo lectura")
+    parser.add_argument("--ventas", type=int, default=200, help="Ventas registradas por escenario")
+    parser.add_argument("--lectores", type=int, default=3, help="Hilos generando el historial en paralelo")
+    parser.add_argument("--dias", type=int, default=30, help="Días de historial por reporte")
+    parser.add_argument("--consulta", choices=["historial", "agregado"], default="historial",
+                        help="Trabajo de los hilos de reportes")
+    args = parser.parse_args()
+
+    if not os.path.exists("pharmgest.db"):
+        raise FileNotFoundError("No se encontró pharmgest.db en la carpeta actual")
+
+    original = os.getcwd()
+    folder = tempfile.mkdtemp(prefix="pharmgest_bench_")
+    try:
+        copy_databases(folder)
+        # DB_PATH es relativo: los motores se conectan a la copia
+        os.chdir(folder)
+        from sqlalchemy import select, func, update
+        from sqlalchemy.orm import Session
+        from src.pharmgest.config.database import engine, analytics_engine
+        from src.pharmgest.database.migrations import upgrade_schema
+        from src.pharmgest.database.models import Product, ProductBatch, all_sales
+        from src.pharmgest.services import SalesService
+        upgrade_schema()
+
+        with Session(engine) as session:
+            product = session.execute(select(Product).order_by(Product.id).limit(1)).scalar_one_or_none()
+            if product is None:
+                raise LookupError("La base de datos no tiene productos")
+            # Stock de sobra en la copia para que ninguna venta falle
+            session.execute(update(ProductBatch).where(ProductBatch.product_id == product.id)
+                            .values(stock=ProductBatch.stock + 10 ** 7))
+            product.total_stock = 10 ** 8
+            session.commit()
+            line = SalesService.build_line(product, 1, box_mode=not product.is_fractionable)
+            last_sale = session.execute(select(func.max(all_sales.c.date))).scalar()
+        if last_sale is None:
+            raise LookupError("La base de datos no tiene ventas para los reportes")
+        date_from = last_sale - timedelta(days=args.dias)
+        with Session(analytics_engine) as session:
+            sample = session.execute(select(func.count()).select_from(all_sales)
+                                     .where(all_sales.c.date >= date_from)).scalar()
+
+        print(f"📊 {args.ventas} ventas por escenario, {args.lectores} hilos de reportes, "
+              f"{sample:,} ventas por reporte ({args.dias} días, {args.consulta})\n")
+        checkout_times(engine, line, 10)  # calentamiento
+        base, _ = run_scenario("Solo cobro", engine, None, line, args.ventas, 0, date_from, args.consulta)
+        shared, _ = run_scenario("Cobro + reportes (mismo motor)", engine, engine,
+                                 line, args.ventas, args.lectores, date_from, args.consulta)
+        separate, _ = run_scenario("Cobro + reportes (motor solo lectura)", engine, analytics_engine,
+                                   line, args.ventas, args.lectores, date_from, args.consulta)
+
+        print(f"\n  Sobrecosto del cobro: mismo motor {shared / base:4.2f}x, "
+              f"solo lectura {separate / base:4.2f}x (mediana contra referencia)")
+        engine.dispose()
+        analytics_engine.dispose()
+    finally:
+        os.chdir(original)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO: {e}")
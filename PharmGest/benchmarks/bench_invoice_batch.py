@@ -0,0 +1,55 @@
+"""
+Benchmark: regeneración masiva de facturas (facturas/s) con distinta
+cantidad de procesos, y el pase siguiente que salta las que ya están al día.
+
+Uso (desde la carpeta PharmGest):
+    python -m benchmarks.bench_invoice_batch
+    python -m benchmarks.bench_invoice_batch --ventas 20000 --procesos 1 2 4 8
+
+Crea una base de datos sintética en una carpeta temporal (la BD real no se
+toca); las facturas se escriben en facturas/ dentro de esa carpeta.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Facturas por segundo al regenerar en masa")
+    parser.add_argument("--ventas", type=int, default=5000)
+    parser.add_argument("--productos", type=int, default=2000)
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument("--lote", type=int, default=100, help="Ventas por tanda")
+    args = parser.parse_args()
+
+    original = os.getcwd()
+    folder = tempfile.mkdtemp(prefix="pharmgest_bench_")
+    try:
+        # DB_PATH e INVOICE_DIR son relativos: todo queda en la carpeta temporal
+        os.chdir(folder)
+        from benchmarks.bench_z_report import build_database
+        build_database(args.productos, args.ventas, 1, 0)
+        print(f"📊 {args.ventas:,} ventas, núcleos: {os.cpu_count()}\n")
+
+        from src.pharmgest.config.database import engine
+        from src.pharmgest.services.invoice_batch import regenerate_invoices
+        for processes in sorted(set(args.procesos)):
+            result = regenerate_invoices(force=True, processes=processes, chunk_size=args.lote)
+            print(f"  {processes:>2} proceso(s)  {result['rendered']:>7,} facturas en {result['seconds']:6.1f} s"
+                  f"   {result['per_second']:7.1f} facturas/s")
+
+        result = regenerate_invoices(processes=1, chunk_size=args.lote)
+        print(f"\n  Pase sin cambios: {result['skipped']:,} al día, {result['rendered']} regeneradas "
+              f"en {result['seconds']:.2f} s")
+        engine.dispose()
+    finally:
+        os.chdir(original)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO: {e}")
@@ -0,0 +1,280 @@
+"""
+Prueba de carga: N cajas cobrando a la vez sobre el mismo pharmgest.db.
+
+Uso (desde la carpeta PharmGest):
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --cajas 1 2 4 8 16 --duracion 30 --pensar 0.5 --entre-ventas 2
+    python -m benchmarks.bench_load --carpeta Z:/farmacia --factura archivo
+
+Crea una base de datos sintética (en una carpeta temporal, o en --carpeta
+para probar una unidad de red) y, para cada cantidad de cajas, lanza un
+proceso por caja. Cada proceso hace lo mismo que el POS: busca productos
+por nombre, los carga y arma la línea del carrito, guarda la venta en su
+cola local con el NCF de su bloque, genera el ticket, la envía a la BD principal (checkout con FEFO
++ commit, SaleQueue.replay) y genera la factura. Entre producto y producto
+y entre venta y venta "piensa" (--pensar, --entre-ventas: promedio en
+segundos, ±50%).
+
+Por cada paso informa ventas por segundo, percentiles del cobro (desde que
+se guarda en la cola hasta la factura), percentiles de la búsqueda, esperas
+por el candado de escritura y ventas reintentadas (la BD siguió bloqueada
+después del busy_timeout y quedaron en cola) o fallidas.
+
+Para contar las esperas, las transacciones de escritura empiezan con BEGIN
+IMMEDIATE: primero sin esperar y, si el candado está tomado, otra vez con
+el busy_timeout normal de la conexión. El candado se toma al empezar la
+transacción (en la app, en el primer INSERT): una consulta antes.
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+import multiprocessing
+
+from benchmarks.bench_search import DRUGS, FORMS, BRANDS
+
+STRENGTHS = [5, 10, 20, 50, 100, 250, 500]
+RETRY_PAUSE = 0.25   # Segundos entre envíos de una venta que quedó en cola (el POS usa COLA_REINTENTO_SEG)
+WARMUP_TIMEOUT = 300  # Segundos que se espera a que todas las cajas estén listas
+
+
+def build_database(products):
+    from sqlalchemy import insert
+    from src.pharmgest.config.database import engine, get_db_session
+    from src.pharmgest.config.settings import NCF_PREFIJO
+    from src.pharmgest.database.migrations import upgrade_schema
+    from src.pharmgest.database.models import Product, ProductBatch
+    from src.pharmgest.services.ncf import add_sequence
+    upgrade_schema()
+    rng = random.Random(42)
+    now = datetime.now()
+    rows, batches = [], []
+    for i in range(1, products + 1):
+        fractionable = i % 4 == 0
+        price = round(rng.uniform(50, 1500), 2)
+        # Stock de sobra: ninguna venta debe fallar por falta de stock
+        rows.append({"id": i, "sku": f"77{i:011d}", "price": price, "cost": round(price * 0.6, 2),
+                     "name": (f"{rng.choice(DRUGS)} {rng.choice(STRENGTHS)}mg {rng.choice(FORMS)} "
+                              f"x {rng.choice([10, 20, 30, 100])} {rng.choice(BRANDS)}"),
+                     "box_price": price, "unit_price": round(price / 10, 2), "is_fractionable": fractionable,
+                     "units_per_box": 10 if fractionable else 1, "total_stock": 3 * 10 ** 6})
+        for n in range(3):
+            batches.append({"product_id": i, "batch_code": f"L-{i}-{n}", "stock": 10 ** 6, "entry_date": now,
+                            "expiry_date": now + timedelta(days=rng.randint(30, 900))})
+    with engine.begin() as conn:
+        conn.execute(insert(Product), rows)
+        conn.execute(insert(ProductBatch), batches)
+    # Secuencia de NCF: las cajas reservan bloques como en producción
+    with get_db_session() as session:
+        add_sequence(session, NCF_PREFIJO, 1, 10 ** 7, (now + timedelta(days=365)).date())
+    engine.dispose()
+
+
+def watch_locks(engine, stats):
+    """Transacciones con BEGIN IMMEDIATE que cuentan las esperas por el candado de escritura"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def manual_begin(dbapi_connection, record):
+        record.info["busy_timeout"] = dbapi_connection.execute("PRAGMA busy_timeout").fetchone()[0]
+        dbapi_connection.isolation_level = None  # El BEGIN lo emite begin_immediate
+
+    @event.listens_for(engine, "begin")
+    def begin_immediate(conn):
+        driver = conn.connection.dbapi_connection
+        try:
+            driver.execute("PRAGMA busy_timeout = 0")
+            driver.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError:
+            pass  # Otra caja está escribiendo
+        finally:
+            driver.execute(f"PRAGMA busy_timeout = {conn.connection.info['busy_timeout']}")
+        stats["lock_waits"] += 1
+        start = time.perf_counter()
+        try:
+            # Si vence el busy_timeout, OperationalError: replay() deja la venta en cola
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        finally:
+            stats["lock_wait_ms"] += (time.perf_counter() - start) * 1000
+
+
+def pause(rng, seconds):
+    if seconds > 0:
+        time.sleep(seconds * rng.uniform(0.5, 1.5))
+
+
+def run_lane(lane, lanes, folder, root, args, barrier, results):
+    """Una caja: cobra ventas durante args.duracion segundos y envía sus números a `results`"""
+    stats = {"lane": lane, "sales": 0, "checkout_ms": [], "search_ms": [], "lock_waits": 0,
+             "lock_wait_ms": 0.0, "retried": 0, "failed": 0, "conflicts": 0, "elapsed": 0.0, "error": None}
+    try:
+        sys.path.insert(0, root)
+        # DB_PATH es relativo: todas las cajas abren el mismo archivo
+        os.chdir(folder)
+        from src.pharmgest.config.database import engine, get_db_session, get_read_session
+        from src.pharmgest.database.models import Product
+        from src.pharmgest.services import SalesService
+        from src.pharmgest.services.invoice import generate_invoice_pdf
+        from src.pharmgest.services.receipt import render_receipt
+        from src.pharmgest.services.sale_queue import SaleQueue
+
+        watch_locks(engine, stats)
+        queue = SaleQueue(path=os.path.join(folder, f"cola_{lanes}_{lane}.db"), terminal_id=f"CAJA-{lanes}-{lane:02d}")
+        rng = random.Random(lanes * 1000 + lane)
+        with get_read_session() as session:
+            SalesService(session).search_products(DRUGS[0])  # Arma el índice de búsqueda de esta caja
+        with get_db_session() as session:
+            queue.sync_ncf(session)  # Primer bloque de NCF, como el POS al iniciar
+    except Exception as e:
+        stats["error"] = f"caja {lane}: {e}"
+        barrier.abort()
+        results.put(stats)
+        return
+
+    try:
+        barrier.wait(WARMUP_TIMEOUT)
+        start = time.perf_counter()
+        end = start + args.duracion
+        while time.perf_counter() < end:
+            pause(rng, args.entre_ventas)
+            cart = []
+            for _ in range(rng.randint(1, args.productos_por_venta)):
+                pause(rng, args.pensar)
+                began = time.perf_counter()
+                with get_read_session() as session:
+                    text = f"{rng.choice(DRUGS)} {rng.choice(STRENGTHS)}"
+                    rows = SalesService(session).search_products(text)[:10]
+                    product = session.get(Product, rng.choice(rows).id) if rows else None
+                if product is not None:
+                    cart.append(SalesService.build_line(product, rng.randint(1, 2)))
+                stats["search_ms"].append((time.perf_counter() - began) * 1000)
+            if not cart:
+                continue
+
+            began = time.perf_counter()
+            entry = queue.enqueue(cart)
+            render_receipt(entry["number"], entry["items"], entry["total"], sale_date=entry["created_at"],
+                           ncf=entry["ncf"])
+            attempts = 0
+            while True:
+                attempts += 1
+                with get_db_session() as session:
+                    result = queue.replay(session)
+                if not result["pending"] or time.perf_counter() - began > args.espera:
+                    break
+                time.sleep(RETRY_PAUSE)
+            if attempts > 1:
+                stats["retried"] += 1
+            stats["failed"] += len(result["failed"]) + result["pending"]
+            stats["conflicts"] += len(result["conflicts"])
+            for done in result["sent"] + result["conflicts"]:
+                if args.factura == "memoria":
+                    generate_invoice_pdf(done["sale_id"], done["items"], done["total"],
+                                         sale_date=done["created_at"], target=BytesIO(), ncf=done["ncf"])
+                elif args.factura == "archivo":
+                    generate_invoice_pdf(done["sale_id"], done["items"], done["total"], sale_date=done["created_at"],
+                                         ncf=done["ncf"])
+                stats["sales"] += 1
+            stats["checkout_ms"].append((time.perf_counter() - began) * 1000)
+        stats["elapsed"] = time.perf_counter() - start
+    except Exception as e:
+        stats["error"] = f"caja {lane}: {e}"
+    results.put(stats)
+
+
+def percentile(values, fraction):
+    """Percentil por rango más cercano (`values` ordenados)"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def run_step(ctx, lanes, folder, args):
+    barrier = ctx.Barrier(lanes + 1)
+    results = ctx.Queue()
+    root = os.getcwd()
+    processes = [ctx.Process(target=run_lane, args=(lane, lanes, folder, root, args, barrier, results))
+                 for lane in range(1, lanes + 1)]
+    for process in processes:
+        process.start()
+    stats = []
+    try:
+        barrier.wait(WARMUP_TIMEOUT)
+    except Exception:
+        pass  # Una caja no arrancó: su error llega por `results`
+    for _ in processes:
+        stats.append(results.get())
+    for process in processes:
+        process.join()
+
+    errors = [s["error"] for s in stats if s["error"]]
+    if errors:
+        raise RuntimeError("; ".join(errors))
+
+    checkout = sorted(ms for s in stats for ms in s["checkout_ms"])
+    search = sorted(ms for s in stats for ms in s["search_ms"])
+    sales = sum(s["sales"] for s in stats)
+    elapsed = max(s["elapsed"] for s in stats) or 1
+    print(f"  {lanes:>5} {sales:>7} {sales / elapsed:>9.2f}  "
+          f"{percentile(checkout, 0.5):>7.1f} {percentile(checkout, 0.95):>7.1f} {percentile(checkout, 0.99):>7.1f} "
+          f"{(checkout[-1] if checkout else 0):>8.1f}  {percentile(search, 0.95):>8.1f}  "
+          f"{sum(s['lock_waits'] for s in stats):>7} {sum(s['lock_wait_ms'] for s in stats):>9.0f}  "
+          f"{sum(s['retried'] for s in stats):>6} {sum(s['failed'] for s in stats):>7}")
+    return sales / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga: varias cajas cobrando sobre la misma BD")
+    parser.add_argument("--cajas", type=int, nargs="+", default=[1, 2, 4, 8], help="Cantidades de cajas a probar")
+    parser.add_argument("--duracion", type=float, default=20, help="Segundos de cobro por cantidad de cajas")
+    parser.add_argument("--pensar", type=float, default=0.2, help="Segundos promedio entre producto y producto")
+    parser.add_argument("--entre-ventas", type=float, default=1.0, help="Segundos promedio entre venta y venta")
+    parser.add_argument("--productos-por-venta", type=int, default=4, help="Máximo de productos por venta")
+    parser.add_argument("--factura", choices=["memoria", "archivo", "ninguna"], default="memoria",
+                        help="memoria: PDF en memoria | archivo: PDF en facturas/ + índice | ninguna")
+    parser.add_argument("--espera", type=float, default=30,
+                        help="Segundos que una venta puede quedar en cola antes de contarla como fallida")
+    parser.add_argument("--productos", type=int, default=5000)
+    parser.add_argument("--carpeta", help="Carpeta donde crear la BD compartida (por defecto, una temporal)")
+    args = parser.parse_args()
+
+    original = os.getcwd()
+    folder = args.carpeta or tempfile.mkdtemp(prefix="pharmgest_bench_")
+    try:
+        os.makedirs(folder, exist_ok=True)
+        if os.path.exists(os.path.join(folder, "pharmgest.db")):
+            raise FileExistsError(f"{folder} ya tiene un pharmgest.db: use una carpeta vacía")
+        os.chdir(folder)
+        build_database(args.productos)
+        os.chdir(original)
+
+        print(f"📊 {args.productos:,} productos, {args.duracion:g} s por paso, pensar {args.pensar:g} s, "
+              f"entre ventas {args.entre_ventas:g} s, factura {args.factura}\n")
+        print("                            cobro (ms)                    búsqueda   esperas por bloqueo")
+        print("  cajas  ventas  ventas/s      p50     p95     p99      máx    p95 ms  cant.   total ms  "
+              "reint. fallidas")
+        # spawn: cada caja es un proceso nuevo, sin conexiones heredadas
+        ctx = multiprocessing.get_context("spawn")
+        baseline = None
+        for lanes in args.cajas:
+            rate = run_step(ctx, lanes, folder, args)
+            baseline = baseline or rate / lanes
+        print(f"\n  Ventas/s por caja con 1 caja: {baseline:.2f} (lo que permiten las pausas y el cobro)")
+    finally:
+        os.chdir(original)
+        if not args.carpeta:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO: {e}")
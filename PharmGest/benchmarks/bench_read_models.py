@@ -0,0 +1,117 @@
+"""
+Benchmark: listas de solo lectura con filas livianas (namedtuple, Core)
+contra entidades ORM completas, en tiempo y en memoria (tracemalloc).
+
+Uso (desde la carpeta PharmGest):
+    python -m benchmarks.bench_read_models
+    python -m benchmarks.bench_read_models --productos 50000 --lotes 200000
+
+Crea una base de datos sintética en una carpeta temporal (la BD real no se
+toca). Cada variante abre y cierra su propia sesión, como una tarea del
+ejecutor; la memoria es la que queda ocupada por el resultado y el pico
+durante la carga.
+"""
+import argparse
+import gc
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+def build_database(products, batches):
+    from sqlalchemy import insert
+    from src.pharmgest.config.database import engine
+    from src.pharmgest.database.migrations import upgrade_schema
+    from src.pharmgest.database.models import Product, ProductBatch
+    upgrade_schema()
+    rng = random.Random(42)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"id": i, "sku": f"SKU{i:07d}", "name": f"Producto de prueba {i}", "price": round(rng.uniform(50, 2000), 2),
+             "total_stock": rng.randint(0, 500), "is_fractionable": i % 3 == 0, "units_per_box": 10 if i % 3 == 0 else 1}
+            for i in range(1, products + 1)
+        ])
+        for start in range(0, batches, 50000):
+            conn.execute(insert(ProductBatch), [
+                {"product_id": rng.randint(1, products), "batch_code": f"L-{n}", "stock": rng.randint(0, 200),
+                 "expiry_date": now + timedelta(days=rng.randint(-60, 730)), "entry_date": now}
+                for n in range(start, min(start + 50000, batches))
+            ])
+
+
+def in_session(func):
+    from src.pharmgest.config.database import get_read_session
+    def run():
+        with get_read_session() as session:
+            return func(session)
+    return run
+
+
+def measure(label, func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f"  {label:<34} {statistics.median(times):8.1f} ms   retenida {(retained - before) / 2**20:7.1f} MB"
+          f"   pico {(peak - before) / 2**20:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filas livianas vs entidades ORM en las listas")
+    parser.add_argument("--productos", type=int, default=50000)
+    parser.add_argument("--lotes", type=int, default=200000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    original = os.getcwd()
+    folder = tempfile.mkdtemp(prefix="pharmgest_bench_")
+    try:
+        # DB_PATH es relativo: la BD sintética se crea en la carpeta temporal
+        os.chdir(folder)
+        build_database(args.productos, args.lotes)
+        print(f"📊 {args.productos:,} productos, {args.lotes:,} lotes\n")
+
+        from sqlalchemy import select
+        from src.pharmgest.config.database import engine
+        from src.pharmgest.database.models import Product, ProductBatch
+        from src.pharmgest.services.inventory import InventoryService
+        from src.pharmgest.services.read_models import PRODUCT_LIST_COLUMNS, BATCH_LIST_COLUMNS, BatchRow, fetch
+        repeat = args.repeticiones
+
+        print("🗂️ Tabla de inventario (todo el catálogo)")
+        measure("ORM session.query(Product)", in_session(lambda s: s.query(Product).all()), repeat)
+        measure("Core, filas Row", in_session(lambda s: s.execute(select(*PRODUCT_LIST_COLUMNS)).all()), repeat)
+        measure("ProductRow (read model)", in_session(lambda s: InventoryService(s).product_list()), repeat)
+
+        print("\n📅 Lotes (todos, por vencimiento)")
+        by_expiry = lambda entity: select(entity).order_by(ProductBatch.expiry_date)
+        measure("ORM select(ProductBatch)", in_session(lambda s: s.execute(by_expiry(ProductBatch)).scalars().all()),
+                repeat)
+        measure("BatchRow (read model)", in_session(lambda s: fetch(
+            s, BatchRow, select(*BATCH_LIST_COLUMNS).order_by(ProductBatch.expiry_date))), repeat)
+        engine.dispose()
+    finally:
+        os.chdir(original)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO: {e}")
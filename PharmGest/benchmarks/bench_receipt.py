@@ -0,0 +1,120 @@
+"""
+Benchmark: ticket ESC/POS contra factura PDF (ReportLab).
+
+Uso (desde la carpeta PharmGest):
+    python -m benchmarks.bench_receipt
+    python -m benchmarks.bench_receipt --items 40 --repeticiones 500
+
+Mide el render en memoria de ambos formatos, el PDF guardado en disco y el
+envío del ticket a un receptor TCP local que hace de impresora de red.
+"""
+import argparse
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from io import BytesIO
+from src.pharmgest.services.invoice import generate_invoice_pdf
+from src.pharmgest.services.receipt import render_receipt, FileSink, TcpSink
+
+
+def sample_items(count):
+    return [{
+        "qty": (i % 3) + 1,
+        "name": f"Producto de prueba número {i} (UNIDAD)",
+        "price": 125.50 + i,
+        "subtotal": ((i % 3) + 1) * (125.50 + i),
+    } for i in range(count)]
+
+
+def measure(label, func, repeat):
+    """Ejecuta func `repeat` veces y muestra mediana y p95 en milisegundos"""
+    func()  # calentamiento (imports, cachés de fuentes)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    median = statistics.median(times)
+    p95 = times[int(len(times) * 0.95) - 1]
+    print(f"  {label:<34} mediana {median:9.4f} ms   p95 {p95:9.4f} ms")
+    return median
+
+
+def start_printer_stand_in():
+    """Receptor TCP local que acepta trabajos como una impresora en el puerto 9100"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    received = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                chunks = []
+                while True:
+                    data = conn.recv(65536)
+                    if not data:
+                        break
+                    chunks.append(data)
+                received.append(b"".join(chunks))
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ticket ESC/POS vs factura PDF")
+    parser.add_argument("--items", type=int, default=8, help="Líneas por venta")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    items = sample_items(args.items)
+    total = sum(item["subtotal"] for item in items)
+    repeat = args.repeticiones
+    print(f"📊 {args.items} líneas por venta, {repeat} repeticiones\n")
+
+    def pdf_in_memory():
+        generate_invoice_pdf(1, items, total, target=BytesIO())
+
+    ticket_ms = measure("Ticket ESC/POS (bytes en memoria)",
+                        lambda: render_receipt(1, items, total, amount_paid=total, change=0), repeat)
+    pdf_ms = measure("Factura PDF (BytesIO)", pdf_in_memory, repeat)
+
+    with tempfile.TemporaryDirectory() as folder:
+        pdf_path = os.path.join(folder, "factura.pdf")
+        measure("Factura PDF (archivo en disco)",
+                lambda: generate_invoice_pdf(1, items, total, target=pdf_path), repeat)
+        sink = FileSink(folder)
+        measure("Ticket + FileSink",
+                lambda: sink.send(1, render_receipt(1, items, total)), repeat)
+
+    server, received = start_printer_stand_in()
+    try:
+        tcp = TcpSink("127.0.0.1", server.getsockname()[1])
+        measure("Ticket + TcpSink (impresora local)",
+                lambda: tcp.send(1, render_receipt(1, items, total)), repeat)
+    finally:
+        server.close()
+
+    size = len(render_receipt(1, items, total))
+    buffer = BytesIO()
+    generate_invoice_pdf(1, items, total, target=buffer)
+    print(f"\n  Tamaño: ticket {size:,} bytes, PDF {len(buffer.getvalue()):,} bytes")
+    print(f"  El ticket es {pdf_ms / ticket_ms:,.0f}x más rápido que el PDF en memoria")
+    print(f"  Trabajos recibidos por la impresora de prueba: {len(received)}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO: {e}")
@@ -0,0 +1,119 @@
+"""
+Benchmark: búsqueda de productos con el índice de trigramas contra ILIKE '%texto%'.
+
+Uso (desde la carpeta PharmGest):
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --productos 50000
+
+Crea una base de datos sintética en una carpeta temporal (la BD real no se
+toca) con nombres de medicamentos con tildes, concentraciones y
+presentaciones, y busca como escribe el cajero: sin tildes, con errores de
+tipeo, por parte del SKU.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+DRUGS = ["Acetaminofén", "Ibuprofeno", "Amoxicilina", "Loratadina", "Omeprazol", "Metformina",
+         "Losartán", "Diclofenaco", "Cetirizina", "Salbutamol", "Ácido Fólico", "Azitromicina",
+         "Ciprofloxacino", "Clotrimazol", "Dexametasona", "Enalapril", "Fluconazol", "Naproxeno",
+         "Paracetamol Pediátrico", "Vitamina C Efervescente", "Sulfato Ferroso", "Ranitidina",
+         "Metronidazol", "Atorvastatina", "Prednisona", "Ketorolaco", "Dipirona Sódica", "Clonazepam"]
+FORMS = ["Tabletas", "Cápsulas", "Jarabe", "Suspensión", "Gotas", "Crema", "Inyectable", "Ampollas"]
+BRANDS = ["Genfar", "MK", "La Santé", "Bayer", "Pfizer", "Tecnoquímicas", "Sanofi", "Abbott", "Roemmers"]
+
+# (texto escrito, lo que debería encontrar en el nombre)
+QUERIES = [
+    ("acetaminofen", "Acetaminofén"),
+    ("acetaminofem 500", "Acetaminofén"),
+    ("ibuprofeno capsulas", "Ibuprofeno"),
+    ("amoxicilna", "Amoxicilina"),
+    ("losartan", "Losartán"),
+    ("suspencion", "Suspensión"),
+    ("acido folico", "Ácido Fólico"),
+    ("la sante", "La Santé"),
+]
+
+
+def build_database(products):
+    from sqlalchemy import insert
+    from src.pharmgest.config.database import engine
+    from src.pharmgest.database.migrations import upgrade_schema
+    from src.pharmgest.database.models import Product
+    upgrade_schema()
+    rng = random.Random(42)
+    rows = []
+    for i in range(1, products + 1):
+        name = (f"{rng.choice(DRUGS)} {rng.choice([5, 10, 20, 50, 100, 250, 500])}mg "
+                f"{rng.choice(FORMS)} x {rng.choice([10, 20, 30, 100])} {rng.choice(BRANDS)}")
+        rows.append({"id": i, "sku": f"77{i:011d}", "name": name, "price": 100.0})
+    with engine.begin() as conn:
+        conn.execute(insert(Product), rows)
+
+
+def ilike_search(session, text):
+    """La búsqueda anterior: subcadena exacta, sensible a tildes"""
+    from sqlalchemy import select
+    from src.pharmgest.database.models import Product
+    return session.execute(select(Product.id, Product.name).where(
+        Product.name.ilike(f"%{text}%") | Product.sku.ilike(f"%{text}%"))).all()
+
+
+def measure(label, func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000)
+    print(f"  {label:<28} mediana {statistics.median(times):8.2f} ms   máximo {max(times):8.2f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Búsqueda por trigramas vs ILIKE")
+    parser.add_argument("--productos", type=int, default=50000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    original = os.getcwd()
+    folder = tempfile.mkdtemp(prefix="pharmgest_bench_")
+    try:
+        # DB_PATH es relativo: la BD sintética se crea en la carpeta temporal
+        os.chdir(folder)
+        build_database(args.productos)
+        print(f"📊 {args.productos:,} productos\n")
+
+        from src.pharmgest.config.database import engine, get_read_session
+        from src.pharmgest.services.product_search import get_search_index
+        from src.pharmgest.services.sales import SalesService
+        index = get_search_index()
+
+        with get_read_session() as session:
+            measure("Construir índice", lambda: index.build(session), 1)
+            print()
+            middle = f"77{args.productos // 2:011d}"
+            for text, expected in QUERIES + [(middle, ""), (middle[-6:], "")]:
+                print(f"🔍 '{text}'")
+                measure("Trigramas (solo índice)", lambda: index.search(text), args.repeticiones)
+                rows = measure("Búsqueda del POS completa", lambda: SalesService(session).search_products(text),
+                               args.repeticiones)
+                old = measure("ILIKE '%texto%'", lambda: ilike_search(session, text), args.repeticiones)
+                found = sum(expected in row.name for row in rows)
+                print(f"  → {len(rows)} resultados ({found} con '{expected}'; primero: {rows[0].name if rows else '-'}) "
+                      f"· ILIKE: {len(old)}\n")
+        engine.dispose()
+    finally:
+        os.chdir(original)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO: {e}")
@@ -0,0 +1,121 @@
+"""
+Benchmark: valoración de inventario en SQL contra recorrer Product/ProductBatch con el ORM.
+
+Uso (desde la carpeta PharmGest):
+    python -m benchmarks.bench_valuation
+    python -m benchmarks.bench_valuation --lotes 200000 --productos 20000
+
+Crea una base de datos sintética en una carpeta temporal (la BD real no se
+toca) con categorías, productos fraccionables y no fraccionables y lotes con
+vencimientos repartidos entre vencidos y dentro de dos años.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def build_database(products, batches):
+    from sqlalchemy import insert
+    from src.pharmgest.config.database import engine
+    from src.pharmgest.database.migrations import upgrade_schema
+    from src.pharmgest.database.models import Category, Product, ProductBatch
+    upgrade_schema()
+    rng = random.Random(42)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(Category), [{"name": f"Categoría {i}"} for i in range(1, 21)])
+        rows = []
+        for i in range(1, products + 1):
+            fractionable = i % 3 == 0
+            units = rng.choice([10, 20, 30]) if fractionable else 1
+            price = round(rng.uniform(50, 2000), 2)
+            rows.append({"id": i, "sku": f"SKU{i:07d}", "name": f"Producto {i}", "price": price,
+                         "box_price": price if fractionable else 0, "unit_price": round(price / units * 1.2, 2),
+                         "cost": round(price * 0.6, 2), "is_fractionable": fractionable, "units_per_box": units,
+                         "category_id": rng.randint(1, 20) if i % 10 else None})
+        conn.execute(insert(Product), rows)
+        for start in range(0, batches, 50000):
+            conn.execute(insert(ProductBatch), [
+                {"product_id": rng.randint(1, products), "batch_code": f"L-{n}", "stock": rng.randint(0, 200),
+                 "expiry_date": now + timedelta(days=rng.randint(-60, 730)), "entry_date": now}
+                for n in range(start, min(start + 50000, batches))
+            ])
+
+
+def orm_valuation(session):
+    """Lo que habría que hacer sin la consulta agregada: recorrer cada lote en Python"""
+    from sqlalchemy.orm import selectinload
+    from src.pharmgest.database.models import Product
+    cost = retail = 0.0
+    for product in session.query(Product).options(selectinload(Product.batches)):
+        for batch in product.batches:
+            if product.is_fractionable and product.units_per_box > 1:
+                cost += batch.stock * (product.cost or 0) / product.units_per_box
+                boxes, loose = divmod(batch.stock, product.units_per_box)
+                retail += boxes * (product.box_price or 0) + loose * (product.unit_price or 0)
+            else:
+                cost += batch.stock * (product.cost or 0)
+                retail += batch.stock * product.price
+    return cost, retail
+
+
+def measure(label, func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000)
+    print(f"  {label:<36} mediana {statistics.median(times):9.1f} ms   mínimo {min(times):9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valoración de inventario: SQL agregado vs ORM")
+    parser.add_argument("--lotes", type=int, default=200000)
+    parser.add_argument("--productos", type=int, default=20000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    original = os.getcwd()
+    folder = tempfile.mkdtemp(prefix="pharmgest_bench_")
+    try:
+        # DB_PATH es relativo: la BD sintética se crea en la carpeta temporal
+        os.chdir(folder)
+        start = time.perf_counter()
+        build_database(args.productos, args.lotes)
+        print(f"📊 {args.lotes:,} lotes, {args.productos:,} productos "
+              f"(generados en {time.perf_counter() - start:.1f} s)\n")
+
+        from src.pharmgest.config.database import engine, get_read_session
+        from src.pharmgest.services import valuation
+        from src.pharmgest.services.valuation import current_valuation, summarize
+
+        def uncached(session):
+            valuation._live["key"] = None
+            return current_valuation(session)
+
+        with get_read_session() as session:
+            rows = measure("SQL agregado (categoría x tramo)", lambda: uncached(session), args.repeticiones)
+            measure("Repetida sin cambios (caché + huella)", lambda: current_valuation(session),
+                    args.repeticiones)
+            orm = measure("ORM lote por lote", lambda: orm_valuation(session), 1)
+        totals = summarize(rows)
+        print(f"\n  {len(rows)} filas · costo ${totals['costo']:,.2f} · venta ${totals['venta']:,.2f}")
+        print(f"  ORM: costo ${orm[0]:,.2f} · venta ${orm[1]:,.2f}")
+        engine.dispose()
+    finally:
+        os.chdir(original)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO: {e}")
@@ -0,0 +1,150 @@
+"""
+Benchmark: reporte Z de un día con muchos tickets, en tiempo y en memoria
+(pico de tracemalloc), contra el mismo listado armado como una sola tabla
+con todas las filas cargadas.
+
+Uso (desde la carpeta PharmGest):
+    python -m benchmarks.bench_z_report
+    python -m benchmarks.bench_z_report --tickets 5000 --dias 30 --comparar
+
+Crea una base de datos sintética en una carpeta temporal (la BD real no se
+toca): `--dias` días de historial con `--tickets` ventas cada uno, algunas
+anuladas. El reporte es el del último día; los PDF se escriben en memoria.
+"""
+import argparse
+import gc
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from io import BytesIO
+
+
+def build_database(products, tickets, days, void_ratio):
+    from sqlalchemy import insert
+    from src.pharmgest.config.database import engine
+    from src.pharmgest.database.migrations import upgrade_schema
+    from src.pharmgest.database.models import Product, Sale, SaleDetail, SaleVoid
+    upgrade_schema()
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"id": i, "sku": f"SKU{i:07d}", "name": f"Producto de prueba {i}", "price": round(rng.uniform(50, 2000), 2),
+             "cost": round(rng.uniform(20, 1200), 2) if i % 10 else 0, "total_stock": 1000,
+             "is_fractionable": i % 3 == 0, "units_per_box": 10 if i % 3 == 0 else 1}
+            for i in range(1, products + 1)
+        ])
+        first_day = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+        sale_id = 0
+        for day in range(days):
+            opening = first_day + timedelta(days=day)
+            sales, details, voids = [], [], []
+            for n in range(tickets):
+                sale_id += 1
+                date = opening + timedelta(seconds=n * 13 * 3600 / tickets)
+                lines = [(rng.randint(1, products), rng.randint(1, 3), rng.random() < 0.7)
+                         for _ in range(rng.randint(1, 5))]
+                total = 0
+                for product_id, qty, is_box in lines:
+                    price = round(rng.uniform(50, 2000), 2)
+                    total += price * qty
+                    details.append({"sale_id": sale_id, "product_id": product_id, "quantity": qty,
+                                    "unit_price": price, "subtotal": price * qty, "is_box_sale": is_box})
+                sales.append({"id": sale_id, "date": date, "total": round(total, 2),
+                              "payment_method": rng.choice(["EFECTIVO", "EFECTIVO", "TARJETA", "TRANSFERENCIA"]),
+                              "ncf": f"B02{sale_id:08d}"})
+                if rng.random() < void_ratio:
+                    voids.append({"sale_id": sale_id, "voided_at": date + timedelta(minutes=5),
+                                  "reason": "Error de cobro", "user_name": "Admin"})
+            conn.execute(insert(Sale), sales)
+            conn.execute(insert(SaleDetail), details)
+            if voids:
+                conn.execute(insert(SaleVoid), voids)
+    return (first_day + timedelta(days=days - 1)).date()
+
+
+def single_table_report(session, day):
+    """Lo que se evita: todas las filas en memoria y una sola Table que platypus corta página por página"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table
+    from src.pharmgest.services.z_report import SALE_COLUMNS, day_sales
+    rows = [[label for label, _, _ in SALE_COLUMNS]] + [
+        [f"{s.date:%H:%M}", f"#{s.id}", s.ncf or "", s.payment_method or "", str(s.items),
+         f"${s.total:,.2f}", f"${s.margin:,.2f}", "ANULADA" if s.voided else ""]
+        for s in day_sales(session, day)
+    ]
+    target = BytesIO()
+    SimpleDocTemplate(target, pagesize=letter).build(
+        [Table(rows, colWidths=[width for _, width, _ in SALE_COLUMNS], repeatRows=1)])
+    return target
+
+
+def streamed_report(session, day):
+    from src.pharmgest.services.z_report import write_z_report
+    target = BytesIO()
+    write_z_report(session, day, target)
+    return target
+
+
+def measure(label, func, day, repeat):
+    from src.pharmgest.config.database import get_read_session
+    times = []
+    for _ in range(repeat):
+        with get_read_session() as session:
+            start = time.perf_counter()
+            result = func(session, day)
+            times.append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    tracemalloc.start()
+    with get_read_session() as session:
+        func(session, day)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:<30} {statistics.median(times):8.0f} ms   pico {peak / 2**20:6.1f} MB"
+          f"   PDF {len(result.getvalue()) / 1024:6.0f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporte Z de un día con muchos tickets")
+    parser.add_argument("--tickets", type=int, default=5000, help="Ventas por día")
+    parser.add_argument("--dias", type=int, default=30, help="Días de historial en la BD")
+    parser.add_argument("--productos", type=int, default=5000)
+    parser.add_argument("--anuladas", type=float, default=0.01, help="Fracción de ventas anuladas")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--comparar", action="store_true", help="Medir también una sola tabla con todas las filas")
+    args = parser.parse_args()
+
+    original = os.getcwd()
+    folder = tempfile.mkdtemp(prefix="pharmgest_bench_")
+    try:
+        # DB_PATH es relativo: la BD sintética se crea en la carpeta temporal
+        os.chdir(folder)
+        day = build_database(args.productos, args.tickets, args.dias, args.anuladas)
+        print(f"📊 {args.dias} días x {args.tickets:,} tickets; reporte Z del {day:%d/%m/%Y}\n")
+
+        from src.pharmgest.config.database import engine, get_read_session
+        from src.pharmgest.services.z_report import day_totals
+        with get_read_session() as session:
+            totals = day_totals(session, day)
+        print(f"  {totals['tickets']:,} tickets válidos, {totals['voided']} anuladas, "
+              f"neto ${totals['net']:,.2f}, margen {totals['margin_pct']:.1f}%\n")
+
+        measure("Reporte Z (por tandas)", streamed_report, day, args.repeticiones)
+        if args.comparar:
+            measure("Una sola tabla (todo cargado)", single_table_report, day, args.repeticiones)
+        engine.dispose()
+    finally:
+        os.chdir(original)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO: {e}")
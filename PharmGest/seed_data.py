@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from src.pharmgest.config.database import SessionLocal, engine, Base
 from src.pharmgest.database.models import Product, User, ProductBatch
+from src.pharmgest.services.stock_ledger import record_movements, BATCH_IN
 
 def init_data():
     session = SessionLocal()
@@ -44,6 +45,12 @@ def init_data():
 
     session.add(lote_bueno)
     session.add(lote_casi_vencido)
+
+    # Entradas en el libro de movimientos (el stock a una fecha sale de aquí)
+    record_movements(session, [
+        {"product_id": ibuprofeno.id, "quantity": lote.stock, "reason": BATCH_IN, "reference": lote.batch_code}
+        for lote in (lote_bueno, lote_casi_vencido)
+    ])
     
     session.commit()
     print("✅ Base de datos lista con Lotes.")
@@ -0,0 +1,317 @@
+"""
+Línea de comandos de PharmGest: las mismas operaciones de la caja y del
+inventario, sin interfaz gráfica. Ejecutar desde la carpeta PharmGest:
+
+    python -m src.pharmgest.cli vender 7501031311309:2 7501031311309:3:u
+    python -m src.pharmgest.cli lote 7501031311309 L-2025-X 10 31/12/2026
+    python -m src.pharmgest.cli stock --maximo 5
+    python -m src.pharmgest.cli stock --fecha 31/12/2024
+    python -m src.pharmgest.cli movimientos 7501031311309 --desde 01/12/2024
+    python -m src.pharmgest.cli valoracion --fecha 31/12/2024
+    python -m src.pharmgest.cli reporte --desde 01/01/2025 --hasta 31/01/2025
+    python -m src.pharmgest.cli anular 1532 "Cobro duplicado"
+    python -m src.pharmgest.cli cierre --fecha 31/01/2025
+    python -m src.pharmgest.cli facturas --desde 01/01/2025 --hasta 31/01/2025 --procesos 4
+    python -m src.pharmgest.cli cola --enviar
+    python -m src.pharmgest.cli ncf --agregar B02 1 5000 31/12/2026
+    python -m src.pharmgest.cli ncf --anulados
+    python -m src.pharmgest.cli --sql reporte --detalle      (imprime las consultas SQL al final)
+"""
+import argparse
+import sys
+from datetime import timedelta
+from src.pharmgest.config.database import get_db_session, get_read_session
+from src.pharmgest.database.migrations import upgrade_schema
+from src.pharmgest.services import SalesService, InventoryService, ReportService
+from src.pharmgest.services.inventory import parse_expiry
+
+
+def parse_item(text):
+    """'SKU:CANT' (cajas o unidades si no es fraccionable) o 'SKU:CANT:u' (unidades sueltas)"""
+    parts = text.split(":")
+    if len(parts) not in (2, 3) or (len(parts) == 3 and parts[2].lower() != "u"):
+        raise argparse.ArgumentTypeError(f"Formato inválido: {text!r} (use SKU:CANT o SKU:CANT:u)")
+    try:
+        qty = int(parts[1])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Cantidad inválida en {text!r}")
+    if qty < 1:
+        raise argparse.ArgumentTypeError(f"La cantidad debe ser mayor que cero en {text!r}")
+    return parts[0], qty, len(parts) == 2
+
+
+def parse_date(text):
+    try:
+        return parse_expiry(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: {text!r}")
+
+
+def cmd_vender(args):
+    from src.pharmgest.database.models import Sale
+    from src.pharmgest.services.sale_queue import get_sale_queue
+    queue = get_sale_queue()
+    with get_db_session() as session:
+        queue.sync_ncf(session)
+    with get_db_session() as session:
+        service = SalesService(session)
+        lines = [service.line_for_sku(sku, qty, box_mode) for sku, qty, box_mode in args.items]
+        sale = service.checkout(lines, payment_method=args.pago)
+        # Después del checkout: si faltaba stock no se gastó ningún número
+        ncf = queue.take_ncf()
+        try:
+            session.get(Sale, sale["id"]).ncf = ncf
+            session.commit()
+        except Exception:
+            # La venta no quedó registrada: el número vuelve al bloque (o se informa como anulado)
+            if ncf:
+                queue.return_ncf(ncf, "Venta de la línea de comandos revertida")
+            raise
+    print(f"✅ Venta #{sale['id']} registrada: ${sale['total']:,.2f}" + (f"  NCF {ncf}" if ncf else ""))
+    if args.ticket:
+        from src.pharmgest.services.receipt import print_receipt
+        print_receipt(sale["id"], sale["items"], sale["total"], sale_date=sale["date"], ncf=ncf)
+        print("🧾 Ticket enviado")
+
+
+def cmd_lote(args):
+    with get_db_session() as session:
+        service = InventoryService(session)
+        product = service.product_by_sku(args.sku)
+        if product is None:
+            raise LookupError(f"No existe un producto con SKU {args.sku}")
+        units = service.add_batch(product.id, args.codigo, args.cantidad, args.vence)
+    print(f"✅ Lote {args.codigo} registrado: {units} unidades de {args.sku}")
+
+
+def cmd_stock(args):
+    # --fecha: stock al cierre de ese día, según el libro de movimientos
+    at = args.fecha + timedelta(days=1) if args.fecha else None
+    with get_read_session() as session:
+        rows = InventoryService(session).stock_levels(args.maximo, at)
+    for sku, name, stock in rows:
+        print(f"{sku:<15} {stock:>8}  {name}")
+    print(f"📦 {len(rows)} productos")
+
+
+def cmd_movimientos(args):
+    date_to = args.hasta + timedelta(days=1) if args.hasta else None
+    with get_read_session() as session:
+        service = InventoryService(session)
+        product = service.product_by_sku(args.sku)
+        if product is None:
+            raise LookupError(f"No existe un producto con SKU {args.sku}")
+        rows = service.movements(product.id, args.desde, date_to)
+    for m in rows:
+        print(f"{m.date:%d/%m/%Y %H:%M}  {m.quantity:>+8}  {m.reason:<10} {m.reference or ''}")
+    print(f"📦 {len(rows)} movimientos de {args.sku} (stock actual {product.total_stock})")
+
+
+def cmd_valoracion(args):
+    from src.pharmgest.services.valuation import inventory_valuation, summarize
+    with get_read_session() as session:
+        rows = inventory_valuation(session, args.fecha.date() if args.fecha else None)
+    for row in rows:
+        print(f"{row['categoria']:<25} {row['tramo']:<16} {row['unidades']:>9,}  "
+              f"${row['costo']:>14,.2f}  ${row['venta']:>14,.2f}")
+    totals = summarize(rows)
+    print(f"💰 Costo: ${totals['costo']:,.2f}  Venta: ${totals['venta']:,.2f}  Margen: ${totals['margen']:,.2f}")
+
+
+def cmd_reporte(args):
+    # --hasta es inclusivo: hasta el final de ese día
+    date_to = args.hasta + timedelta(days=1) if args.hasta else None
+    with get_read_session() as session:
+        sales = ReportService(session).sales_history(args.desde, date_to)
+    summary = ReportService.summarize(sales)
+    if args.detalle:
+        for sale in sales:
+            print(f"#{sale.id:<8} {sale.date:%d/%m/%Y %H:%M}  ${sale.total:>10,.2f}  "
+                  f"${sale.profit:>10,.2f}  {'ANULADA ' if sale.voided else ''}{', '.join(sale.items)}")
+    print(f"💰 Venta total: ${summary['total']:,.2f}")
+    print(f"📈 Ganancia:    ${summary['profit']:,.2f}")
+    print(f"🧾 Tickets:     {summary['tickets']}")
+
+
+def cmd_anular(args):
+    with get_db_session() as session:
+        sale = SalesService(session).void_sale(args.venta, args.motivo, args.usuario)
+        total = sale.total
+    print(f"🚫 Venta #{args.venta} anulada (${total:,.2f}); el stock volvió al inventario")
+
+
+def cmd_cierre(args):
+    from datetime import date
+    from src.pharmgest.services.z_report import store_z_report, write_z_report, day_totals
+    day = args.fecha.date() if args.fecha else date.today()
+    if args.salida:
+        with get_read_session() as session:
+            write_z_report(session, day, args.salida)
+        path = args.salida
+    else:
+        path = store_z_report(day)
+    with get_read_session() as session:
+        totals = day_totals(session, day)
+    print(f"🧾 Reporte Z del {day:%d/%m/%Y}: {path}")
+    print(f"💰 Venta neta: ${totals['net']:,.2f} en {totals['tickets']} tickets "
+          f"({totals['voided']} anuladas por ${totals['voided_total']:,.2f})")
+    print(f"📈 Margen:     ${totals['margin']:,.2f} ({totals['margin_pct']:.1f}%)")
+
+
+def cmd_facturas(args):
+    from src.pharmgest.config.settings import FACTURAS_PROCESOS
+    from src.pharmgest.services.invoice_batch import regenerate_invoices
+    if not (args.venta or args.desde or args.hasta or args.todas):
+        raise ValueError("Indique --venta, un rango --desde/--hasta o --todas")
+    date_to = args.hasta + timedelta(days=1) if args.hasta else None
+
+    def progress(result):
+        print(f"📄 {result['rendered']} facturas ({result['per_second']:.0f}/s)", end="\r", flush=True)
+
+    result = regenerate_invoices(args.venta, args.desde, date_to, force=args.forzar,
+                                 processes=FACTURAS_PROCESOS if args.procesos is None else args.procesos,
+                                 progress=progress)
+    print(f"✅ {result['rendered']} facturas regeneradas en {result['seconds']:.1f} s "
+          f"({result['per_second']:.1f} facturas/s)")
+    print(f"⏭️ {result['skipped']} ya estaban al día" + (f", {result['missing']} ventas no existen"
+                                                        if result["missing"] else ""))
+
+
+def cmd_cola(args):
+    from src.pharmgest.services.sale_queue import get_sale_queue, CONFLICT, FAILED
+    queue = get_sale_queue()
+    if args.enviar:
+        with get_db_session() as session:
+            result = queue.replay(session)
+        print(f"📤 Enviadas: {len(result['sent']) + len(result['conflicts'])}  "
+              f"Siguen en cola: {result['pending']}")
+    for status in (CONFLICT, FAILED):
+        for entry in queue.entries(status):
+            sale = f"#{entry['sale_id']}" if entry["sale_id"] else "sin registrar"
+            print(f"⚠️ {entry['number']} ({sale}) {entry['created_at']:%d/%m/%Y %H:%M}  "
+                  f"[{status}] {entry['detail']}")
+    for status, count in sorted(queue.counts().items()):
+        print(f"🧾 {status:<10} {count}")
+
+
+def cmd_ncf(args):
+    from src.pharmgest.services import ncf
+    if args.agregar:
+        prefix, first, last, expires = args.agregar
+        if not (first.isdigit() and last.isdigit()):
+            raise ValueError(f"Rango inválido: {first} a {last}")
+        with get_db_session() as session:
+            sequence = ncf.add_sequence(session, prefix, int(first), int(last), parse_expiry(expires).date())
+            print(f"✅ Secuencia {ncf.format_ncf(sequence.prefix, sequence.first_number)} a "
+                  f"{ncf.format_ncf(sequence.prefix, sequence.last_number)} cargada "
+                  f"(vence {sequence.expires_on:%d/%m/%Y})")
+    with get_read_session() as session:
+        for row in ncf.ncf_status(session):
+            state = "VENCIDA" if row["expired"] else f"vence {row['expires_on']:%d/%m/%Y}"
+            print(f"🧾 {ncf.format_ncf(row['prefix'], row['first'])} a {ncf.format_ncf(row['prefix'], row['last'])} "
+                  f"({state}): sin reservar {row['free']}, liberados {row[ncf.RELEASED]}, "
+                  f"en cajas {row[ncf.ASSIGNED]}, usados {row[ncf.USED]}, anulados {row[ncf.VOIDED]}")
+        if args.anulados:
+            for first, last in ncf.voided_ranges(session):
+                print(f"🚫 {first} a {last}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src.pharmgest.cli",
+                                     description="Operaciones de PharmGest sin interfaz gráfica")
+    parser.add_argument("--sql", action="store_true",
+                        help="Medir las consultas SQL del comando e imprimir el reporte al terminar")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    vender = commands.add_parser("vender", help="Registrar una venta (descuenta stock por FEFO)")
+    vender.add_argument("items", nargs="+", type=parse_item, metavar="SKU:CANT[:u]",
+                        help="Producto y cantidad; ':u' vende unidades sueltas de un fraccionable")
+    vender.add_argument("--pago", default="EFECTIVO", help="Método de pago (por defecto EFECTIVO)")
+    vender.add_argument("--ticket", action="store_true", help="Imprimir el ticket (RECEIPT_SALIDA)")
+    vender.set_defaults(func=cmd_vender)
+
+    lote = commands.add_parser("lote", help="Registrar un lote recibido")
+    lote.add_argument("sku")
+    lote.add_argument("codigo", help="Código del lote")
+    lote.add_argument("cantidad", type=int, help="Cajas si el producto es fraccionable, si no unidades")
+    lote.add_argument("vence", type=parse_date, help="Vencimiento (dd/mm/aaaa)")
+    lote.set_defaults(func=cmd_lote)
+
+    stock = commands.add_parser("stock", help="Listar el stock del catálogo")
+    stock.add_argument("--maximo", type=int, help="Solo productos con stock menor o igual")
+    stock.add_argument("--fecha", type=parse_date, help="Stock al cierre de ese día (dd/mm/aaaa)")
+    stock.set_defaults(func=cmd_stock)
+
+    movimientos = commands.add_parser("movimientos", help="Libro de movimientos de stock de un producto")
+    movimientos.add_argument("sku")
+    movimientos.add_argument("--desde", type=parse_date, help="Fecha inicial (dd/mm/aaaa)")
+    movimientos.add_argument("--hasta", type=parse_date, help="Fecha final, inclusive (dd/mm/aaaa)")
+    movimientos.set_defaults(func=cmd_movimientos)
+
+    valoracion = commands.add_parser("valoracion", help="Valor del inventario por categoría y vencimiento")
+    valoracion.add_argument("--fecha", type=parse_date,
+                            help="Día cerrado (dd/mm/aaaa); sin fecha, valoración en vivo de hoy")
+    valoracion.set_defaults(func=cmd_valoracion)
+
+    reporte = commands.add_parser("reporte", help="Totales de venta y ganancia")
+    reporte.add_argument("--desde", type=parse_date, help="Fecha inicial (dd/mm/aaaa)")
+    reporte.add_argument("--hasta", type=parse_date, help="Fecha final, inclusive (dd/mm/aaaa)")
+    reporte.add_argument("--detalle", action="store_true", help="Listar cada venta")
+    reporte.set_defaults(func=cmd_reporte)
+
+    anular = commands.add_parser("anular", help="Anular una venta (devuelve el stock)")
+    anular.add_argument("venta", type=int, help="Número de venta")
+    anular.add_argument("motivo", help="Motivo de la anulación")
+    anular.add_argument("--usuario", help="Quién anula")
+    anular.set_defaults(func=cmd_anular)
+
+    cierre = commands.add_parser("cierre", help="Reporte Z (cierre del día) en PDF")
+    cierre.add_argument("--fecha", type=parse_date, help="Día (dd/mm/aaaa); por defecto hoy")
+    cierre.add_argument("--salida", help="Archivo PDF (por defecto cierres/cierre_AAAAMMDD.pdf)")
+    cierre.set_defaults(func=cmd_cierre)
+
+    facturas = commands.add_parser("facturas", help="Regenerar facturas PDF en masa (cambio de diseño, auditoría)")
+    facturas.add_argument("--venta", type=int, nargs="+", metavar="ID", help="Números de venta")
+    facturas.add_argument("--desde", type=parse_date, help="Fecha inicial (dd/mm/aaaa)")
+    facturas.add_argument("--hasta", type=parse_date, help="Fecha final, inclusive (dd/mm/aaaa)")
+    facturas.add_argument("--todas", action="store_true", help="Todas las ventas")
+    facturas.add_argument("--forzar", action="store_true", help="Regenerar también las que ya están al día")
+    facturas.add_argument("--procesos", type=int, default=None,
+                          help="Procesos en paralelo (por defecto FACTURAS_PROCESOS; 1 = sin pool)")
+    facturas.set_defaults(func=cmd_facturas)
+
+    cola = commands.add_parser("cola", help="Estado de la cola local de ventas de esta caja")
+    cola.add_argument("--enviar", action="store_true", help="Enviar las ventas pendientes a la base de datos")
+    cola.set_defaults(func=cmd_cola)
+
+    ncf = commands.add_parser("ncf", help="Secuencias de comprobantes fiscales (NCF) y su uso")
+    ncf.add_argument("--agregar", nargs=4, metavar=("TIPO", "DESDE", "HASTA", "VENCE"),
+                     help="Cargar un rango autorizado, p.ej. B02 1 5000 31/12/2026")
+    ncf.add_argument("--anulados", action="store_true", help="Listar los rangos anulados")
+    ncf.set_defaults(func=cmd_ncf)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        upgrade_schema()
+        if args.sql:
+            from src.pharmgest.services.sql_profiling import enable_sql_profiling, sql_action, sql_report
+            enable_sql_profiling()
+            with sql_action(args.command):
+                args.func(args)
+            print(f"\n{sql_report()}")
+        else:
+            args.func(args)
+    except (LookupError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    except Exception as e:
+        print(f"❌ ERROR CRÍTICO: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
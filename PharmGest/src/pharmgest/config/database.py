@@ -1,11 +1,15 @@
+import os
 from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from sqlalchemy import event
 from sqlalchemy.exc import SQLAlchemyError
+from src.pharmgest.config.settings import (ARCHIVE_DB_PATH, WAL_LIMITE_BYTES, ANALITICA_POOL,
+                                          ANALITICA_POOL_EXTRA, ANALITICA_CACHE_KB, ANALITICA_MMAP_BYTES)
 
 # URL de la base de datos
-DB_URL = "sqlite:///./pharmgest.db"
+DB_PATH = "./pharmgest.db"
+DB_URL = f"sqlite:///{DB_PATH}"
 
 # Motor de base de datos con configuración para GUI
 engine = create_engine(
@@ -14,15 +18,83 @@ engine = create_engine(
     echo=False  # Cambiado a False para producción, usar logging en su lugar
 )
 
+# Motor de solo lectura para historial, reportes y listados: su propio pool y
+# caché; en WAL cada lectura ve una foto consistente sin frenar al cobro
+analytics_engine = create_engine(
+    f"sqlite:///file:{DB_PATH}?mode=ro&uri=true",
+    connect_args={"check_same_thread": False},
+    pool_size=ANALITICA_POOL,
+    max_overflow=ANALITICA_POOL_EXTRA,
+    echo=False
+)
+
+# Esquema del archivo histórico (mismas columnas que las tablas activas)
+ARCHIVE_DDL = [
+    """CREATE TABLE IF NOT EXISTS archivo.sales (
+        id INTEGER PRIMARY KEY, date DATETIME, total FLOAT,
+        payment_method VARCHAR, ncf VARCHAR)""",
+    """CREATE TABLE IF NOT EXISTS archivo.sale_details (
+        id INTEGER PRIMARY KEY, sale_id INTEGER, product_id INTEGER,
+        quantity INTEGER NOT NULL, unit_price FLOAT NOT NULL,
+        subtotal FLOAT NOT NULL, is_box_sale BOOLEAN)""",
+    "CREATE INDEX IF NOT EXISTS archivo.ix_sales_date ON sales (date)",
+    "CREATE INDEX IF NOT EXISTS archivo.ix_sale_details_sale_id ON sale_details (sale_id)",
+    "CREATE INDEX IF NOT EXISTS archivo.ix_sales_ncf ON sales (ncf)",
+    "CREATE INDEX IF NOT EXISTS archivo.ix_sales_total ON sales (total)",
+    "CREATE INDEX IF NOT EXISTS archivo.ix_sale_details_product_id ON sale_details (product_id)",
+]
+
+# Vistas de lectura que unen ventas activas + archivadas (temporales: viven por conexión).
+# Una fila que exista en ambos archivos (archivado interrumpido) solo se cuenta una vez.
+UNIFIED_VIEWS = [
+    """CREATE TEMP VIEW IF NOT EXISTS all_sales AS
+        SELECT id, date, total, payment_method, ncf FROM main.sales
+        UNION ALL
+        SELECT a.id, a.date, a.total, a.payment_method, a.ncf FROM archivo.sales a
+        WHERE NOT EXISTS (SELECT 1 FROM main.sales m WHERE m.id = a.id)""",
+    """CREATE TEMP VIEW IF NOT EXISTS all_sale_details AS
+        SELECT id, sale_id, product_id, quantity, unit_price, subtotal, is_box_sale FROM main.sale_details
+        UNION ALL
+        SELECT a.id, a.sale_id, a.product_id, a.quantity, a.unit_price, a.subtotal, a.is_box_sale
+        FROM archivo.sale_details a
+        WHERE NOT EXISTS (SELECT 1 FROM main.sale_details m WHERE m.id = a.id)""",
+]
+
+def attach_archive(cursor):
+    """Adjunta la base de datos de archivo como esquema 'archivo' y crea las vistas unificadas"""
+    cursor.execute("ATTACH DATABASE ? AS archivo", (ARCHIVE_DB_PATH,))
+    cursor.execute("PRAGMA archivo.journal_mode=WAL")
+    for ddl in ARCHIVE_DDL + UNIFIED_VIEWS:
+        cursor.execute(ddl)
+
 # Activar WAL Mode (Optimización crítica)
 @event.listens_for(engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA journal_mode=WAL")
     cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA journal_size_limit={WAL_LIMITE_BYTES}")
+    attach_archive(cursor)
+    cursor.close()
+
+@event.listens_for(analytics_engine, "connect")
+def set_analytics_pragma(dbapi_connection, connection_record):
+    # mode=ro no puede crear archivos: la primera conexión de escritura los crea
+    if not (os.path.exists(DB_PATH) and os.path.exists(ARCHIVE_DB_PATH)):
+        engine.connect().close()
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA cache_size=-{ANALITICA_CACHE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={ANALITICA_MMAP_BYTES}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("ATTACH DATABASE ? AS archivo", (f"file:{ARCHIVE_DB_PATH}?mode=ro",))
+    for ddl in UNIFIED_VIEWS:
+        cursor.execute(ddl)
+    # Después de crear las vistas temporales: desde aquí ninguna escritura
+    cursor.execute("PRAGMA query_only=ON")
     cursor.close()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autoflush=False, bind=analytics_engine)
 
 class Base(DeclarativeBase):
     pass
@@ -50,4 +122,18 @@ def get_db_session():
         session.rollback()
         raise
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+
+@contextmanager
+def get_read_session():
+    """
+    Sesión del motor de solo lectura (historial, reportes, reimpresiones).
+    Nunca hace commit: cualquier intento de escritura falla con
+    "attempt to write a readonly database".
+    """
+    session = ReadSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -1,6 +1,7 @@
 """
 Configuración centralizada de constantes para PharmGest
 """
+import os
 
 # --- UMBRALES DE STOCK ---
 STOCK_CRITICO = 20  # Menos de 20 unidades (aprox 2 cajas)
@@ -19,3 +20,105 @@ MAX_RESULTS_PER_PAGE = 100  # Máximo de registros a mostrar sin paginación
 
 # --- FORMATO DE PRECIOS ---
 PRICE_DECIMALS = 2  # Decimales para mostrar precios
+
+# --- IMPORTACIÓN MASIVA DE CATÁLOGO ---
+IMPORT_CHUNK_SIZE = 5000         # Filas por transacción al importar listas de precios
+IMPORT_PREVIEW_MAX_ROWS = 1000   # Máximo de diferencias a mostrar en la vista previa
+
+# --- ARCHIVO DE VENTAS ANTIGUAS ---
+ARCHIVE_DB_PATH = "./pharmgest_archivo.db"  # Base de datos fría adjunta (ATTACH) como 'archivo'
+DIAS_ANTIGUEDAD_ARCHIVO = 365   # Ventas más viejas que esto se mueven al archivo
+ARCHIVE_CHUNK_SIZE = 500        # Ventas movidas por transacción
+
+# --- RESPALDOS (BACKUP EN LÍNEA) ---
+BACKUP_DIR = "./respaldos"          # Carpeta donde se guardan los respaldos
+BACKUP_AUTOMATICO = True            # Respaldar en segundo plano mientras la app está abierta
+BACKUP_INTERVALO_MINUTOS = 240      # Cada cuánto se hace un respaldo automático
+BACKUP_PAGINAS_POR_PASO = 256       # Páginas copiadas por paso (pasos pequeños = la caja nunca se congela)
+BACKUP_PAUSA_ENTRE_PASOS = 0.002    # Segundos de pausa entre pasos para ceder la BD a las ventas
+BACKUP_RETENCION = 14               # Cantidad de respaldos que se conservan
+
+# --- MANTENIMIENTO DE LA BASE DE DATOS (WAL / OPTIMIZE) ---
+MANT_REVISION_SEGUNDOS = 60        # Cada cuánto revisa el programador de mantenimiento
+MANT_INACTIVIDAD_SEGUNDOS = 30     # Sin teclado/ratón por este tiempo = caja inactiva
+MANT_WAL_MINIMO_BYTES = 256 * 1024 # No hacer checkpoint pasivo si el WAL es más chico que esto
+MANT_OPTIMIZE_HORAS = 6            # Cada cuánto se ejecuta PRAGMA optimize
+HORA_CIERRE_DIA = 22               # Hora (0-23) del checkpoint TRUNCATE + ANALYZE diario
+MANT_REINTENTO_CIERRE_MINUTOS = 10 # Espera antes de reintentar las tareas del cierre del día que fallaron
+WAL_LIMITE_BYTES = 4 * 1024 * 1024 # journal_size_limit: el -wal se recorta a este tamaño tras un checkpoint
+
+# --- PRECARGA MIENTRAS SE MUESTRA EL LOGIN ---
+WARMUP_CONEXIONES = 2        # Conexiones del pool que se abren y calientan por adelantado
+WARMUP_ESPERA_MAXIMA = 10    # Segundos máximos a esperar la precarga después del login
+
+# --- ALMACENAMIENTO DE FACTURAS ---
+INVOICE_DIR = "facturas"     # Raíz: facturas/AAAA/MM/factura_{id}.pdf y facturas/AAAA/MM.zip
+INVOICE_MODO = "memoria"     # "archivo": guardar PDF por venta | "memoria": generarlo desde la BD solo al abrirlo
+FACTURAS_PROCESOS = 0        # Procesos al regenerar facturas en masa (0 = uno por núcleo)
+FACTURAS_LOTE = 100          # Ventas por tanda: se leen juntas de la BD y las dibuja un mismo proceso
+
+# --- TICKETS TÉRMICOS (ESC/POS) ---
+RECEIPT_SALIDA = "archivo"         # "archivo" | "serial" | "red" | "ninguna"
+RECEIPT_DIR = "tickets"            # Carpeta de la salida "archivo"
+RECEIPT_ANCHO = 48                 # Columnas por línea (80 mm = 48, 58 mm = 32)
+RECEIPT_PUERTO_SERIAL = "COM3"     # Puerto de la salida "serial" (Linux: /dev/ttyUSB0 o /dev/usb/lp0)
+RECEIPT_BAUDIOS = 9600
+RECEIPT_HOST = "127.0.0.1"         # Impresora de red de la salida "red"
+RECEIPT_PUERTO_TCP = 9100          # Puerto RAW estándar de impresoras de red
+RECEIPT_TIMEOUT = 3                # Segundos máximos esperando a la impresora
+
+# --- BÚSQUEDA DE VENTAS ---
+SEARCH_PAGE_SIZE = 100       # Ventas por página en el buscador (paginación por cursor)
+
+# --- BÚSQUEDA DE PRODUCTOS (TRIGRAMAS) ---
+BUSQUEDA_SIMILITUD_MINIMA = 0.5  # Fracción mínima de trigramas de lo escrito que debe tener el producto
+BUSQUEDA_REVISION_SEG = 60       # Cada cuánto se revisa si otra caja cambió el catálogo
+
+# --- SUGERENCIA DE COMPRA (VELOCIDAD DE VENTA) ---
+REORDER_VENTANA_DIAS = 60        # Días de historial para calcular la velocidad de venta
+REORDER_DIAS_ENTREGA = 7         # Días que tarda el proveedor en entregar
+REORDER_DIAS_COBERTURA = 30      # Días de venta que debe cubrir cada pedido
+REORDER_FACTOR_SEGURIDAD = 1.65  # z del stock de seguridad (1.65 ≈ 95% sin quiebre)
+
+# --- VALORACIÓN DE INVENTARIO ---
+VALORACION_TRAMOS_DIAS = (30, 90, 180)  # Límites de los tramos de vencimiento (días que faltan)
+
+# --- REPORTE Z (CIERRE DEL DÍA) ---
+REPORTE_Z_DIR = "cierres"        # Carpeta de los PDF del cierre (cierre_AAAAMMDD.pdf)
+REPORTE_Z_FILAS_POR_TABLA = 40   # Filas por tabla del listado de ventas (tablas chicas: se cortan rápido entre páginas)
+
+# --- DIAGNÓSTICO DE RENDIMIENTO ---
+WATCHDOG_ACTIVO = True           # Vigilar congelamientos de la interfaz
+WATCHDOG_UMBRAL_MS = 500         # Bloqueo del bucle de eventos que se registra como congelamiento
+WATCHDOG_LATIDO_MS = 100         # Intervalo del latido del hilo principal
+PERFIL_DIR = "logs/perfiles"     # Dónde se guardan las sesiones de cProfile
+PERFIL_LINEAS_RESUMEN = 40       # Funciones listadas en el resumen .txt
+SQL_N1_UMBRAL = 10               # Misma consulta repetida en una tarea que se avisa como posible N+1
+SQL_PERFIL_MAS_LENTAS = 5        # Consultas más lentas listadas por acción en el reporte SQL
+
+# --- EJECUTOR DE BASE DE DATOS (HILOS) ---
+DB_HILOS_LECTURA = 3         # Lecturas en paralelo (WAL); las escrituras van en un solo hilo, en orden
+
+# --- MOTOR DE ANALÍTICA (SOLO LECTURA) ---
+# Historial, reportes, búsquedas y exportaciones usan su propio pool, abierto
+# con mode=ro + query_only: no compiten con el cobro por conexión ni por caché
+ANALITICA_POOL = 4                  # Conexiones fijas (>= DB_HILOS_LECTURA)
+ANALITICA_POOL_EXTRA = 2            # Conexiones adicionales en picos
+ANALITICA_CACHE_KB = 65536          # Caché de páginas por conexión (64 MB)
+ANALITICA_MMAP_BYTES = 268435456    # Lectura por mmap (256 MB); 0 = desactivado
+
+# --- COLA LOCAL DE VENTAS (CAJA SIN CONEXIÓN) ---
+# Identificador de esta caja (tickets en cola y bloques de NCF). None = el de caja_id.txt junto a
+# COLA_VENTAS_DB, generado la primera vez: dos cajas con el mismo usarían los mismos NCF
+TERMINAL_ID = None
+# En el disco local de la caja, NUNCA en la carpeta compartida de pharmgest.db
+COLA_VENTAS_DB = os.path.join(os.path.expanduser("~"), ".pharmgest", "cola_ventas.db")
+COLA_REINTENTO_SEG = 15          # Cada cuánto se reintenta enviar la cola a la BD principal
+
+# --- COMPROBANTES FISCALES (NCF) ---
+# Cada caja reserva bloques de números de la secuencia autorizada y los entrega
+# desde su cola local: el contador compartido no se toca en cada venta
+NCF_PREFIJO = "B02"              # Tipo de comprobante de las ventas de caja (B02: consumo)
+NCF_DIGITOS = 8                  # Dígitos del secuencial (B02 + 8 dígitos)
+NCF_BLOQUE = 50                  # Números que reserva una caja cada vez
+NCF_RESERVA_MINIMA = 10          # Con menos números locales, la caja reserva otro bloque al sincronizar
@@ -0,0 +1,98 @@
+"""
+Ejecutor de base de datos: todo el trabajo con SQLite fuera del hilo de la interfaz.
+
+- Escrituras: un solo hilo, en el orden en que se enviaron (nunca compiten
+  entre sí por el bloqueo de escritura de SQLite).
+- Lecturas: un grupo de DB_HILOS_LECTURA hilos sobre el motor de solo
+  lectura (analytics_engine, pool y caché propios); en modo WAL leen en
+  paralelo con la escritura en curso sin quitarle conexiones al cobro.
+- Caja: un hilo sin sesión para el trabajo local de la caja (cola de
+  ventas, impresora de tickets, PDF de facturas), en orden y sin esperar a
+  que la BD principal se libere.
+
+Cada hilo tiene su propia sesión (scoped_session); cada tarea empieza con la
+sesión limpia y la cierra al terminar. Las tareas reciben la sesión como
+primer argumento y devuelven un Future:
+
+    future = get_executor().write(lambda s: SalesService(s).checkout(lines))
+    future = get_executor().read(lambda s: ReportService(s).sales_history())
+
+Las escrituras hacen commit si la tarea termina sin excepción (rollback si
+falla). Devuelva datos ya cargados (filas, dicts o columnas de objetos
+leídos): la sesión se cierra antes de que el resultado llegue a la interfaz.
+Para recibirlo en el hilo de Qt use ui/db_tasks.when_done().
+
+Con la instrumentación de SQL activa, cada tarea es una acción con el nombre
+de la función enviada (services/sql_profiling.py).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.orm import scoped_session, sessionmaker
+from src.pharmgest.config.database import engine, analytics_engine
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import DB_HILOS_LECTURA
+from src.pharmgest.services.sql_profiling import sql_action, action_name
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class DbExecutor:
+    def __init__(self, readers=DB_HILOS_LECTURA):
+        # expire_on_commit=False: lo escrito sigue legible después del commit
+        self.write_sessions = scoped_session(sessionmaker(bind=engine, autoflush=False, expire_on_commit=False))
+        self.read_sessions = scoped_session(sessionmaker(bind=analytics_engine, autoflush=False))
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pharmgest-bd-escritura")
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="pharmgest-bd-lectura")
+        self.till = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pharmgest-caja")
+
+    def read(self, fn, *args, **kwargs):
+        """fn(session, *args, **kwargs) en un hilo de lectura. No hace commit."""
+        return self.readers.submit(self._run, fn, args, kwargs, False)
+
+    def write(self, fn, *args, **kwargs):
+        """fn(session, *args, **kwargs) en el hilo de escritura, con commit al terminar"""
+        return self.writer.submit(self._run, fn, args, kwargs, True)
+
+    def local(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) en el hilo de la caja (sin sesión): disco local e impresora"""
+        return self.till.submit(fn, *args, **kwargs)
+
+    def _run(self, fn, args, kwargs, commit):
+        session = self.write_sessions() if commit else self.read_sessions()
+        with sql_action(action_name(fn)):
+            try:
+                result = fn(session, *args, **kwargs)
+                if commit:
+                    session.commit()
+                return result
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                # Libera la conexión y vacía el mapa de identidad; la sesión del hilo se reutiliza
+                session.close()
+
+    def shutdown(self, wait=True):
+        """Termina las tareas pendientes (escrituras y trabajo de la caja se completan) y cierra los hilos"""
+        self.readers.shutdown(wait=wait, cancel_futures=True)
+        self.till.shutdown(wait=wait)
+        self.writer.shutdown(wait=wait)
+
+
+def get_executor():
+    """Ejecutor compartido de la aplicación (se crea la primera vez que se pide)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = DbExecutor()
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+        logger.info("Ejecutor de base de datos detenido")
@@ -0,0 +1,72 @@
+"""
+Actualización incremental del esquema en bases de datos existentes.
+
+create_all() solo crea tablas que no existen; las columnas e índices nuevos
+sobre tablas ya creadas se agregan aquí de forma idempotente.
+"""
+from datetime import datetime
+from sqlalchemy import text
+from src.pharmgest.config.database import Base, engine
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.database import models  # noqa: F401  (registra los modelos en Base.metadata)
+
+# (tabla, columna, definición) para ALTER TABLE ... ADD COLUMN
+NEW_COLUMNS = [
+    ("sales", "client_uuid", "VARCHAR"),
+]
+
+# Los nombres coinciden con los que genera SQLAlchemy (ix_<tabla>_<columna>)
+NEW_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_sale_details_sale_id ON sale_details (sale_id)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_date ON sales (date)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_ncf ON sales (ncf)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_total ON sales (total)",
+    "CREATE INDEX IF NOT EXISTS ix_sale_details_product_id ON sale_details (product_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_sales_client_uuid ON sales (client_uuid)",
+    "CREATE INDEX IF NOT EXISTS ix_product_batches_product_id_expiry_date "
+    "ON product_batches (product_id, expiry_date, stock)",
+    "CREATE INDEX IF NOT EXISTS ix_products_category_id_name ON products (category_id, name)",
+]
+
+# NCF repetidos: mientras haya, ix_sales_ncf no puede ser UNIQUE
+NCF_DUPLICATES = """
+    SELECT ncf, COUNT(*) FROM sales WHERE ncf IS NOT NULL GROUP BY ncf HAVING COUNT(*) > 1
+"""
+
+# Saldo inicial del libro de movimientos: el stock actual de cada producto como
+# "apertura". Solo corre mientras el libro está vacío (BD creada antes del libro).
+SEED_STOCK_LEDGER = """
+    INSERT INTO stock_movements (product_id, date, quantity, reason)
+    SELECT id, :now, total_stock, 'apertura' FROM products
+    WHERE total_stock <> 0 AND NOT EXISTS (SELECT 1 FROM stock_movements)
+"""
+
+def upgrade_schema():
+    """Crea tablas faltantes, agrega columnas nuevas e índices. Seguro de ejecutar siempre."""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for table_name, column_name, definition in NEW_COLUMNS:
+            existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table_name})"))}
+            if column_name not in existing:
+                logger.info(f"Migración: agregando columna {table_name}.{column_name}")
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {definition}"))
+        for ddl in NEW_INDEXES:
+            conn.execute(text(ddl))
+        _unique_ncf_index(conn)
+        seeded = conn.execute(text(SEED_STOCK_LEDGER), {"now": datetime.now()}).rowcount
+        if seeded:
+            logger.info(f"Migración: saldo de apertura del libro de stock para {seeded} productos")
+
+
+def _unique_ncf_index(conn):
+    """BD de antes de la numeración por caja: ix_sales_ncf pasa a UNIQUE si no hay NCF repetidos"""
+    if {row[1]: row[2] for row in conn.execute(text("PRAGMA index_list(sales)"))}.get("ix_sales_ncf"):
+        return
+    duplicates = conn.execute(text(NCF_DUPLICATES)).all()
+    if duplicates:
+        logger.error("Migración: hay NCF repetidos en ventas, ix_sales_ncf sigue sin UNIQUE hasta corregirlos: "
+                     + ", ".join(f"{ncf} ({count} ventas)" for ncf, count in duplicates[:20]))
+        return
+    logger.info("Migración: ix_sales_ncf pasa a índice único")
+    conn.execute(text("DROP INDEX IF EXISTS ix_sales_ncf"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_sales_ncf ON sales (ncf)"))
@@ -1,5 +1,6 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Enum, Index
+from sqlalchemy import table, column
 from sqlalchemy.orm import relationship
 from src.pharmgest.config.database import Base
 
@@ -21,6 +22,15 @@ class Category(Base):
     description = Column(String, nullable=True)
     products = relationship("Product", back_populates="category")
 
+def format_stock(total_stock, is_fractionable, units_per_box):
+    """'12 Unid.' o, en fraccionables, '3 Cajas / 2 Sueltas' (también para filas de solo lectura)"""
+    if not is_fractionable or units_per_box <= 1:
+        return f"{total_stock} Unid."
+
+    cajas = total_stock // units_per_box
+    sueltas = total_stock % units_per_box
+    return f"{cajas} Cajas / {sueltas} Sueltas"
+
 # --- PRODUCTOS ---
 class Product(Base):
     __tablename__ = "products"
@@ -50,15 +60,13 @@ class Product(Base):
     # RELACIÓN CON LOTES (¡ESTO ES LO QUE TE FALTABA!)
     batches = relationship("ProductBatch", back_populates="product", cascade="all, delete-orphan")
 
+    # Navegación por categoría en el POS: filtra y ordena por nombre con el índice
+    __table_args__ = (Index("ix_products_category_id_name", "category_id", "name"),)
+
     @property
     def stock_display(self):
         """Texto bonito para mostrar stock"""
-        if not self.is_fractionable or self.units_per_box <= 1:
-            return f"{self.total_stock} Unid."
-        
-        cajas = self.total_stock // self.units_per_box
-        sueltas = self.total_stock % self.units_per_box
-        return f"{cajas} Cajas / {sueltas} Sueltas"
+        return format_stock(self.total_stock, self.is_fractionable, self.units_per_box)
 
 # --- NUEVA TABLA: LOTES (BATCHES) ---
 class ProductBatch(Base):
@@ -75,21 +83,27 @@ class ProductBatch(Base):
     
     product = relationship("Product", back_populates="batches")
 
+    # FEFO por producto y valoración de inventario: leen solo el índice
+    __table_args__ = (Index("ix_product_batches_product_id_expiry_date", "product_id", "expiry_date", "stock"),)
+
 # --- VENTAS ---
 class Sale(Base):
     __tablename__ = "sales"
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, default=datetime.now)
-    total = Column(Float, default=0.0)
+    date = Column(DateTime, default=datetime.now, index=True)
+    total = Column(Float, default=0.0, index=True)
     payment_method = Column(String, default="EFECTIVO")
-    ncf = Column(String, nullable=True) 
+    # Único: dos ventas con el mismo comprobante fiscal es un error (ver migrations._unique_ncf_index)
+    ncf = Column(String, nullable=True, unique=True, index=True)
+    # Identificador generado en la caja: hace idempotente el reenvío desde la cola local
+    client_uuid = Column(String, nullable=True, unique=True, index=True)
     details = relationship("SaleDetail", back_populates="sale", cascade="all, delete-orphan")
 
 class SaleDetail(Base):
     __tablename__ = "sale_details"
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    sale_id = Column(Integer, ForeignKey("sales.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     
     quantity = Column(Integer, nullable=False)
     unit_price = Column(Float, nullable=False)
@@ -97,4 +111,105 @@ class SaleDetail(Base):
     is_box_sale = Column(Boolean, default=True) 
     
     sale = relationship("Sale", back_populates="details")
-    product = relationship("Product")
\ No newline at end of file
+    product = relationship("Product")
+
+# Venta anulada: no cuenta en totales ni en el reporte Z (la venta queda para auditoría).
+# Sin ForeignKey a propósito: la venta puede pasar al archivo frío.
+class SaleVoid(Base):
+    __tablename__ = "sale_voids"
+    sale_id = Column(Integer, primary_key=True)
+    voided_at = Column(DateTime, default=datetime.now, nullable=False, index=True)
+    reason = Column(String, nullable=False)
+    user_name = Column(String, nullable=True)
+
+# --- LIBRO DE MOVIMIENTOS DE STOCK (SOLO SE AGREGA) ---
+# Cada cambio de total_stock deja una fila en la misma transacción que lo hizo.
+# Sin ForeignKey a propósito: el historial sobrevive a los productos eliminados.
+class StockMovement(Base):
+    __tablename__ = "stock_movements"
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    date = Column(DateTime, default=datetime.now, nullable=False)  # Cuándo cambió el stock en la BD
+    quantity = Column(Integer, nullable=False)   # Unidades: positivo entra, negativo sale
+    reason = Column(String, nullable=False)      # apertura, venta, anulacion, lote, baja_lote, ajuste, alta, eliminado
+    reference = Column(String, nullable=True)    # Nº de venta, código de lote...
+
+    __table_args__ = (Index("ix_stock_movements_product_id_id", "product_id", "id"),)
+
+# Foto periódica del stock: suma de los movimientos de ese producto hasta movement_id
+class StockSnapshot(Base):
+    __tablename__ = "stock_snapshots"
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, nullable=False)
+    movement_id = Column(Integer, nullable=False)
+    stock = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_stock_snapshots_product_id_taken_at", "product_id", "taken_at"),)
+
+# --- VALORACIÓN DE INVENTARIO GUARDADA AL CIERRE DEL DÍA ---
+class InventoryValuation(Base):
+    __tablename__ = "inventory_valuations"
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    category = Column(String, nullable=False)
+    bucket = Column(Integer, nullable=False)          # Tramo de vencimiento (0 = vencido)
+    bucket_label = Column(String, nullable=False)     # Nombre del tramo con los límites de ese día
+    units = Column(Integer, nullable=False)
+    cost_value = Column(Float, nullable=False)
+    retail_value = Column(Float, nullable=False)
+
+    __table_args__ = (Index("ix_inventory_valuations_day", "day", "category", "bucket", unique=True),)
+
+# --- COMPROBANTES FISCALES (NCF) ---
+# Rango autorizado de un tipo de comprobante; next_number es el contador compartido
+class NcfSequence(Base):
+    __tablename__ = "ncf_sequences"
+    id = Column(Integer, primary_key=True)
+    prefix = Column(String, nullable=False)            # Tipo de comprobante: B01, B02...
+    first_number = Column(Integer, nullable=False)
+    last_number = Column(Integer, nullable=False)
+    next_number = Column(Integer, nullable=False)      # Primer número que ninguna caja reservó
+    expires_on = Column(Date, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+    blocks = relationship("NcfBlock", back_populates="sequence")
+
+# Números de una secuencia en manos de una caja, usados, liberados o anulados (ver services/ncf.py)
+class NcfBlock(Base):
+    __tablename__ = "ncf_blocks"
+    id = Column(Integer, primary_key=True)
+    sequence_id = Column(Integer, ForeignKey("ncf_sequences.id"), nullable=False)
+    terminal_id = Column(String, nullable=True)
+    first_number = Column(Integer, nullable=False)
+    last_number = Column(Integer, nullable=False)
+    status = Column(String, nullable=False)            # asignado, agotado, liberado, anulado
+    reserved_at = Column(DateTime, default=datetime.now)
+    closed_at = Column(DateTime, nullable=True)
+    sequence = relationship("NcfSequence", back_populates="blocks")
+
+    __table_args__ = (Index("ix_ncf_blocks_status_sequence_id", "status", "sequence_id"),
+                      Index("ix_ncf_blocks_terminal_id_status", "terminal_id", "status"))
+
+# --- VISTAS UNIFICADAS (ventas activas + archivo) ---
+# Vistas temporales creadas en cada conexión (ver attach_archive en config/database.py).
+# Solo lectura: usarlas en historial y reportes para incluir las ventas archivadas.
+all_sales = table(
+    "all_sales",
+    column("id", Integer), column("date", DateTime), column("total", Float),
+    column("payment_method", String), column("ncf", String),
+)
+
+# Tabla de ventas del archivo frío (mismas columnas que sales), para consultas por tabla
+archived_sales = table(
+    "sales",
+    column("id", Integer), column("date", DateTime), column("total", Float),
+    column("payment_method", String), column("ncf", String),
+    schema="archivo",
+)
+
+all_sale_details = table(
+    "all_sale_details",
+    column("id", Integer), column("sale_id", Integer), column("product_id", Integer),
+    column("quantity", Integer), column("unit_price", Float), column("subtotal", Float),
+    column("is_box_sale", Boolean),
+)
@@ -1,15 +1,42 @@
+import argparse
 import sys
 from PyQt6.QtWidgets import QApplication, QDialog
 from src.pharmgest.config.logging_config import logger
-from src.pharmgest.ui.main_window import MainWindow
+from src.pharmgest.config.settings import WARMUP_ESPERA_MAXIMA, WATCHDOG_ACTIVO
+from src.pharmgest.database.executor import shutdown_executor
+from src.pharmgest.database.migrations import upgrade_schema
+from src.pharmgest.services.profiling import start_profiling, stop_profiling
+from src.pharmgest.services.warmup import WarmUp
 from src.pharmgest.ui.dialogs.login_dialog import LoginDialog
+from src.pharmgest.ui.stall_watchdog import StallWatchdog
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="PharmGest ERP")
+    parser.add_argument("--perfil", "--profile", action="store_true",
+                        help="Grabar toda la sesión con cProfile (se guarda en logs/perfiles al salir)")
+    # Los argumentos propios de Qt (-style, -platform...) se le pasan a QApplication
+    return parser.parse_known_args()
 
 def main():
+    args, qt_args = parse_args()
+    if args.perfil:
+        start_profiling()
+
     logger.info("Iniciando aplicación PharmGest")
-    app = QApplication(sys.argv)
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle("Fusion")
     
+    # Registra en el log cualquier bloqueo del bucle de eventos y su manejador
+    watchdog = StallWatchdog(app) if WATCHDOG_ACTIVO else None
+    
     try:
+        # Aplicar columnas/índices nuevos sobre bases de datos existentes
+        upgrade_schema()
+        
+        # Precarga en segundo plano mientras el cajero escribe su contraseña
+        warmup = WarmUp()
+        warmup.start()
+        
         login = LoginDialog()
         
         if login.exec() == QDialog.DialogCode.Accepted:
@@ -18,17 +45,28 @@ def main():
             username = login.current_user_name
             logger.info(f"Usuario autenticado: {username} ({role})")
             
+            # Normalmente ya terminó; si no, esperamos lo que falte (con tope)
+            if not warmup.wait(WARMUP_ESPERA_MAXIMA):
+                logger.warning("La precarga no terminó a tiempo, se continúa sin ella")
+            from src.pharmgest.ui.main_window import MainWindow
+            
             # Se los pasamos a la ventana principal
-            window = MainWindow(user_role=role, user_name=username)
+            window = MainWindow(user_role=role, user_name=username, catalog=warmup.take_catalog())
             window.showMaximized()
-            sys.exit(app.exec())
+            exit_code = app.exec()
         else:
             logger.info("Login cancelado por el usuario")
-            sys.exit()
+            exit_code = 0
     except Exception as e:
         logger.critical(f"Error crítico al iniciar aplicación: {e}", exc_info=True)
-        sys.exit(1)
+        exit_code = 1
+    
+    if watchdog:
+        watchdog.shutdown()
+    shutdown_executor()  # las escrituras en cola (p.ej. una venta) terminan antes de salir
+    stop_profiling()  # guarda el perfil si quedó una sesión abierta (--perfil o botón del admin)
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
-    
\ No newline at end of file
+    
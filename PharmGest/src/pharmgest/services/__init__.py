@@ -0,0 +1,12 @@
+"""
+Lógica de negocio sin interfaz gráfica. Los widgets, la línea de comandos
+(src/pharmgest/cli.py) y los scripts de lote/benchmarks usan estas clases:
+
+    with get_db_session() as session:
+        sale = SalesService(session).checkout(lines)
+"""
+from src.pharmgest.services.inventory import InventoryService
+from src.pharmgest.services.reports import ReportService
+from src.pharmgest.services.sales import SalesService, InsufficientStockError
+
+__all__ = ["SalesService", "InventoryService", "ReportService", "InsufficientStockError"]
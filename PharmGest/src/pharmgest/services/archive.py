@@ -0,0 +1,93 @@
+"""
+Archivado en frío: mueve ventas antiguas del archivo activo (pharmgest.db)
+a la base de datos adjunta 'archivo' en transacciones por bloques.
+
+Los reportes leen las vistas all_sales / all_sale_details, que unen ambos
+archivos, así que siguen viendo el historial completo.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import text, bindparam
+from src.pharmgest.config.database import engine
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import DIAS_ANTIGUEDAD_ARCHIVO, ARCHIVE_CHUNK_SIZE
+
+# La venta más reciente nunca se archiva: sin AUTOINCREMENT, SQLite reutilizaría
+# su id si la tabla activa quedara vacía y chocaría con el archivo.
+SELECT_CANDIDATES = text("""
+    SELECT id FROM main.sales
+    WHERE id > :last_id
+      AND id < (SELECT MAX(id) FROM main.sales)
+      AND date < :cutoff
+    ORDER BY id
+    LIMIT :limit
+""")
+
+# client_uuid no se archiva: solo sirve mientras la venta puede estar en la cola de una caja
+COPY_SALES = text("""
+    INSERT OR IGNORE INTO archivo.sales (id, date, total, payment_method, ncf)
+    SELECT id, date, total, payment_method, ncf FROM main.sales WHERE id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+COPY_DETAILS = text("""
+    INSERT OR IGNORE INTO archivo.sale_details
+        (id, sale_id, product_id, quantity, unit_price, subtotal, is_box_sale)
+    SELECT id, sale_id, product_id, quantity, unit_price, subtotal, is_box_sale
+    FROM main.sale_details WHERE sale_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+# Solo se borra lo que ya está confirmado en el archivo
+DELETE_DETAILS = text("""
+    DELETE FROM main.sale_details
+    WHERE sale_id IN :ids AND id IN (SELECT id FROM archivo.sale_details WHERE sale_id IN :ids)
+""").bindparams(bindparam("ids", expanding=True))
+
+DELETE_SALES = text("""
+    DELETE FROM main.sales
+    WHERE id IN :ids AND id IN (SELECT id FROM archivo.sales WHERE id IN :ids)
+""").bindparams(bindparam("ids", expanding=True))
+
+
+def archive_old_sales(days=DIAS_ANTIGUEDAD_ARCHIVO, chunk_size=ARCHIVE_CHUNK_SIZE, progress_callback=None):
+    """
+    Mueve al archivo las ventas con más de `days` días de antigüedad.
+
+    Cada bloque se copia en una transacción y se borra del archivo activo en
+    otra. En WAL una transacción sobre dos archivos no es atómica en conjunto,
+    así que copiar primero garantiza que nunca se pierda una venta; si el
+    proceso se interrumpe, volver a ejecutarlo termina el trabajo (la copia
+    es idempotente y las vistas no duplican filas).
+
+    Retorna el número de ventas archivadas.
+    """
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    archived = 0
+    last_id = 0
+
+    with engine.connect() as conn:
+        while True:
+            ids = [row[0] for row in conn.execute(
+                SELECT_CANDIDATES, {"last_id": last_id, "cutoff": cutoff, "limit": chunk_size})]
+            conn.rollback()  # cerrar la transacción de lectura antes de escribir
+            if not ids:
+                break
+
+            with conn.begin():
+                conn.execute(COPY_SALES, {"ids": ids})
+                conn.execute(COPY_DETAILS, {"ids": ids})
+            with conn.begin():
+                conn.execute(DELETE_DETAILS, {"ids": ids})
+                conn.execute(DELETE_SALES, {"ids": ids})
+
+            archived += len(ids)
+            last_id = ids[-1]
+            if progress_callback:
+                progress_callback(archived)
+
+    logger.info(f"Archivado de ventas: {archived} ventas anteriores a {cutoff} movidas al archivo")
+    return archived
+
+
+def compact_active_db():
+    """VACUUM del archivo activo para devolver al disco el espacio liberado (usar sin cajeros conectados)"""
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM main"))
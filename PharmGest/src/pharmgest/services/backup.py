@@ -0,0 +1,169 @@
+"""
+Respaldos en línea con la API de backup de SQLite.
+
+La copia se hace en pasos pequeños desde un hilo en segundo plano, sobre
+una conexión propia que mantiene abierta una transacción de lectura: en WAL
+eso fija una instantánea consistente (incluido el contenido del -wal) sin
+bloquear a las cajas que siguen vendiendo.
+"""
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from src.pharmgest.config.database import DB_PATH
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import (ARCHIVE_DB_PATH, BACKUP_DIR, BACKUP_PAGINAS_POR_PASO,
+                                           BACKUP_PAUSA_ENTRE_PASOS, BACKUP_RETENCION)
+
+# Archivos que forman un respaldo completo (nombre dentro de la carpeta -> ruta viva)
+BACKUP_FILES = {
+    "pharmgest.db": DB_PATH,
+    "pharmgest_archivo.db": ARCHIVE_DB_PATH,
+}
+REQUIRED_TABLES = {"users", "products", "product_batches", "sales", "sale_details"}
+
+_backup_lock = threading.Lock()
+
+
+def _copy_database(source_path, target_path):
+    """Copia una BD viva con la API de backup. Retorna el número de páginas copiadas."""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        # Transacción de lectura abierta = instantánea estable durante toda la copia
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+        def pause(status, remaining, total):
+            time.sleep(BACKUP_PAUSA_ENTRE_PASOS)
+
+        source.backup(target, pages=BACKUP_PAGINAS_POR_PASO, progress=pause)
+        source.rollback()
+        return target.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+
+def check_integrity(path, required_tables=None):
+    """Retorna (ok, mensaje). Verifica PRAGMA integrity_check y, opcionalmente, las tablas."""
+    if not os.path.exists(path):
+        return False, f"No existe {path}"
+    try:
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                return False, f"integrity_check: {result}"
+            if required_tables:
+                tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+                missing = required_tables - tables
+                if missing:
+                    return False, f"Faltan tablas: {', '.join(sorted(missing))}"
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return False, str(e)
+    return True, "ok"
+
+
+def rotate_backups(backup_dir=BACKUP_DIR, keep=BACKUP_RETENCION):
+    """Borra los respaldos más viejos dejando solo los `keep` más recientes"""
+    folders = sorted(list_backups(backup_dir), reverse=True)
+    for old in folders[keep:]:
+        shutil.rmtree(os.path.join(backup_dir, old), ignore_errors=True)
+        logger.info(f"Respaldo antiguo eliminado: {old}")
+
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """Nombres de carpeta de los respaldos existentes (formato AAAAMMDD_HHMMSS)"""
+    if not os.path.isdir(backup_dir):
+        return []
+    return [name for name in os.listdir(backup_dir)
+            if os.path.isfile(os.path.join(backup_dir, name, "pharmgest.db"))]
+
+
+def run_backup(backup_dir=BACKUP_DIR):
+    """
+    Respaldo completo: copia en línea, verificación de integridad y rotación.
+    Retorna la carpeta del respaldo, o None si ya había uno en curso o falló.
+    """
+    if not _backup_lock.acquire(blocking=False):
+        logger.info("Respaldo omitido: ya hay uno en curso")
+        return None
+    try:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        folder = os.path.join(backup_dir, stamp)
+        suffix = 1
+        while os.path.exists(folder):
+            suffix += 1
+            folder = os.path.join(backup_dir, f"{stamp}_{suffix}")
+        os.makedirs(folder)
+
+        for name, source_path in BACKUP_FILES.items():
+            if not os.path.exists(source_path):
+                continue
+            target_path = os.path.join(folder, name)
+            start = time.perf_counter()
+            pages = _copy_database(source_path, target_path)
+            elapsed = time.perf_counter() - start
+
+            ok, message = check_integrity(target_path)
+            if not ok:
+                logger.error(f"Respaldo de {name} inválido ({message}); se descarta {folder}")
+                shutil.rmtree(folder, ignore_errors=True)
+                return None
+            logger.info(f"Respaldo {name}: {pages} páginas en {elapsed:.2f}s "
+                        f"({pages / elapsed if elapsed else pages:,.0f} páginas/s)")
+
+        rotate_backups(backup_dir)
+        return folder
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Error durante el respaldo: {e}", exc_info=True)
+        return None
+    finally:
+        _backup_lock.release()
+
+
+def start_backup_in_background():
+    """Lanza run_backup() en un hilo daemon para no congelar la interfaz"""
+    thread = threading.Thread(target=run_backup, name="pharmgest-backup", daemon=True)
+    thread.start()
+    return thread
+
+
+def restore_backup(folder):
+    """
+    Restaura un respaldo sobre las bases de datos vivas.
+
+    Primero valida todos los archivos del respaldo; si alguno falla no se toca
+    nada. Antes de sobrescribir se guarda un respaldo de seguridad del estado
+    actual; si no se pudo (RuntimeError), tampoco se toca nada. Debe
+    ejecutarse con todas las cajas cerradas.
+    """
+    main_file = os.path.join(folder, "pharmgest.db")
+    ok, message = check_integrity(main_file, REQUIRED_TABLES)
+    if not ok:
+        raise ValueError(f"Respaldo inválido ({main_file}): {message}")
+    for name in BACKUP_FILES:
+        path = os.path.join(folder, name)
+        if name != "pharmgest.db" and os.path.exists(path):
+            ok, message = check_integrity(path)
+            if not ok:
+                raise ValueError(f"Respaldo inválido ({path}): {message}")
+
+    safety = run_backup(os.path.join(BACKUP_DIR, "pre_restauracion"))
+    if safety is None:
+        # Sin copia del estado actual no hay vuelta atrás: no se sobrescribe nada
+        raise RuntimeError("No se pudo guardar el respaldo de seguridad; la restauración se canceló")
+    logger.info(f"Respaldo de seguridad antes de restaurar: {safety}")
+
+    for name, live_path in BACKUP_FILES.items():
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            continue
+        # La API de backup escribe a través de SQLite: respeta el -wal y los bloqueos
+        _copy_database(path, live_path)
+        logger.info(f"Restaurado {live_path} desde {path}")
@@ -0,0 +1,248 @@
+"""
+Importación masiva de listas de precios de proveedores (CSV).
+
+Flujo: leer el CSV por bloques -> validar cada fila -> (vista previa opcional)
+-> upsert con INSERT ... ON CONFLICT(sku) DO UPDATE usando executemany,
+una transacción por bloque.
+"""
+import csv
+import math
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.pharmgest.config.database import engine, analytics_engine
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import IMPORT_CHUNK_SIZE, IMPORT_PREVIEW_MAX_ROWS
+from src.pharmgest.database.models import Product
+from src.pharmgest.services.product_search import get_search_index
+
+# Encabezado del CSV (en minúsculas) -> columna del modelo Product
+COLUMN_ALIASES = {
+    "sku": "sku", "codigo": "sku", "código": "sku",
+    "nombre": "name", "name": "name", "descripcion": "name", "descripción": "name",
+    "precio": "price", "price": "price",
+    "costo": "cost", "cost": "cost",
+    "precio_caja": "box_price", "box_price": "box_price",
+    "precio_unidad": "unit_price", "unit_price": "unit_price",
+    "unidades_caja": "units_per_box", "units_per_box": "units_per_box",
+    "fraccionable": "is_fractionable", "is_fractionable": "is_fractionable",
+}
+REQUIRED_COLUMNS = ("sku", "name", "price")
+FLOAT_COLUMNS = ("price", "cost", "box_price", "unit_price")
+TRUE_VALUES = {"1", "si", "sí", "s", "x", "true", "yes", "y"}
+
+# SQLite limita las variables por sentencia; buscamos SKUs existentes en tandas
+LOOKUP_CHUNK = 500
+
+
+def count_lines(path):
+    """Cuenta las filas de datos (sin encabezado) para la barra de progreso"""
+    with open(path, "rb") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def _parse_decimal(value):
+    """Acepta '1,234.50', '1.234,50', '$ 250' o '250,5'; 'nan' o 'inf' no son precios"""
+    text = value.strip().replace("$", "").replace(" ", "")
+    if "," in text and "." in text:
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        text = text.replace(",", ".")
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"Valor no finito: {value!r}")
+    return value
+
+
+def _parse_row(raw, columns):
+    """Convierte una fila cruda del CSV en un dict listo para insertar"""
+    row = {}
+    for index, column in columns.items():
+        value = raw[index].strip() if index < len(raw) else ""
+        if column in FLOAT_COLUMNS:
+            if not value:
+                if column == "price":
+                    raise ValueError("Precio vacío")
+                value = 0.0
+            else:
+                try:
+                    value = round(_parse_decimal(value), 2)
+                except ValueError:
+                    raise ValueError(f"Valor numérico inválido en '{column}': {raw[index]!r}")
+            if value < 0:
+                raise ValueError(f"Valor negativo en '{column}'")
+        elif column == "units_per_box":
+            try:
+                value = int(value) if value else 1
+            except ValueError:
+                raise ValueError(f"Unidades por caja inválidas: {value!r}")
+            if value < 1:
+                raise ValueError("Unidades por caja debe ser al menos 1")
+        elif column == "is_fractionable":
+            value = value.lower() in TRUE_VALUES
+        elif not value:
+            raise ValueError(f"Campo obligatorio vacío: '{column}'")
+        row[column] = value
+    return row
+
+
+def read_price_list(path, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Lee el CSV por bloques.
+
+    Genera tuplas (columnas, filas_validas, errores, lineas_leidas) por bloque.
+    Un SKU repetido dentro del archivo se queda con su última aparición.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+
+        header = next(reader, None)
+        if not header:
+            raise ValueError("El archivo está vacío")
+
+        columns = {}
+        for index, name in enumerate(header):
+            column = COLUMN_ALIASES.get(name.strip().lower())
+            if column and column not in columns.values():
+                columns[index] = column
+        missing = [c for c in REQUIRED_COLUMNS if c not in columns.values()]
+        if missing:
+            raise ValueError(f"Faltan columnas obligatorias: {', '.join(missing)}")
+        column_names = tuple(columns.values())
+
+        seen_skus = set()
+        rows, errors, lines_read = {}, [], 0
+        for line_no, raw in enumerate(reader, start=2):
+            lines_read += 1
+            if not any(cell.strip() for cell in raw):
+                continue
+            try:
+                row = _parse_row(raw, columns)
+            except ValueError as e:
+                errors.append((line_no, str(e)))
+            else:
+                if row["sku"] in seen_skus:
+                    errors.append((line_no, f"SKU repetido {row['sku']}: se usa la última aparición"))
+                seen_skus.add(row["sku"])
+                rows[row["sku"]] = row
+
+            if lines_read >= chunk_size:
+                yield column_names, list(rows.values()), errors, lines_read
+                rows, errors, lines_read = {}, [], 0
+
+        if rows or errors or lines_read:
+            yield column_names, list(rows.values()), errors, lines_read
+
+
+def _fetch_existing(conn, skus, column_names):
+    """Devuelve {sku: fila_actual} de los SKUs que ya existen en la BD"""
+    table = Product.__table__
+    cols = [table.c[name] for name in column_names]
+    existing = {}
+    for start in range(0, len(skus), LOOKUP_CHUNK):
+        batch = skus[start:start + LOOKUP_CHUNK]
+        for db_row in conn.execute(select(*cols).where(table.c.sku.in_(batch))):
+            existing[db_row.sku] = db_row._mapping
+    return existing
+
+
+def _describe_changes(row, current):
+    changes = []
+    for column, new_value in row.items():
+        if column == "sku":
+            continue
+        old_value = current[column]
+        if column in FLOAT_COLUMNS:
+            if round(old_value or 0.0, 2) == new_value:
+                continue
+            changes.append(f"{column}: {old_value or 0.0:,.2f} → {new_value:,.2f}")
+        elif old_value != new_value:
+            changes.append(f"{column}: {old_value} → {new_value}")
+    return changes
+
+
+def preview_import(path, progress_callback=None):
+    """
+    Simulación (dry-run): compara el archivo con la BD sin escribir nada.
+
+    Retorna un dict con los conteos, los errores de validación y una lista
+    (limitada a IMPORT_PREVIEW_MAX_ROWS) de (sku, nombre, tipo, detalle).
+    """
+    total_lines = count_lines(path)
+    summary = {"nuevos": 0, "actualizados": 0, "sin_cambios": 0, "errores": [], "cambios": []}
+    done = 0
+
+    with analytics_engine.connect() as conn:
+        for column_names, rows, errors, lines_read in read_price_list(path):
+            summary["errores"].extend(errors)
+            existing = _fetch_existing(conn, [r["sku"] for r in rows], column_names)
+
+            for row in rows:
+                current = existing.get(row["sku"])
+                if current is None:
+                    summary["nuevos"] += 1
+                    entry = (row["sku"], row["name"], "NUEVO", f"precio {row['price']:,.2f}")
+                else:
+                    changes = _describe_changes(row, current)
+                    if not changes:
+                        summary["sin_cambios"] += 1
+                        continue
+                    summary["actualizados"] += 1
+                    entry = (row["sku"], row["name"], "ACTUALIZADO", "; ".join(changes))
+                if len(summary["cambios"]) < IMPORT_PREVIEW_MAX_ROWS:
+                    summary["cambios"].append(entry)
+
+            done += lines_read
+            if progress_callback:
+                progress_callback(done, total_lines)
+
+    return summary
+
+
+def _build_upsert(column_names):
+    """INSERT ... ON CONFLICT(sku) DO UPDATE solo sobre las columnas del archivo"""
+    stmt = sqlite_insert(Product.__table__)
+    update_cols = {name: stmt.excluded[name] for name in column_names if name != "sku"}
+    return stmt.on_conflict_do_update(index_elements=["sku"], set_=update_cols)
+
+
+def import_price_list(path, progress_callback=None):
+    """
+    Aplica la lista de precios: una transacción y un executemany por bloque.
+    El stock nunca se modifica; los productos nuevos entran con stock 0.
+
+    Retorna {"procesados": n, "errores": [(linea, mensaje), ...]}.
+    """
+    total_lines = count_lines(path)
+    result = {"procesados": 0, "errores": []}
+    done = 0
+    stmt = None
+
+    try:
+        for column_names, rows, errors, lines_read in read_price_list(path):
+            result["errores"].extend(errors)
+            if rows:
+                if stmt is None:
+                    stmt = _build_upsert(column_names)
+                with engine.begin() as conn:
+                    conn.execute(stmt, rows)
+                result["procesados"] += len(rows)
+
+            done += lines_read
+            if progress_callback:
+                progress_callback(done, total_lines)
+    finally:
+        # Cada bloque ya está confirmado: el índice de búsqueda se rehace entero
+        get_search_index().invalidate()
+
+    logger.info(f"Importación de catálogo '{path}': {result['procesados']} productos, "
+                f"{len(result['errores'])} errores")
+    return result
@@ -0,0 +1,94 @@
+"""
+Navegación del catálogo por categoría (panel del POS).
+
+Los conteos por categoría (productos y productos con stock) se guardan en
+memoria y solo se recuentan cuando cambia la clave: último movimiento de
+stock y último producto (dos máximos de clave primaria, sin recorrer
+tablas). Cambiar la categoría o borrar un producto sin stock no deja
+movimiento: quien lo guarda llama a invalidate_category_counts() después del
+commit (en otra caja se ve con la próxima venta). Un clic en una categoría
+nunca recuenta. Los productos de una categoría se traen por
+páginas con el índice products(category_id, name), sin OFFSET.
+"""
+import threading
+from sqlalchemy import select, func, case, tuple_
+from src.pharmgest.config.settings import MAX_RESULTS_PER_PAGE
+from src.pharmgest.database.models import Category, Product, StockMovement
+from src.pharmgest.services.read_models import CATALOG_COLUMNS, CatalogRow, fetch
+
+NO_CATEGORY = "Sin categoría"
+
+# Últimos conteos: {"key": clave, "counts": {category_id: (productos, con stock)}}
+_counts = {"key": None, "counts": None}
+_counts_lock = threading.Lock()
+
+
+def _counts_key(session):
+    return session.execute(select(select(func.max(StockMovement.id)).scalar_subquery(),
+                                  select(func.max(Product.id)).scalar_subquery())).one()
+
+
+def invalidate_category_counts():
+    """Recontar en la próxima consulta (cambio de categoría o producto borrado, ya confirmado)"""
+    with _counts_lock:
+        _counts["key"] = None
+
+
+def _count_products(session):
+    in_stock = func.sum(case((Product.total_stock > 0, 1), else_=0))
+    rows = session.execute(
+        select(Product.category_id, func.count(), in_stock).group_by(Product.category_id)
+    ).all()
+    return {category_id: (products, in_stock or 0) for category_id, products, in_stock in rows}
+
+
+def category_counts(session):
+    """
+    [{"id", "name", "products", "in_stock"}] de cada categoría (también las
+    vacías) y, al final, "Sin categoría" (id None) si hay productos sin ella.
+    """
+    key = tuple(_counts_key(session))
+    with _counts_lock:
+        counts = _counts["counts"] if _counts["key"] == key else None
+    if counts is None:
+        counts = _count_products(session)
+        with _counts_lock:
+            _counts["key"], _counts["counts"] = key, counts
+
+    result = []
+    for category_id, name in session.execute(select(Category.id, Category.name).order_by(Category.name)):
+        products, in_stock = counts.get(category_id, (0, 0))
+        result.append({"id": category_id, "name": name, "products": products, "in_stock": in_stock})
+    if None in counts:
+        products, in_stock = counts[None]
+        result.append({"id": None, "name": NO_CATEGORY, "products": products, "in_stock": in_stock})
+    return result
+
+
+def products_in_category(session, category_id, after=None, limit=MAX_RESULTS_PER_PAGE):
+    """
+    Una página de filas del catálogo (CatalogRow) de la categoría, por
+    nombre. `after` es (nombre, id) de la última fila de la página anterior.
+    """
+    query = select(*CATALOG_COLUMNS).order_by(Product.name, Product.id).limit(limit)
+    if category_id is None:
+        query = query.where(Product.category_id.is_(None))
+    else:
+        query = query.where(Product.category_id == category_id)
+    if after is not None:
+        query = query.where(tuple_(Product.name, Product.id) > tuple_(*after))
+    return fetch(session, CatalogRow, query)
+
+
+def category_names(session):
+    return session.execute(select(Category.name).order_by(Category.name)).scalars().all()
+
+
+def category_by_name(session, name):
+    """Categoría con ese nombre; la crea si no existe (en la transacción de `session`)"""
+    category = session.execute(select(Category).where(Category.name == name)).scalar_one_or_none()
+    if category is None:
+        category = Category(name=name)
+        session.add(category)
+        session.flush()
+    return category
@@ -0,0 +1,257 @@
+"""
+Operaciones de inventario sobre lotes (ProductBatch) y stock global.
+
+El stock total de un producto siempre es la suma de sus lotes; aquí se
+recalcula con una sola sentencia UPDATE en lugar de sumar en Python. Cada
+cambio queda en el libro de movimientos (services/stock_ledger.py).
+"""
+import csv
+from datetime import datetime
+from sqlalchemy import select, insert, update, func
+from src.pharmgest.database.models import Product, ProductBatch
+from src.pharmgest.services import stock_ledger
+from src.pharmgest.services.read_models import (PRODUCT_LIST_COLUMNS, BATCH_LIST_COLUMNS, ProductRow,
+                                                BatchRow, fetch)
+
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y")
+
+# Encabezado del CSV de la nota de entrega -> clave interna
+DELIVERY_COLUMNS = {
+    "sku": "sku", "codigo": "sku", "código": "sku",
+    "lote": "batch_code", "batch_code": "batch_code",
+    "vence": "expiry_date", "vencimiento": "expiry_date", "expiry_date": "expiry_date",
+    "cantidad": "qty", "qty": "qty",
+}
+
+
+def _total_stocks(session, product_ids):
+    found = {}
+    for start in range(0, len(product_ids), 500):
+        batch = product_ids[start:start + 500]
+        found.update(session.execute(select(Product.id, Product.total_stock).where(Product.id.in_(batch))).all())
+    return found
+
+
+def recalculate_total_stock(session, product_ids, reason=None, references=None):
+    """
+    Fuente de verdad: total_stock = SUM(stock de sus lotes), en una sola sentencia.
+    Con `reason`, la diferencia de cada producto se registra en el libro de
+    movimientos (`references`: {product_id: referencia}).
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    before = _total_stocks(session, product_ids) if reason else None
+    batch_sum = select(func.coalesce(func.sum(ProductBatch.stock), 0))\
+        .where(ProductBatch.product_id == Product.id)\
+        .scalar_subquery()
+    session.execute(
+        update(Product).where(Product.id.in_(product_ids)).values(total_stock=batch_sum),
+        execution_options={"synchronize_session": False}
+    )
+    if reason:
+        references = references or {}
+        after = _total_stocks(session, product_ids)
+        stock_ledger.record_movements(session, [
+            {"product_id": pid, "quantity": stock - (before.get(pid) or 0),
+             "reason": reason, "reference": references.get(pid)}
+            for pid, stock in after.items()
+        ])
+
+
+def units_for(is_fractionable, units_per_box, qty):
+    """Cantidad recibida (cajas si es fraccionable) -> unidades reales de stock"""
+    if is_fractionable and units_per_box > 1:
+        return qty * units_per_box
+    return qty
+
+
+def register_batches(session, lines):
+    """
+    Inserta todos los lotes de una entrega en la transacción de `session`
+    y actualiza el stock de los productos afectados de una sola vez.
+
+    `lines` es una lista de dicts con product_id, batch_code, stock (unidades)
+    y expiry_date. No hace commit: lo hace quien abrió la sesión.
+    """
+    if not lines:
+        return 0
+    now = datetime.now()
+    rows = [dict(line, entry_date=line.get("entry_date", now)) for line in lines]
+    session.execute(insert(ProductBatch), rows)
+    codes = {}
+    for line in lines:
+        codes.setdefault(line["product_id"], []).append(line["batch_code"])
+    recalculate_total_stock(session, codes, stock_ledger.BATCH_IN,
+                            {pid: ", ".join(batch_codes) for pid, batch_codes in codes.items()})
+    return len(rows)
+
+
+def find_products_by_sku(session, skus):
+    """{sku: Product} para los SKUs indicados (una consulta por tanda de 500)"""
+    skus = list(skus)
+    found = {}
+    for start in range(0, len(skus), 500):
+        batch = skus[start:start + 500]
+        for product in session.query(Product).filter(Product.sku.in_(batch)):
+            found[product.sku] = product
+    return found
+
+
+class InventoryService:
+    """
+    Operaciones de inventario para la interfaz, la línea de comandos y los
+    scripts: envuelve las funciones de este módulo sobre una sesión. No hace
+    commit: lo hace quien abrió la sesión.
+    """
+    def __init__(self, session):
+        self.session = session
+
+    def add_batch(self, product_id, batch_code, qty, expiry_date):
+        """
+        Registra un lote (qty en cajas si el producto es fraccionable) y
+        recalcula el stock total. Retorna las unidades agregadas, o None si
+        el producto no existe.
+        """
+        product = self.session.get(Product, product_id)
+        if product is None:
+            return None
+        units = units_for(product.is_fractionable, product.units_per_box, qty)
+        register_batches(self.session, [{
+            "product_id": product_id,
+            "batch_code": batch_code,
+            "stock": units,
+            "expiry_date": expiry_date,
+        }])
+        return units
+
+    def delete_batch(self, batch_id):
+        """Elimina un lote y recalcula el stock de su producto. Retorna False si no existe."""
+        batch = self.session.get(ProductBatch, batch_id)
+        if batch is None:
+            return False
+        product_id = batch.product_id
+        self.session.delete(batch)
+        self.session.flush()
+        recalculate_total_stock(self.session, [product_id], stock_ledger.BATCH_OUT, {product_id: batch.batch_code})
+        return True
+
+    def delete_product(self, product_id):
+        """Elimina el producto. Retorna False si no existe."""
+        product = self.session.get(Product, product_id)
+        if product is None:
+            return False
+        stock_ledger.record_movement(self.session, product.id, -(product.total_stock or 0),
+                                     stock_ledger.DELETED, product.sku)
+        self.session.delete(product)
+        return True
+
+    def set_stock(self, product, stock, reason=stock_ledger.ADJUSTMENT):
+        """Ajuste manual del stock total (ProductDialog): la diferencia queda en el libro"""
+        self.session.flush()  # producto nuevo: necesita id
+        stock_ledger.record_movement(self.session, product.id, stock - (product.total_stock or 0), reason)
+        product.total_stock = stock
+
+    def receive(self, lines):
+        """Entrega completa (ver register_batches). Retorna la cantidad de lotes."""
+        return register_batches(self.session, lines)
+
+    def product_by_sku(self, sku):
+        return find_products_by_sku(self.session, [sku]).get(sku)
+
+    def product_list(self):
+        """Catálogo para la tabla de inventario (ProductRow, sin objetos ORM)"""
+        return fetch(self.session, ProductRow, select(*PRODUCT_LIST_COLUMNS))
+
+    def product_row(self, product_id):
+        rows = fetch(self.session, ProductRow, select(*PRODUCT_LIST_COLUMNS).where(Product.id == product_id))
+        return rows[0] if rows else None
+
+    def batches(self, product_id):
+        """Lotes del producto (BatchRow), el que vence primero al inicio"""
+        return fetch(self.session, BatchRow, select(*BATCH_LIST_COLUMNS)
+                     .where(ProductBatch.product_id == product_id)
+                     .order_by(ProductBatch.expiry_date))
+
+    def stock_at(self, at, product_ids=None):
+        """{product_id: stock} a una fecha (ver stock_ledger.stock_at)"""
+        return stock_ledger.stock_at(self.session, at, product_ids)
+
+    def movements(self, product_id, date_from=None, date_to=None):
+        return stock_ledger.movements(self.session, product_id, date_from, date_to)
+
+    def stock_levels(self, max_stock=None, at=None):
+        """
+        (sku, nombre, stock total) de todo el catálogo, o solo de los que tienen
+        <= max_stock. Con `at`, el stock que había a esa fecha según el libro.
+        """
+        if at is not None:
+            past = self.stock_at(at)
+            rows = [(sku, name, past.get(pid, 0))
+                    for pid, sku, name in self.session.execute(select(Product.id, Product.sku, Product.name))]
+            if max_stock is not None:
+                rows = [row for row in rows if row[2] <= max_stock]
+            return sorted(rows, key=lambda row: (row[2], row[1]))
+        query = select(Product.sku, Product.name, Product.total_stock).order_by(Product.total_stock, Product.name)
+        if max_stock is not None:
+            query = query.where(Product.total_stock <= max_stock)
+        return self.session.execute(query).all()
+
+
+def parse_expiry(value):
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha de vencimiento inválida: {value!r}")
+
+
+def read_delivery_csv(path):
+    """
+    Lee una nota de entrega (sku, lote, vence, cantidad).
+
+    Retorna (filas, errores): filas con sku/batch_code/expiry_date/qty y
+    errores como (linea, mensaje). La cantidad se interpreta igual que en
+    BatchDialog: cajas para productos fraccionables, unidades para el resto.
+    """
+    rows, errors = [], []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+
+        header = next(reader, None) or []
+        columns = {}
+        for index, name in enumerate(header):
+            key = DELIVERY_COLUMNS.get(name.strip().lower())
+            if key:
+                columns[key] = index
+        missing = [k for k in ("sku", "batch_code", "expiry_date", "qty") if k not in columns]
+        if missing:
+            raise ValueError(f"Faltan columnas en la nota de entrega: {', '.join(missing)}")
+
+        for line_no, raw in enumerate(reader, start=2):
+            if not any(cell.strip() for cell in raw):
+                continue
+            try:
+                values = {key: raw[index].strip() for key, index in columns.items()}
+                if not values["sku"] or not values["batch_code"]:
+                    raise ValueError("SKU y lote son obligatorios")
+                qty = int(values["qty"])
+                if qty < 1:
+                    raise ValueError("La cantidad debe ser mayor que cero")
+                rows.append({
+                    "sku": values["sku"],
+                    "batch_code": values["batch_code"],
+                    "expiry_date": parse_expiry(values["expiry_date"]),
+                    "qty": qty,
+                })
+            except (ValueError, IndexError) as e:
+                errors.append((line_no, str(e) or "Fila incompleta"))
+    return rows, errors
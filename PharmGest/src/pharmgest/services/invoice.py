@@ -1,15 +1,30 @@
 import os
+import tempfile
+from io import BytesIO
 from datetime import datetime
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
+from sqlalchemy import select
+from src.pharmgest.config.database import get_read_session
+from src.pharmgest.database.models import Product, all_sales, all_sale_details
+from src.pharmgest.services.catalog_import import LOOKUP_CHUNK
+from src.pharmgest.services.invoice_storage import (shard_path, register_invoice, locate_invoice,
+                                                    read_invoice, pack_closed_months, migrate_flat_invoices,
+                                                    flat_invoice_ids)
 
-def generate_invoice_pdf(sale_id, items, total, user_name="Admin"):
-    # 1. Crear carpeta de facturas si no existe
-    if not os.path.exists("facturas"):
-        os.makedirs("facturas")
-    
-    filename = f"facturas/factura_{sale_id}.pdf"
+# Subir al cambiar el dibujo de la factura: `cli facturas` regenera las guardadas
+# con una versión anterior (1: diseño original, 2: NCF en el encabezado)
+INVOICE_LAYOUT_VERSION = 2
+
+def generate_invoice_pdf(sale_id, items, total, user_name="Admin", sale_date=None, target=None, ncf=None):
+    """
+    Dibuja la factura. Sin `target` la guarda en facturas/AAAA/MM/ y la
+    registra en el índice (retorna la ruta); con `target` (p.ej. BytesIO)
+    escribe ahí y no toca el disco.
+    """
+    sale_date = sale_date or datetime.now()
+    filename = target if target is not None else shard_path(sale_id, sale_date)
     c = canvas.Canvas(filename, pagesize=letter)
     width, height = letter
 
@@ -23,8 +38,12 @@ def generate_invoice_pdf(sale_id, items, total, user_name="Admin"):
     c.drawString(50, height - 100, f"Tel: (809) 555-0101")
     
     # Datos de la Venta
+    if ncf:
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(400, height - 55, f"NCF: {ncf}")
+        c.setFont("Helvetica", 10)
     c.drawString(400, height - 70, f"NO. FACTURA: {sale_id:06d}")
-    c.drawString(400, height - 85, f"FECHA: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+    c.drawString(400, height - 85, f"FECHA: {sale_date.strftime('%d/%m/%Y %H:%M')}")
     c.drawString(400, height - 100, f"CAJERO: {user_name}")
 
     # --- LÍNEA SEPARADORA ---
@@ -66,4 +85,96 @@ def generate_invoice_pdf(sale_id, items, total, user_name="Admin"):
     c.drawString(50, 50, "¡Gracias por su compra! - Sistema PharmGest ERP")
     
     c.save()
-    return filename
\ No newline at end of file
+    if target is None:
+        register_invoice(sale_id, filename, layout_version=INVOICE_LAYOUT_VERSION)
+    return filename
+
+
+def load_invoice_data(session, sale_id):
+    """(fecha, total, items, ncf) de una venta (activa o archivada) en el formato de generate_invoice_pdf"""
+    return load_invoice_batch(session, [sale_id]).get(sale_id)
+
+
+def load_invoice_batch(session, sale_ids):
+    """
+    {sale_id: (fecha, total, items, ncf)} de varias ventas con dos consultas.
+    Los ids van como lista constante: SQLite busca por clave en cada rama de
+    las vistas unificadas. Los ids que no existen no aparecen.
+    """
+    invoices = {sale.id: (sale.date, sale.total, [], sale.ncf) for sale in session.execute(
+        select(all_sales.c.id, all_sales.c.date, all_sales.c.total, all_sales.c.ncf)
+        .where(all_sales.c.id.in_(sale_ids)))}
+    if not invoices:
+        return invoices
+    rows = session.execute(
+        select(all_sale_details.c.sale_id, all_sale_details.c.quantity, all_sale_details.c.unit_price,
+               all_sale_details.c.subtotal, all_sale_details.c.is_box_sale, Product.name)
+        .select_from(all_sale_details)
+        .outerjoin(Product, Product.id == all_sale_details.c.product_id)
+        .where(all_sale_details.c.sale_id.in_(list(invoices)))
+        .order_by(all_sale_details.c.sale_id, all_sale_details.c.id)
+    )
+    for r in rows:
+        invoices[r.sale_id][2].append({
+            "qty": r.quantity,
+            "name": f"{r.name or 'Producto Eliminado'} ({'CAJA' if r.is_box_sale else 'UNIDAD'})",
+            "price": r.unit_price,
+            "subtotal": r.subtotal,
+        })
+    return invoices
+
+
+def render_invoice_from_db(sale_id, user_name="Admin"):
+    """Genera la factura en memoria a partir de la BD. Retorna los bytes del PDF o None."""
+    with get_read_session() as session:
+        data = load_invoice_data(session, sale_id)
+    if data is None:
+        return None
+    sale_date, total, items, ncf = data
+    buffer = BytesIO()
+    generate_invoice_pdf(sale_id, items, total, user_name, sale_date=sale_date, target=buffer, ncf=ncf)
+    return buffer.getvalue()
+
+
+def get_invoice_file(sale_id):
+    """
+    Ruta de un PDF que se pueda abrir con el visor del sistema.
+    Busca en el índice (PDF suelto o zip del mes); si no está guardada
+    (o se trabaja en modo "memoria") la genera desde la BD en un temporal.
+    """
+    location = locate_invoice(sale_id)
+    if location is not None:
+        path, member = location
+        if member is None and os.path.exists(path):
+            return path
+        data = read_invoice(sale_id)
+        if data is not None:
+            return _write_temp(sale_id, data)
+
+    data = render_invoice_from_db(sale_id)
+    if data is None:
+        return None
+    return _write_temp(sale_id, data)
+
+
+def _write_temp(sale_id, data):
+    path = os.path.join(tempfile.gettempdir(), f"pharmgest_factura_{sale_id}.pdf")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def organize_invoices():
+    """Mueve los PDF del formato plano antiguo a carpetas por fecha y empaqueta los meses cerrados"""
+    flat_ids = flat_invoice_ids()
+    if flat_ids:
+        sale_dates = {}
+        with get_read_session() as session:
+            # Por tandas: un IN con decenas de miles de ids pasa el límite de variables de SQLite
+            for start in range(0, len(flat_ids), LOOKUP_CHUNK):
+                chunk = flat_ids[start:start + LOOKUP_CHUNK]
+                sale_dates.update(session.execute(
+                    select(all_sales.c.id, all_sales.c.date).where(all_sales.c.id.in_(chunk))
+                ).all())
+        migrate_flat_invoices(sale_dates)
+    return pack_closed_months()
\ No newline at end of file
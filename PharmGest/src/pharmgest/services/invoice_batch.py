@@ -0,0 +1,119 @@
+"""
+Regeneración masiva de facturas PDF: después de cambiar el diseño
+(INVOICE_LAYOUT_VERSION) o para reemitir un período en una auditoría.
+
+Las ventas se leen de la BD por tandas de FACTURAS_LOTE (cabeceras y líneas
+en dos consultas, load_invoice_batch) y cada tanda se dibuja en un proceso
+del pool: ReportLab es Python puro y con hilos no pasaría del GIL. Los
+procesos escriben los PDF; el índice de facturas lo actualiza solo el
+proceso principal, una transacción por tanda. Las facturas ya guardadas con
+la versión actual del diseño se saltan, salvo force=True.
+
+    result = regenerate_invoices(date_from=datetime(2025, 1, 1), date_to=datetime(2025, 2, 1))
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from io import BytesIO
+from sqlalchemy import select
+from src.pharmgest.config.database import get_read_session
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import INVOICE_DIR, FACTURAS_PROCESOS, FACTURAS_LOTE
+from src.pharmgest.database.models import all_sales
+from src.pharmgest.services.invoice import generate_invoice_pdf, load_invoice_batch, INVOICE_LAYOUT_VERSION
+from src.pharmgest.services.invoice_storage import shard_path, register_invoices, current_invoices
+
+
+def render_invoices(jobs, root=INVOICE_DIR):
+    """
+    Corre en un proceso del pool: dibuja una tanda de facturas
+    [(sale_id, fecha, total, items, ncf)] en su carpeta del mes.
+    Retorna [(sale_id, ruta)] para registrarlas en el índice.
+    """
+    done = []
+    for sale_id, sale_date, total, items, ncf in jobs:
+        buffer = BytesIO()
+        generate_invoice_pdf(sale_id, items, total, sale_date=sale_date, target=buffer, ncf=ncf)
+        path = shard_path(sale_id, sale_date, root)
+        # A un temporal y después reemplazar: la factura anterior sigue entera si algo falla
+        partial = path + ".tmp"
+        with open(partial, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(partial, path)
+        done.append((sale_id, path))
+    return done
+
+
+def _id_chunks(session, sale_ids, date_from, date_to, size):
+    """Ids de venta en tandas de `size`: los pedidos, o los del rango de fechas leídos por tandas"""
+    if sale_ids is not None:
+        ids = sorted(set(sale_ids))
+        for start in range(0, len(ids), size):
+            yield ids[start:start + size]
+        return
+    query = select(all_sales.c.id).order_by(all_sales.c.id)
+    if date_from is not None:
+        query = query.where(all_sales.c.date >= date_from)
+    if date_to is not None:
+        query = query.where(all_sales.c.date < date_to)
+    for chunk in session.execute(query, execution_options={"yield_per": size}).scalars().partitions():
+        yield list(chunk)
+
+
+def regenerate_invoices(sale_ids=None, date_from=None, date_to=None, force=False,
+                        processes=FACTURAS_PROCESOS, chunk_size=FACTURAS_LOTE, progress=None):
+    """
+    Vuelve a dibujar y guardar las facturas de `sale_ids` o de las ventas
+    con fecha en [date_from, date_to) (sin límites: todas). `processes`:
+    0 = uno por núcleo, 1 = en este mismo proceso. `progress(result)` se
+    llama después de cada tanda registrada.
+    Retorna {"rendered", "skipped" (ya al día), "missing" (ids que no
+    existen), "seconds", "per_second"}.
+    """
+    processes = processes or os.cpu_count() or 1
+    result = {"rendered": 0, "skipped": 0, "missing": 0, "seconds": 0.0, "per_second": 0.0}
+    start = time.perf_counter()
+
+    def collect(entries):
+        register_invoices(entries, layout_version=INVOICE_LAYOUT_VERSION)
+        result["rendered"] += len(entries)
+        result["seconds"] = time.perf_counter() - start
+        result["per_second"] = result["rendered"] / result["seconds"] if result["seconds"] else 0.0
+        if progress:
+            progress(result)
+
+    # spawn también en Linux: un fork copiaría las conexiones abiertas del pool de SQLAlchemy
+    pool = (ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+            if processes > 1 else None)
+    pending = set()
+    try:
+        with get_read_session() as session:
+            for chunk in _id_chunks(session, sale_ids, date_from, date_to, chunk_size):
+                todo = chunk if force else sorted(set(chunk) - current_invoices(chunk, INVOICE_LAYOUT_VERSION))
+                result["skipped"] += len(chunk) - len(todo)
+                if not todo:
+                    continue
+                data = load_invoice_batch(session, todo)
+                result["missing"] += len(todo) - len(data)
+                jobs = [(sale_id, *data[sale_id]) for sale_id in todo if sale_id in data]
+                if pool is None:
+                    collect(render_invoices(jobs))
+                    continue
+                pending.add(pool.submit(render_invoices, jobs))
+                # Como mucho dos tandas por proceso en vuelo: la memoria no crece con el rango
+                if len(pending) >= processes * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future.result())
+        for future in wait(pending)[0]:
+            collect(future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    result["seconds"] = time.perf_counter() - start
+    result["per_second"] = result["rendered"] / result["seconds"] if result["seconds"] else 0.0
+    logger.info(f"Facturas regeneradas: {result['rendered']} en {result['seconds']:.1f} s "
+                f"({result['per_second']:.0f}/s), {result['skipped']} ya al día, {result['missing']} sin venta")
+    return result
@@ -0,0 +1,232 @@
+"""
+Almacenamiento escalable de facturas PDF.
+
+- Carpetas por fecha: facturas/AAAA/MM/factura_{id}.pdf (nunca una carpeta gigante).
+- Los meses cerrados se empaquetan en facturas/AAAA/MM.zip.
+- facturas/indice.db guarda dónde está cada factura (sale_id -> archivo o
+  miembro del zip), así que buscar por número de venta es una lectura por
+  clave primaria, sin listar carpetas; también con qué versión del diseño
+  se dibujó (layout_version, NULL si es anterior a que se guardara).
+"""
+import os
+import sqlite3
+import threading
+import zipfile
+from datetime import datetime
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import INVOICE_DIR
+
+INDEX_NAME = "indice.db"
+_index_lock = threading.Lock()
+_upgraded_roots = set()
+
+
+def _connect_index(root=INVOICE_DIR):
+    os.makedirs(root, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(root, INDEX_NAME), timeout=10)
+    conn.execute("""CREATE TABLE IF NOT EXISTS invoices (
+        sale_id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,          -- relativo a la raíz: el PDF suelto o el .zip del mes
+        member TEXT,                 -- nombre dentro del zip (NULL si es un PDF suelto)
+        created_at TEXT NOT NULL,
+        layout_version INTEGER)      -- versión del diseño de la factura (NULL: desconocida)""")
+    if root not in _upgraded_roots:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(invoices)")}
+        if "layout_version" not in columns:
+            conn.execute("ALTER TABLE invoices ADD COLUMN layout_version INTEGER")
+        _upgraded_roots.add(root)
+    return conn
+
+
+def shard_path(sale_id, sale_date=None, root=INVOICE_DIR):
+    """Ruta del PDF suelto para una venta (crea la carpeta del mes)"""
+    sale_date = sale_date or datetime.now()
+    folder = os.path.join(root, f"{sale_date:%Y}", f"{sale_date:%m}")
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"factura_{sale_id}.pdf")
+
+
+def register_invoice(sale_id, path, member=None, root=INVOICE_DIR, layout_version=None):
+    register_invoices([(sale_id, path)], member=member, root=root, layout_version=layout_version)
+
+
+def register_invoices(entries, member=None, root=INVOICE_DIR, layout_version=None):
+    """Registra varias facturas [(sale_id, ruta)] en una sola transacción del índice"""
+    now = datetime.now().isoformat(" ", "seconds")
+    with _index_lock:
+        conn = _connect_index(root)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO invoices (sale_id, path, member, created_at, layout_version) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(sale_id, os.path.relpath(path, root), member, now, layout_version)
+                     for sale_id, path in entries])
+        finally:
+            conn.close()
+
+
+def current_invoices(sale_ids, layout_version, root=INVOICE_DIR):
+    """
+    Ids de `sale_ids` con factura guardada en la versión `layout_version`
+    (y el PDF suelto todavía en su lugar): no hace falta volver a dibujarlas.
+    """
+    if not sale_ids:
+        return set()
+    conn = _connect_index(root)
+    try:
+        rows = conn.execute(
+            f"SELECT sale_id, path, member FROM invoices WHERE layout_version = ? "
+            f"AND sale_id IN ({','.join('?' * len(sale_ids))})", (layout_version, *sale_ids)).fetchall()
+    finally:
+        conn.close()
+    return {sale_id for sale_id, path, member in rows
+            if member is not None or os.path.exists(os.path.join(root, path))}
+
+
+def locate_invoice(sale_id, root=INVOICE_DIR):
+    """(ruta_absoluta, miembro_zip_o_None) de la factura, o None si no está guardada"""
+    conn = _connect_index(root)
+    try:
+        row = conn.execute("SELECT path, member FROM invoices WHERE sale_id = ?", (sale_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return os.path.join(root, row[0]), row[1]
+
+
+def read_invoice(sale_id, root=INVOICE_DIR):
+    """Bytes del PDF guardado (suelto o dentro del zip del mes), o None"""
+    location = locate_invoice(sale_id, root)
+    if location is None:
+        return None
+    path, member = location
+    try:
+        if member is None:
+            with open(path, "rb") as f:
+                return f.read()
+        with zipfile.ZipFile(path) as archive:
+            return archive.read(member)
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        logger.warning(f"Factura {sale_id} indexada pero ilegible en {path}: {e}")
+        return None
+
+
+def pack_closed_months(root=INVOICE_DIR, today=None):
+    """
+    Empaqueta en AAAA/MM.zip cada carpeta de un mes ya cerrado y borra los
+    PDF sueltos. Retorna la cantidad de facturas empaquetadas.
+    """
+    today = today or datetime.now()
+    current = (today.year, today.month)
+    packed = 0
+    if not os.path.isdir(root):
+        return 0
+
+    for year in sorted(os.listdir(root)):
+        year_dir = os.path.join(root, year)
+        if not (year.isdigit() and os.path.isdir(year_dir)):
+            continue
+        for month in sorted(os.listdir(year_dir)):
+            month_dir = os.path.join(year_dir, month)
+            if not (month.isdigit() and os.path.isdir(month_dir)):
+                continue
+            if (int(year), int(month)) >= current:
+                continue
+            packed += _pack_month(root, month_dir, month_dir + ".zip")
+    if packed:
+        logger.info(f"Facturas: {packed} PDF empaquetados en archivos mensuales")
+    return packed
+
+
+def _pack_month(root, month_dir, zip_path):
+    # Solo factura_<id>.pdf: otros PDF copiados a mano se quedan donde están
+    entries = [(_sale_id_of(name), name) for name in os.listdir(month_dir)]
+    entries = [(sale_id, name) for sale_id, name in entries if sale_id is not None]
+    files = [name for _, name in entries]
+    existing = set()
+    if os.path.exists(zip_path):
+        with zipfile.ZipFile(zip_path) as archive:
+            existing = set(archive.namelist())
+
+    if existing & set(files):
+        # Facturas regeneradas de un mes ya empaquetado: un zip no reemplaza
+        # miembros, se rearma con las nuevas en lugar de las viejas
+        partial = zip_path + ".tmp"
+        with zipfile.ZipFile(zip_path) as old, \
+                zipfile.ZipFile(partial, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for info in old.infolist():
+                if info.filename not in files:
+                    archive.writestr(info, old.read(info))
+            for name in files:
+                archive.write(os.path.join(month_dir, name), arcname=name)
+        os.replace(partial, zip_path)
+    else:
+        with zipfile.ZipFile(zip_path, "a", compression=zipfile.ZIP_DEFLATED) as archive:
+            for name in files:
+                archive.write(os.path.join(month_dir, name), arcname=name)
+
+    # Primero el índice apunta al zip, después se borran los sueltos
+    rel_zip = os.path.relpath(zip_path, root)
+    with _index_lock:
+        conn = _connect_index(root)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO invoices (sale_id, path, member, created_at, layout_version) "
+                    "VALUES (?, ?, ?, COALESCE((SELECT created_at FROM invoices WHERE sale_id = ?), ?), "
+                    "(SELECT layout_version FROM invoices WHERE sale_id = ?))",
+                    [(sale_id, rel_zip, name, sale_id, datetime.now().isoformat(" ", "seconds"), sale_id)
+                     for sale_id, name in entries])
+        finally:
+            conn.close()
+
+    for name in files:
+        os.remove(os.path.join(month_dir, name))
+    if not os.listdir(month_dir):
+        os.rmdir(month_dir)
+    return len(entries)
+
+
+def migrate_flat_invoices(sale_dates, root=INVOICE_DIR):
+    """
+    Mueve los factura_{id}.pdf antiguos de la raíz a su carpeta por fecha.
+    `sale_dates` es {sale_id: fecha}; los que no aparezcan se dejan donde están.
+    """
+    moved = 0
+    if not os.path.isdir(root):
+        return 0
+    for name in os.listdir(root):
+        if not (name.startswith("factura_") and name.endswith(".pdf")):
+            continue
+        try:
+            sale_id = int(name[len("factura_"):-len(".pdf")])
+        except ValueError:
+            continue
+        if sale_id not in sale_dates:
+            continue
+        target = shard_path(sale_id, sale_dates[sale_id], root)
+        os.replace(os.path.join(root, name), target)
+        register_invoice(sale_id, target, root=root)
+        moved += 1
+    if moved:
+        logger.info(f"Facturas: {moved} PDF movidos a carpetas por fecha")
+    return moved
+
+
+def _sale_id_of(name):
+    """Id de venta de 'factura_<id>.pdf'; None si el nombre no es de una factura"""
+    if name.startswith("factura_") and name.endswith(".pdf"):
+        try:
+            return int(name[len("factura_"):-len(".pdf")])
+        except ValueError:
+            pass
+    return None
+
+
+def flat_invoice_ids(root=INVOICE_DIR):
+    """Ids de venta con PDF todavía en la raíz (formato antiguo)"""
+    if not os.path.isdir(root):
+        return []
+    return [sale_id for sale_id in map(_sale_id_of, os.listdir(root)) if sale_id is not None]
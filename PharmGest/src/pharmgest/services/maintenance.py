@@ -0,0 +1,100 @@
+"""
+Mantenimiento de SQLite: checkpoints del WAL y estadísticas del planificador.
+
+- checkpoint("PASSIVE"): no espera a nadie; se usa cuando la caja está inactiva.
+- checkpoint("TRUNCATE"): espera a los lectores y deja el -wal en cero; cierre del día.
+- optimize() / analyze(): mantienen al día las estadísticas del planificador de consultas.
+
+Cada operación actualiza METRICS, que la interfaz muestra en la barra de estado.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import text
+from src.pharmgest.config.database import engine, DB_PATH
+from src.pharmgest.config.logging_config import logger
+
+METRICS = {
+    "wal_bytes": 0,
+    "checkpoints": 0,
+    "ultimo_checkpoint": None,   # dict: modo, duracion_ms, frames_wal, frames_movidos, ocupado, fecha
+    "ultimo_optimize": None,     # dict: comando, duracion_ms, fecha
+}
+
+# Evita que dos tareas de mantenimiento corran a la vez
+_maintenance_lock = threading.Lock()
+
+
+def wal_size_bytes(db_path=DB_PATH):
+    try:
+        return os.path.getsize(f"{db_path}-wal")
+    except OSError:
+        return 0
+
+
+def _run_autocommit(sql):
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        return conn.exec_driver_sql(sql).fetchone()
+
+
+def checkpoint(mode="PASSIVE"):
+    """
+    Ejecuta PRAGMA wal_checkpoint(mode) sobre la BD principal.
+    Retorna el dict de métricas del checkpoint.
+    """
+    with _maintenance_lock:
+        start = time.perf_counter()
+        busy, log_frames, moved_frames = _run_autocommit(f"PRAGMA main.wal_checkpoint({mode})")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+    result = {
+        "modo": mode,
+        "duracion_ms": round(elapsed_ms, 2),
+        "frames_wal": log_frames,
+        "frames_movidos": moved_frames,
+        "ocupado": bool(busy),
+        "fecha": datetime.now(),
+    }
+    METRICS["checkpoints"] += 1
+    METRICS["ultimo_checkpoint"] = result
+    METRICS["wal_bytes"] = wal_size_bytes()
+    logger.info(f"Checkpoint {mode}: {moved_frames}/{log_frames} frames en {elapsed_ms:.1f} ms "
+                f"(ocupado={bool(busy)}, WAL={METRICS['wal_bytes'] / 1024:,.0f} KB)")
+    return result
+
+
+def _timed(command):
+    with _maintenance_lock:
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text(command))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    METRICS["ultimo_optimize"] = {"comando": command, "duracion_ms": round(elapsed_ms, 2),
+                                  "fecha": datetime.now()}
+    logger.info(f"{command}: {elapsed_ms:.1f} ms")
+    return elapsed_ms
+
+
+def optimize():
+    """PRAGMA optimize: barato, solo analiza lo que SQLite considera desactualizado"""
+    return _timed("PRAGMA optimize")
+
+
+def analyze():
+    """ANALYZE completo de la BD principal (para el cierre del día)"""
+    return _timed("ANALYZE main")
+
+
+def day_close_maintenance():
+    """Checkpoint TRUNCATE + ANALYZE: se ejecuta una vez al día, fuera de horario"""
+    result = checkpoint("TRUNCATE")
+    analyze()
+    return result
+
+
+def get_metrics():
+    """Copia de las métricas actuales con el tamaño del WAL recién medido"""
+    METRICS["wal_bytes"] = wal_size_bytes()
+    return dict(METRICS)
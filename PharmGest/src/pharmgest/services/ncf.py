@@ -0,0 +1,239 @@
+"""
+Numeración fiscal (NCF) por bloques.
+
+Las secuencias autorizadas (tipo B02, desde-hasta, vencimiento) se cargan en
+ncf_sequences. Una caja no pide un número por venta: reserva NCF_BLOQUE
+números en una transacción corta (reserve_block) y los entrega desde su cola
+local (SaleQueue), en la misma transacción local que guarda la venta. El
+contador compartido se toca una vez cada NCF_BLOQUE ventas por caja.
+
+Estados de un bloque:
+
+- asignado: en manos de una caja.
+- agotado: la caja terminó de usarlo (last_number es el último que usó).
+- liberado: números sin usar que devolvió una caja (cierre del día, bloque
+  vencido): el próximo reserve_block de cualquier caja los toma antes que
+  el contador, así no quedan huecos.
+- anulado: sin usar y con la secuencia vencida, o un número suelto que se
+  entregó y no quedó en ninguna venta (void_number): se informan como anulados.
+"""
+from datetime import datetime, date
+from sqlalchemy import select, update, func, or_, exists
+from src.pharmgest.config.database import get_db_session
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import NCF_PREFIJO, NCF_DIGITOS, NCF_BLOQUE
+from src.pharmgest.database.models import NcfSequence, NcfBlock, all_sales
+
+ASSIGNED = "asignado"
+USED = "agotado"
+RELEASED = "liberado"
+VOIDED = "anulado"
+
+
+def format_ncf(prefix, number):
+    return f"{prefix}{number:0{NCF_DIGITOS}d}"
+
+
+def add_sequence(session, prefix, first_number, last_number, expires_on):
+    """Carga un rango autorizado; no puede pisar otro del mismo tipo"""
+    prefix = prefix.strip().upper()
+    if first_number < 1 or last_number < first_number:
+        raise ValueError(f"Rango inválido: {first_number} a {last_number}")
+    if last_number >= 10 ** NCF_DIGITOS:
+        raise ValueError(f"El NCF tiene {NCF_DIGITOS} dígitos: {last_number} no entra")
+    overlap = session.execute(select(NcfSequence.id).where(
+        NcfSequence.prefix == prefix, NcfSequence.first_number <= last_number,
+        NcfSequence.last_number >= first_number)).first()
+    if overlap is not None:
+        raise ValueError(f"El rango {format_ncf(prefix, first_number)} a {format_ncf(prefix, last_number)} "
+                         f"se superpone con una secuencia ya cargada")
+    sequence = NcfSequence(prefix=prefix, first_number=first_number, last_number=last_number,
+                           next_number=first_number, expires_on=expires_on)
+    session.add(sequence)
+    session.flush()
+    return sequence
+
+
+def _valid_sequences(prefix, today):
+    return select(NcfSequence.id).where(NcfSequence.prefix == prefix, NcfSequence.expires_on >= today)
+
+
+def reserve_block(session, terminal_id, prefix=NCF_PREFIJO, size=NCF_BLOQUE, today=None):
+    """
+    Reserva números para `terminal_id`: un bloque liberado si hay, si no del
+    contador de la secuencia vigente que vence primero. No hace commit
+    (hágalo enseguida: la transacción tiene el candado de escritura).
+    Lanza LookupError si no quedan números autorizados.
+    """
+    today = today or date.today()
+    valid = _valid_sequences(prefix, today)
+    released = select(func.min(NcfBlock.id)).where(NcfBlock.status == RELEASED, NcfBlock.sequence_id.in_(valid))
+    # Consulta previa sin candado: si no hay números, no se frena a las demás cajas
+    available = session.execute(select(NcfSequence.id).where(
+        NcfSequence.id.in_(valid),
+        or_(NcfSequence.next_number <= NcfSequence.last_number,
+            exists().where(NcfBlock.sequence_id == NcfSequence.id, NcfBlock.status == RELEASED)))).first()
+    if available is None:
+        raise LookupError(f"No quedan NCF {prefix} autorizados: cargue una secuencia nueva")
+
+    # La primera escritura toma el candado: lo que se lee después no cambia hasta el commit
+    now = datetime.now()
+    claimed = session.execute(
+        update(NcfBlock).where(NcfBlock.id == released.scalar_subquery(), NcfBlock.status == RELEASED)
+        .values(status=ASSIGNED, terminal_id=terminal_id, reserved_at=now, closed_at=None)
+        .returning(NcfBlock.id)
+    ).scalar()
+    if claimed is not None:
+        return session.get(NcfBlock, claimed)
+
+    sequence = session.execute(
+        select(NcfSequence).where(NcfSequence.id.in_(valid), NcfSequence.next_number <= NcfSequence.last_number)
+        .order_by(NcfSequence.expires_on, NcfSequence.id).limit(1)
+    ).scalar_one_or_none()
+    if sequence is None:
+        raise LookupError(f"No quedan NCF {prefix} autorizados: cargue una secuencia nueva")
+    last = min(sequence.next_number + size - 1, sequence.last_number)
+    block = NcfBlock(sequence=sequence, terminal_id=terminal_id, first_number=sequence.next_number,
+                     last_number=last, status=ASSIGNED, reserved_at=now)
+    sequence.next_number = last + 1
+    session.add(block)
+    session.flush()
+    return block
+
+
+def terminal_blocks(session, terminal_id):
+    """Bloques asignados a una caja"""
+    return session.execute(
+        select(NcfBlock).where(NcfBlock.terminal_id == terminal_id, NcfBlock.status == ASSIGNED)
+        .order_by(NcfBlock.id)
+    ).scalars().all()
+
+
+def first_unused(session, block):
+    """
+    Primer número del bloque después del último que figura en una venta o
+    quedó anulado: desde ahí sigue una caja que recupera un bloque (cola
+    local perdida o reinstalada).
+    """
+    prefix = block.sequence.prefix
+    last = session.execute(select(func.max(all_sales.c.ncf)).where(all_sales.c.ncf.between(
+        format_ncf(prefix, block.first_number), format_ncf(prefix, block.last_number)))).scalar()
+    last_voided = session.execute(select(func.max(NcfBlock.last_number)).where(
+        NcfBlock.sequence_id == block.sequence_id, NcfBlock.status == VOIDED,
+        NcfBlock.first_number >= block.first_number, NcfBlock.last_number <= block.last_number)).scalar()
+    return max(int(last[len(prefix):]) if last else block.first_number - 1,
+               last_voided or block.first_number - 1) + 1
+
+
+def close_block(session, block_id, last_used, today=None):
+    """
+    La caja dejó de usar el bloque; `last_used` es el último número que
+    entregó (first_number - 1 si ninguno). Lo que sobra queda liberado, o
+    anulado si la secuencia venció. Si el bloque ya estaba cerrado no hace nada.
+    """
+    today = today or date.today()
+    block = session.get(NcfBlock, block_id)
+    if block is None:
+        return
+    expired = block.sequence.expires_on < today
+    used = last_used >= block.first_number
+    rest = (max(last_used + 1, block.first_number), block.last_number)
+    now = datetime.now()
+    # Condicional: si dos hilos cierran el mismo bloque, solo uno reparte el sobrante
+    closed = session.execute(
+        update(NcfBlock).where(NcfBlock.id == block_id, NcfBlock.status == ASSIGNED)
+        .values(status=USED if used else (VOIDED if expired else RELEASED),
+                last_number=min(last_used, block.last_number) if used else block.last_number,
+                terminal_id=block.terminal_id if used or expired else None, closed_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if closed and used and rest[0] <= rest[1]:
+        session.add(NcfBlock(sequence_id=block.sequence_id, first_number=rest[0], last_number=rest[1],
+                             status=VOIDED if expired else RELEASED, reserved_at=now, closed_at=now))
+    session.flush()
+
+
+def void_number(session, number, terminal_id=None):
+    """
+    Un NCF entregado que no quedó en ninguna venta (venta en cola que no se
+    pudo registrar, venta revertida): bloque anulado de un solo número. No
+    hace commit. Retorna False si el número está en una venta, ya estaba
+    anulado o no es de ninguna secuencia cargada.
+    """
+    prefix, value = number[:-NCF_DIGITOS], int(number[-NCF_DIGITOS:])
+    if session.execute(select(all_sales.c.id).where(all_sales.c.ncf == number)).first() is not None:
+        return False
+    sequence_id = session.execute(select(NcfSequence.id).where(
+        NcfSequence.prefix == prefix, NcfSequence.first_number <= value, NcfSequence.last_number >= value)).scalar()
+    if sequence_id is None:
+        logger.warning(f"NCF {number} no pertenece a ninguna secuencia cargada: no se anula")
+        return False
+    voided = session.execute(select(NcfBlock.id).where(
+        NcfBlock.sequence_id == sequence_id, NcfBlock.status == VOIDED,
+        NcfBlock.first_number <= value, NcfBlock.last_number >= value)).first()
+    if voided is not None:
+        return False
+    now = datetime.now()
+    session.add(NcfBlock(sequence_id=sequence_id, terminal_id=terminal_id, first_number=value, last_number=value,
+                         status=VOIDED, reserved_at=now, closed_at=now))
+    session.flush()
+    return True
+
+
+def void_expired_ncf(today=None):
+    """
+    Tarea del cierre del día: los números de secuencias vencidas que ninguna
+    caja tiene (sin reservar o liberados) pasan a anulados.
+    """
+    today = today or date.today()
+    now = datetime.now()
+    expired = select(NcfSequence.id).where(NcfSequence.expires_on < today)
+    with get_db_session() as session:
+        voided = session.execute(
+            update(NcfBlock).where(NcfBlock.status == RELEASED, NcfBlock.sequence_id.in_(expired))
+            .values(status=VOIDED, closed_at=now)
+        ).rowcount
+        tails = session.execute(select(NcfSequence).where(
+            NcfSequence.expires_on < today, NcfSequence.next_number <= NcfSequence.last_number)).scalars().all()
+        for sequence in tails:
+            session.add(NcfBlock(sequence_id=sequence.id, first_number=sequence.next_number,
+                                 last_number=sequence.last_number, status=VOIDED, reserved_at=now, closed_at=now))
+            sequence.next_number = sequence.last_number + 1
+    if voided or tails:
+        logger.info(f"NCF anulados por vencimiento: {voided} bloques liberados y {len(tails)} sin reservar")
+    return voided + len(tails)
+
+
+def ncf_status(session, today=None):
+    """
+    Por secuencia: {"prefix", "first", "last", "expires_on", "expired",
+    "free", "asignado", "agotado", "liberado", "anulado"} en cantidad de números.
+    """
+    today = today or date.today()
+    size = NcfBlock.last_number - NcfBlock.first_number + 1
+    totals = {}
+    for sequence_id, status, count in session.execute(
+            select(NcfBlock.sequence_id, NcfBlock.status, func.sum(size))
+            .group_by(NcfBlock.sequence_id, NcfBlock.status)):
+        totals.setdefault(sequence_id, {})[status] = count
+    result = []
+    for sequence in session.execute(select(NcfSequence).order_by(NcfSequence.prefix, NcfSequence.first_number)
+                                    ).scalars():
+        counts = totals.get(sequence.id, {})
+        result.append({
+            "prefix": sequence.prefix, "first": sequence.first_number, "last": sequence.last_number,
+            "expires_on": sequence.expires_on, "expired": sequence.expires_on < today,
+            "free": sequence.last_number - sequence.next_number + 1,
+            **{status: counts.get(status, 0) for status in (ASSIGNED, USED, RELEASED, VOIDED)},
+        })
+    return result
+
+
+def voided_ranges(session):
+    """(desde, hasta) de los NCF anulados, para informarlos"""
+    rows = session.execute(
+        select(NcfSequence.prefix, NcfBlock.first_number, NcfBlock.last_number)
+        .join(NcfSequence, NcfSequence.id == NcfBlock.sequence_id)
+        .where(NcfBlock.status == VOIDED).order_by(NcfSequence.prefix, NcfBlock.first_number)
+    ).all()
+    return [(format_ncf(prefix, first), format_ncf(prefix, last)) for prefix, first, last in rows]
@@ -0,0 +1,206 @@
+"""
+Búsqueda de productos tolerante a acentos y errores de tipeo.
+
+El nombre y el SKU de cada producto se normalizan (minúsculas, sin tildes)
+y se parten en trigramas ("  a", " ac", "ace", ...). El índice en memoria
+guarda, por trigrama, las filas que lo contienen. Una búsqueda cuenta con
+NumPy cuántos trigramas de la consulta tiene cada producto y ordena por:
+
+    cobertura = trigramas de la consulta presentes / trigramas de la consulta
+    similitud = compartidos / (consulta + producto - compartidos)   (desempate)
+
+"acetaminofen" encuentra "Acetaminofén 500mg" y "acetaminofem" también.
+Lo que son solo dígitos se busca primero como SKU (exacto y luego contenido).
+
+Se actualiza por producto al guardarlo en ProductDialog (update_product /
+remove_product). Los cambios de otras cajas o de una importación masiva se
+detectan con una suma de control del catálogo, revisada como mucho cada
+BUSQUEDA_REVISION_SEG segundos: si cambió, el índice se reconstruye.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+import numpy as np
+from sqlalchemy import select
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import (BUSQUEDA_SIMILITUD_MINIMA, BUSQUEDA_REVISION_SEG,
+                                           MAX_RESULTS_PER_PAGE)
+from src.pharmgest.database.models import Product
+
+WORDS = re.compile(r"\w+")
+
+
+def fold(text):
+    """Minúsculas y sin tildes: 'Acetaminofén' -> 'acetaminofen'"""
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    return " ".join(WORDS.findall("".join(c for c in decomposed if not unicodedata.combining(c))))
+
+
+def trigrams(text):
+    """Trigramas de cada palabra con relleno (dos espacios delante, uno detrás)"""
+    grams = set()
+    for word in fold(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def catalog_checksum(session):
+    """
+    Cambia al agregar, borrar o renombrar productos (o cambiar un SKU): hash
+    del id, el nombre y el SKU completos de cada fila, en orden de id. Leer
+    las tres columnas es mucho más barato que reconstruir los trigramas.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    rows = session.execute(select(Product.id, Product.name, Product.sku).order_by(Product.id))
+    for product_id, name, sku in rows:
+        digest.update(f"{product_id}\x1f{name}\x1f{sku}\x1e".encode())
+    return digest.hexdigest()
+
+
+class ProductSearchIndex:
+    """
+    Índice de trigramas. Las filas no se borran: un producto editado o
+    eliminado deja su fila anterior marcada como muerta (se compacta al
+    reconstruir).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Los hilos de lectura buscan a la vez: solo uno construye o revisa la suma
+        self.build_lock = threading.Lock()
+        self.loaded = False
+        self.checksum = None
+        self.checked_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.ids = []
+        self.sizes = []
+        self.alive = []
+        self.row_of = {}
+        self.postings = {}
+        self._arrays = {}
+        self._columns = None
+
+    def build(self, session):
+        """Reconstruye el índice con todo el catálogo"""
+        start = time.perf_counter()
+        checksum = catalog_checksum(session)
+        rows = session.execute(select(Product.id, Product.name, Product.sku)).all()
+        with self.lock:
+            self._reset()
+            for product_id, name, sku in rows:
+                self._add(product_id, name, sku)
+            self.loaded = True
+            self.checksum = checksum
+            self.checked_at = time.monotonic()
+        logger.info(f"Índice de búsqueda: {len(rows)} productos en {time.perf_counter() - start:.2f}s")
+
+    def _add(self, product_id, name, sku):
+        old = self.row_of.get(product_id)
+        if old is not None:
+            self.alive[old] = False
+        row = len(self.ids)
+        grams = trigrams(f"{name} {sku}")
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(row)
+            self._arrays.pop(gram, None)
+        self.ids.append(product_id)
+        self.sizes.append(len(grams))
+        self.alive.append(True)
+        self.row_of[product_id] = row
+        self._columns = None
+
+    def update_product(self, product_id, name, sku):
+        """Producto nuevo o editado (llamar después del commit)"""
+        with self.lock:
+            if self.loaded:
+                self._add(product_id, name, sku)
+                self.checksum = None
+
+    def remove_product(self, product_id):
+        with self.lock:
+            row = self.row_of.pop(product_id, None)
+            if row is not None:
+                self.alive[row] = False
+                self._columns = None
+                self.checksum = None
+
+    def invalidate(self):
+        """Cambios masivos (importación): se reconstruye en la próxima búsqueda"""
+        with self.lock:
+            self.loaded = False
+
+    def ensure(self, session):
+        """Construye el índice si falta o si el catálogo cambió fuera de esta caja"""
+        if self.loaded and time.monotonic() - self.checked_at < BUSQUEDA_REVISION_SEG:
+            return
+        with self.build_lock:
+            if not self.loaded:
+                self.build(session)
+                return
+            if time.monotonic() - self.checked_at < BUSQUEDA_REVISION_SEG:
+                return
+            checksum = catalog_checksum(session)
+            self.checked_at = time.monotonic()
+            if self.checksum is None:
+                # Los cambios propios ya están en el índice: solo se toma la suma nueva
+                self.checksum = checksum
+            elif checksum != self.checksum:
+                self.build(session)
+
+    def _posting(self, gram):
+        array = self._arrays.get(gram)
+        if array is None:
+            array = self._arrays[gram] = np.array(self.postings[gram], dtype=np.int32)
+        return array
+
+    def search(self, text, limit=MAX_RESULTS_PER_PAGE, min_similarity=BUSQUEDA_SIMILITUD_MINIMA):
+        """ids de producto ordenados del más al menos parecido"""
+        query = trigrams(text)
+        if not query:
+            return []
+        with self.lock:
+            arrays = [self._posting(gram) for gram in query if gram in self.postings]
+            if not arrays:
+                return []
+            if self._columns is None:
+                self._columns = (np.array(self.ids, dtype=np.int64), np.array(self.sizes, dtype=np.int32),
+                                 np.array(self.alive, dtype=bool))
+            ids, sizes, alive = self._columns
+            shared = np.bincount(np.concatenate(arrays), minlength=len(ids))
+            needed = max(1, int(np.ceil(len(query) * min_similarity)))
+            rows = np.flatnonzero((shared >= needed) & alive)
+            if not len(rows):
+                return []
+            hits = shared[rows]
+            similarity = hits / (len(query) + sizes[rows] - hits)
+            # Primero la cobertura de la consulta; a igualdad, el nombre más parecido
+            order = np.lexsort((-similarity, -hits))[:limit]
+            return ids[rows[order]].tolist()
+
+
+_index = ProductSearchIndex()
+
+
+def get_search_index():
+    return _index
+
+
+def search_products(session, text, limit=MAX_RESULTS_PER_PAGE):
+    """ids de los productos que mejor coinciden con `text` (nombre o SKU)"""
+    code = text.strip()
+    # Código de barras (solo dígitos): el SKU exacto por su índice y si no, los que lo contienen.
+    # Por trigramas un código parcial se confunde con concentraciones ("500mg")
+    if code.isdigit():
+        ids = session.execute(select(Product.id).where(Product.sku == code)).scalars().all()
+        if not ids:
+            ids = session.execute(select(Product.id).where(Product.sku.contains(code))
+                                  .order_by(Product.sku).limit(limit)).scalars().all()
+        if ids:
+            return ids
+    _index.ensure(session)
+    return _index.search(text, limit)
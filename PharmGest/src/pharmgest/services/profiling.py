@@ -0,0 +1,82 @@
+"""
+Sesiones de perfilado con cProfile para analizar la app fuera de línea.
+
+Se activan con `python src/pharmgest/main.py --perfil` (toda la ejecución)
+o con el botón de perfilado del administrador. Al detenerse se guardan dos
+archivos en PERFIL_DIR:
+
+- perfil_AAAAMMDD_HHMMSS.prof: datos crudos (pstats, snakeviz, etc.)
+- perfil_AAAAMMDD_HHMMSS.txt: resumen ordenado por tiempo acumulado
+- perfil_AAAAMMDD_HHMMSS_sql.txt: consultas SQL por acción y posibles N+1
+  (services/sql_profiling.py, de todos los hilos)
+
+cProfile mide el hilo donde se activa: aquí, el hilo principal de Qt.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import PERFIL_DIR, PERFIL_LINEAS_RESUMEN
+from src.pharmgest.services.sql_profiling import enable_sql_profiling, disable_sql_profiling, dump_sql_report
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class ProfileSession:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        enable_sql_profiling()
+        self.profiler.enable()
+
+    def stop(self, folder=PERFIL_DIR):
+        """Detiene el perfilado y guarda .prof + .txt. Retorna la ruta del .prof."""
+        self.profiler.disable()
+        disable_sql_profiling()
+        elapsed = time.perf_counter() - self.started_at
+        os.makedirs(folder, exist_ok=True)
+        base = os.path.join(folder, f"perfil_{datetime.now():%Y%m%d_%H%M%S}")
+        self.profiler.dump_stats(f"{base}.prof")
+
+        summary = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PERFIL_LINEAS_RESUMEN)
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(f"Sesión de perfilado: {elapsed:.1f} s\n")
+            f.write(summary.getvalue())
+        dump_sql_report(f"{base}_sql.txt")
+
+        logger.info(f"Perfil guardado en {base}.prof ({elapsed:.1f} s de sesión)")
+        return f"{base}.prof"
+
+
+def start_profiling():
+    """Inicia la sesión global (no hace nada si ya hay una activa)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = ProfileSession()
+            _session.start()
+            logger.info("Perfilado iniciado")
+
+
+def stop_profiling():
+    """Detiene la sesión global y guarda los resultados. Retorna la ruta o None."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            return None
+        session, _session = _session, None
+    return session.stop()
+
+
+def is_profiling():
+    return _session is not None
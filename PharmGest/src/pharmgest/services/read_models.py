@@ -0,0 +1,54 @@
+"""
+Filas de solo lectura para las pantallas de listas (POS, inventario, lotes,
+historial de ventas).
+
+Cada consulta trae solo las columnas que pinta la tabla, con SQLAlchemy
+Core, y cada fila se guarda como namedtuple (o una clase con __slots__ si
+hay que acumular valores): sin objetos ORM, sin mapa de identidad y sin
+seguimiento de cambios. Para editar se sigue usando el modelo ORM.
+
+    rows = fetch(session, ProductRow, select(*PRODUCT_LIST_COLUMNS))
+"""
+from collections import namedtuple
+from src.pharmgest.database.models import Product, ProductBatch, format_stock
+
+# Columnas que necesita POSWidget para pintar la tabla de resultados
+CATALOG_COLUMNS = (Product.id, Product.name, Product.price, Product.box_price,
+                   Product.unit_price, Product.is_fractionable, Product.total_stock)
+PRODUCT_LIST_COLUMNS = (Product.id, Product.sku, Product.name, Product.price, Product.total_stock,
+                        Product.is_fractionable, Product.units_per_box)
+BATCH_LIST_COLUMNS = (ProductBatch.id, ProductBatch.batch_code, ProductBatch.expiry_date, ProductBatch.stock)
+
+
+def _row_type(name, columns):
+    return namedtuple(name, [c.key for c in columns])
+
+
+CatalogRow = _row_type("CatalogRow", CATALOG_COLUMNS)
+BatchRow = _row_type("BatchRow", BATCH_LIST_COLUMNS)
+
+
+class ProductRow(_row_type("ProductRow", PRODUCT_LIST_COLUMNS)):
+    __slots__ = ()
+
+    @property
+    def stock_display(self):
+        return format_stock(self.total_stock, self.is_fractionable, self.units_per_box)
+
+
+class SaleSummary:
+    """Una venta del historial: las líneas se agregan a items y a profit mientras se leen"""
+    __slots__ = ("id", "date", "total", "profit", "items", "voided")
+
+    def __init__(self, id, date, total, voided=False):
+        self.id = id
+        self.date = date
+        self.total = total
+        self.profit = 0
+        self.items = []
+        self.voided = voided
+
+
+def fetch(session, row_type, query):
+    """Ejecuta `query` (sus columnas en el orden de los campos de `row_type`)"""
+    return list(map(row_type._make, session.execute(query)))
@@ -0,0 +1,176 @@
+"""
+Tickets de caja en ESC/POS para impresoras térmicas.
+
+render_receipt() arma los bytes crudos a partir de los mismos datos que
+generate_invoice_pdf (items con qty, name, price, subtotal), sin ReportLab:
+solo concatenación de bytes, así que cuesta una fracción de milisegundo.
+
+Los bytes se mandan a una "salida" intercambiable:
+- FileSink: guarda cada ticket en tickets/ (pruebas, o una impresora compartida)
+- SerialSink: puerto serie/USB (COM3, /dev/ttyUSB0, /dev/usb/lp0)
+- TcpSink: impresora de red en el puerto 9100 (o un receptor local de prueba)
+"""
+import os
+import socket
+from datetime import datetime
+from src.pharmgest.config.database import get_read_session
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import (RECEIPT_SALIDA, RECEIPT_DIR, RECEIPT_ANCHO, RECEIPT_PUERTO_SERIAL,
+                                           RECEIPT_BAUDIOS, RECEIPT_HOST, RECEIPT_PUERTO_TCP,
+                                           RECEIPT_TIMEOUT)
+
+# --- Comandos ESC/POS ---
+ESC = b"\x1b"
+GS = b"\x1d"
+INIT = ESC + b"@"
+CODEPAGE_1252 = ESC + b"t\x10"          # WPC1252: acentos y ñ
+ALIGN_LEFT = ESC + b"a\x00"
+ALIGN_CENTER = ESC + b"a\x01"
+BOLD_ON = ESC + b"E\x01"
+BOLD_OFF = ESC + b"E\x00"
+DOUBLE_SIZE = GS + b"!\x11"
+NORMAL_SIZE = GS + b"!\x00"
+FEED_AND_CUT = GS + b"V\x42\x03"         # avanza 3 líneas y corte parcial
+ENCODING = "cp1252"
+
+# Encabezado fijo: se codifica una sola vez al importar el módulo
+HEADER = b"".join([
+    INIT, CODEPAGE_1252, ALIGN_CENTER,
+    DOUBLE_SIZE, BOLD_ON, "FARMACIA PHARMGEST\n".encode(ENCODING), NORMAL_SIZE, BOLD_OFF,
+    "Av. Principal #123, Ciudad\n".encode(ENCODING),
+    "RNC: 1-23-45678-9\n".encode(ENCODING),
+    "Tel: (809) 555-0101\n".encode(ENCODING),
+    ALIGN_LEFT,
+])
+FOOTER = b"".join([
+    ALIGN_CENTER, "¡Gracias por su compra!\n".encode(ENCODING),
+    "Sistema PharmGest ERP\n".encode(ENCODING), ALIGN_LEFT, FEED_AND_CUT,
+])
+
+
+def _line(left, right, width):
+    """Texto a la izquierda y monto a la derecha en una línea de `width` columnas"""
+    space = width - len(right) - 1
+    return f"{left[:space]:<{space}} {right}\n"
+
+
+def render_receipt(sale_id, items, total, user_name="Admin", sale_date=None,
+                   amount_paid=None, change=None, width=RECEIPT_ANCHO, ncf=None):
+    """Bytes ESC/POS del ticket de una venta (mismos datos que generate_invoice_pdf)"""
+    sale_date = sale_date or datetime.now()
+    # Las ventas de la cola local se numeran por caja (p.ej. "CAJA-01-000042")
+    number = sale_id if isinstance(sale_id, str) else f"{sale_id:06d}"
+    separator = "-" * width + "\n"
+    lines = [
+        separator,
+        _line(f"TICKET: {number}", sale_date.strftime("%d/%m/%Y %H:%M"), width),
+        f"CAJERO: {user_name}\n",
+    ]
+    if ncf:
+        lines.append(f"NCF: {ncf}\n")
+    lines += [
+        separator,
+    ]
+    for item in items:
+        lines.append(f"{item['name'][:width]}\n")
+        lines.append(_line(f"  {item['qty']} x ${item['price']:,.2f}", f"${item['subtotal']:,.2f}", width))
+    lines.append(separator)
+    body = "".join(lines).encode(ENCODING, errors="replace")
+
+    totals = [BOLD_ON, DOUBLE_SIZE,
+              _line("TOTAL", f"${total:,.2f}", width // 2).encode(ENCODING),
+              NORMAL_SIZE, BOLD_OFF]
+    if amount_paid is not None:
+        totals.append(_line("Recibido", f"${amount_paid:,.2f}", width).encode(ENCODING))
+        totals.append(_line("Cambio", f"${change or 0:,.2f}", width).encode(ENCODING))
+    return b"".join([HEADER, body, *totals, FOOTER])
+
+
+class FileSink:
+    """Guarda cada ticket como tickets/ticket_{id}.bin"""
+    def __init__(self, folder=RECEIPT_DIR):
+        self.folder = folder
+
+    def send(self, sale_id, data):
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, f"ticket_{sale_id}.bin")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+
+class SerialSink:
+    """
+    Impresora por puerto serie o USB. Usa pyserial si está instalado; si no,
+    escribe directo al dispositivo (sirve para /dev/usb/lp0 y puertos ya configurados).
+    """
+    def __init__(self, port=RECEIPT_PUERTO_SERIAL, baudrate=RECEIPT_BAUDIOS, timeout=RECEIPT_TIMEOUT):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+
+    def send(self, sale_id, data):
+        try:
+            import serial
+        except ImportError:
+            with open(self.port, "wb", buffering=0) as device:
+                device.write(data)
+            return self.port
+        with serial.Serial(self.port, self.baudrate, timeout=self.timeout,
+                           write_timeout=self.timeout) as device:
+            device.write(data)
+            device.flush()
+        return self.port
+
+
+class TcpSink:
+    """Impresora de red (RAW en el puerto 9100)"""
+    def __init__(self, host=RECEIPT_HOST, port=RECEIPT_PUERTO_TCP, timeout=RECEIPT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def send(self, sale_id, data):
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as conn:
+            conn.sendall(data)
+        return f"{self.host}:{self.port}"
+
+
+SINKS = {
+    "archivo": FileSink,
+    "serial": SerialSink,
+    "red": TcpSink,
+}
+
+
+def get_receipt_sink(kind=RECEIPT_SALIDA):
+    """Salida configurada en RECEIPT_SALIDA, o None si los tickets están desactivados"""
+    sink_class = SINKS.get(kind)
+    return sink_class() if sink_class else None
+
+
+def print_receipt(sale_id, items, total, user_name="Admin", sale_date=None,
+                  amount_paid=None, change=None, sink=None, ncf=None):
+    """
+    Genera el ticket y lo manda a la salida. Retorna el destino, o None si
+    los tickets están desactivados. Los errores de la impresora (OSError)
+    se propagan: la venta ya está guardada y la caja decide cómo avisar.
+    """
+    sink = sink or get_receipt_sink()
+    if sink is None:
+        return None
+    data = render_receipt(sale_id, items, total, user_name, sale_date, amount_paid, change, ncf=ncf)
+    destination = sink.send(sale_id, data)
+    logger.info(f"Ticket {sale_id} enviado a {destination} ({len(data)} bytes)")
+    return destination
+
+
+def reprint_receipt(sale_id, sink=None):
+    """Reimprime el ticket de una venta (activa o archivada) leyendo la BD"""
+    from src.pharmgest.services.invoice import load_invoice_data  # diferido: invoice importa ReportLab
+    with get_read_session() as session:
+        data = load_invoice_data(session, sale_id)
+    if data is None:
+        return None
+    sale_date, total, items, ncf = data
+    return print_receipt(sale_id, items, total, sale_date=sale_date, sink=sink, ncf=ncf)
@@ -0,0 +1,151 @@
+"""
+Sugerencia de compra a partir de la velocidad de venta real de cada producto.
+
+Una sola consulta trae las unidades vendidas por producto y por día; el
+resto (velocidad promedio, desviación, días de cobertura, punto de pedido
+y cantidad sugerida) se calcula con NumPy sobre todo el catálogo a la vez,
+sin bucles por producto.
+
+    velocidad      = promedio de unidades/día en la ventana
+    stock_seguridad = z * desviación diaria * sqrt(días de entrega)
+    punto_pedido   = velocidad * días de entrega + stock_seguridad
+    sugerido       = velocidad * (entrega + cobertura) + seguridad - stock
+                     (redondeado a cajas completas si el producto es fraccionable)
+"""
+import csv
+import math
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import select, func, cast, Integer
+from src.pharmgest.config.settings import (REORDER_VENTANA_DIAS, REORDER_DIAS_ENTREGA,
+                                           REORDER_DIAS_COBERTURA, REORDER_FACTOR_SEGURIDAD)
+from src.pharmgest.database.models import Product, Sale, SaleDetail, SaleVoid
+
+CSV_COLUMNS = ["sku", "nombre", "stock", "velocidad_diaria", "dias_cobertura",
+               "punto_pedido", "sugerido_unidades", "sugerido_cajas", "costo_estimado"]
+
+
+def load_daily_sales(session, days=REORDER_VENTANA_DIAS, today=None):
+    """
+    (product_ids, day_index, is_box_sale, quantity) como arreglos NumPy:
+    cantidades vendidas por producto, día y modo de venta en la ventana.
+
+    Se consultan las tablas activas: el archivado solo mueve ventas con más de
+    DIAS_ANTIGUEDAD_ARCHIVO días, muy por encima de la ventana de cálculo.
+    Las ventas anuladas no cuentan: esa mercadería volvió al stock.
+    """
+    today = today or datetime.now()
+    start = datetime(today.year, today.month, today.day) - timedelta(days=days - 1)
+    # start es medianoche: la parte entera de la diferencia es el día calendario
+    day = cast(func.julianday(Sale.date) - func.julianday(start.strftime("%Y-%m-%d")), Integer)
+    rows = session.execute(
+        select(SaleDetail.product_id, day, SaleDetail.is_box_sale, func.sum(SaleDetail.quantity))
+        .join(Sale, Sale.id == SaleDetail.sale_id)
+        .where(Sale.date >= start, SaleDetail.product_id.is_not(None),
+               ~select(SaleVoid.sale_id).where(SaleVoid.sale_id == Sale.id).exists())
+        .group_by(SaleDetail.product_id, day, SaleDetail.is_box_sale)
+    ).all()
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=bool), empty
+    product_ids, day_index, is_box, quantity = (np.array(col) for col in zip(*rows))
+    return (product_ids.astype(np.int64), day_index.astype(np.int64),
+            is_box.astype(bool), quantity.astype(np.float64))
+
+
+def load_catalog(session):
+    """Columnas del catálogo como arreglos NumPy, ordenadas por id"""
+    rows = session.execute(
+        select(Product.id, Product.sku, Product.name, Product.total_stock, Product.cost,
+               Product.is_fractionable, Product.units_per_box)
+        .order_by(Product.id)
+    ).all()
+    ids, skus, names, stock, cost, fractionable, per_box = zip(*rows) if rows else ([],) * 7
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "sku": list(skus),
+        "name": list(names),
+        "stock": np.array([s or 0 for s in stock], dtype=np.float64),
+        "cost": np.array([c or 0 for c in cost], dtype=np.float64),
+        "fractionable": np.array([bool(f) for f in fractionable], dtype=bool),
+        "units_per_box": np.array([max(u or 1, 1) for u in per_box], dtype=np.int64),
+    }
+
+
+def compute_reorder(catalog, daily_sales, days=REORDER_VENTANA_DIAS, lead_days=REORDER_DIAS_ENTREGA,
+                    cover_days=REORDER_DIAS_COBERTURA, safety_factor=REORDER_FACTOR_SEGURIDAD):
+    """
+    Calcula velocidad, cobertura y cantidad sugerida para todo el catálogo.
+    Retorna un dict de arreglos alineados con catalog["id"].
+    """
+    product_ids, day_index, is_box, quantity = daily_sales
+    count = len(catalog["id"])
+
+    matrix = np.zeros((count, days), dtype=np.float64)
+    if count and len(product_ids):
+        # Ubicar cada fila de ventas en su producto (ids ordenados -> búsqueda binaria)
+        position = np.minimum(np.searchsorted(catalog["id"], product_ids), count - 1)
+        known = ((catalog["id"][position] == product_ids) & (day_index >= 0) & (day_index < days))
+
+        # Cajas vendidas de productos fraccionables -> unidades (igual que la caja al descontar stock)
+        to_units = np.where(is_box & catalog["fractionable"][position], catalog["units_per_box"][position], 1)
+        np.add.at(matrix, (position[known], day_index[known]), (quantity * to_units)[known])
+
+    velocity = matrix.mean(axis=1)
+    deviation = matrix.std(axis=1)
+    stock = catalog["stock"]
+
+    safety_stock = safety_factor * deviation * math.sqrt(lead_days)
+    reorder_point = velocity * lead_days + safety_stock
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_of_cover = np.where(velocity > 0, stock / velocity, np.inf)
+
+    target = velocity * (lead_days + cover_days) + safety_stock
+    needed = np.where(stock <= reorder_point, np.maximum(target - stock, 0), 0)
+    boxes = np.ceil(needed / catalog["units_per_box"])
+    suggested_units = np.where(catalog["fractionable"], boxes * catalog["units_per_box"], np.ceil(needed))
+    suggested_boxes = np.where(catalog["fractionable"], boxes, suggested_units)
+
+    return {
+        "velocity": velocity,
+        "days_of_cover": days_of_cover,
+        "reorder_point": reorder_point,
+        "suggested_units": suggested_units,
+        "suggested_boxes": suggested_boxes,
+        # El costo del producto es por caja (ver historial de ventas)
+        "estimated_cost": suggested_boxes * catalog["cost"],
+    }
+
+
+def purchase_list(session, today=None, **params):
+    """
+    Lista de compra: productos con cantidad sugerida > 0, los más urgentes
+    (menos días de cobertura) primero. Cada elemento es un dict con las
+    columnas de CSV_COLUMNS.
+    """
+    catalog = load_catalog(session)
+    days = params.get("days", REORDER_VENTANA_DIAS)
+    result = compute_reorder(catalog, load_daily_sales(session, days, today), **params)
+
+    selected = np.flatnonzero(result["suggested_units"] > 0)
+    selected = selected[np.argsort(result["days_of_cover"][selected], kind="stable")]
+    return [{
+        "sku": catalog["sku"][i],
+        "nombre": catalog["name"][i],
+        "stock": int(catalog["stock"][i]),
+        "velocidad_diaria": round(float(result["velocity"][i]), 2),
+        "dias_cobertura": round(float(result["days_of_cover"][i]), 1),
+        "punto_pedido": math.ceil(result["reorder_point"][i]),
+        "sugerido_unidades": int(result["suggested_units"][i]),
+        "sugerido_cajas": int(result["suggested_boxes"][i]),
+        "costo_estimado": round(float(result["estimated_cost"][i]), 2),
+    } for i in selected]
+
+
+def export_purchase_list(items, path):
+    """Guarda la lista de compra en CSV (separador ';' para Excel en español)"""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, delimiter=";")
+        writer.writeheader()
+        writer.writerows(items)
+    return path
@@ -0,0 +1,90 @@
+"""
+Reportes de ventas sin interfaz gráfica: historial con ganancia por venta
+y totales del período. Lo usan SalesHistoryWidget y la línea de comandos.
+"""
+from sqlalchemy import select, case, and_, func
+from src.pharmgest.database.models import Product, SaleVoid, all_sales, all_sale_details
+from src.pharmgest.services.read_models import SaleSummary
+
+
+class ReportService:
+    def __init__(self, session):
+        self.session = session
+
+    @staticmethod
+    def line_profit(unit_price, quantity, is_box_sale, cost, is_fractionable, units_per_box):
+        """
+        Ganancia de una línea: (precio vendido - costo proporcional) * cantidad.
+        El costo del producto es por caja; en venta por unidad se divide entre
+        las unidades de la caja. Sin costo configurado la ganancia es 0 (alerta).
+        """
+        base_cost = cost or 0
+        if base_cost == 0:
+            return 0
+        if not is_box_sale and is_fractionable and units_per_box > 0:
+            applied_cost = base_cost / units_per_box
+        else:
+            applied_cost = base_cost
+        return (unit_price - applied_cost) * quantity
+
+    @staticmethod
+    def profit_column(details=all_sale_details):
+        """
+        line_profit como expresión SQL, para sumar la ganancia en la consulta.
+        Necesita `details` y Product (outer join) en el FROM; producto
+        eliminado o sin costo: 0.
+        """
+        applied_cost = case(
+            (and_(details.c.is_box_sale.is_(False), Product.is_fractionable.is_(True), Product.units_per_box > 0),
+             Product.cost * 1.0 / Product.units_per_box),
+            else_=Product.cost)
+        return case((func.coalesce(Product.cost, 0) == 0, 0),
+                    else_=(details.c.unit_price - applied_cost) * details.c.quantity)
+
+    def sales_history(self, date_from=None, date_to=None):
+        """
+        Ventas (activas + archivadas) de la más reciente a la más antigua.
+        Cada elemento: SaleSummary con id, date, total, profit, items (resumen
+        legible) y voided (anulada: summarize no la cuenta).
+        """
+        # Una sola consulta sobre las vistas unificadas, sin hidratar objetos ORM
+        query = (
+            select(all_sales.c.id, all_sales.c.date, all_sales.c.total,
+                   all_sale_details.c.quantity, all_sale_details.c.unit_price,
+                   all_sale_details.c.is_box_sale,
+                   Product.name, Product.cost, Product.is_fractionable, Product.units_per_box,
+                   SaleVoid.sale_id.is_not(None).label("voided"))
+            .select_from(all_sales)
+            .outerjoin(SaleVoid, SaleVoid.sale_id == all_sales.c.id)
+            .outerjoin(all_sale_details, all_sale_details.c.sale_id == all_sales.c.id)
+            .outerjoin(Product, Product.id == all_sale_details.c.product_id)
+            .order_by(all_sales.c.date.desc(), all_sales.c.id.desc())
+        )
+        if date_from is not None:
+            query = query.where(all_sales.c.date >= date_from)
+        if date_to is not None:
+            query = query.where(all_sales.c.date < date_to)
+
+        # Agrupar filas consecutivas por venta
+        sales = []
+        for r in self.session.execute(query):
+            if not sales or sales[-1].id != r.id:
+                sales.append(SaleSummary(r.id, r.date, r.total, r.voided))
+            # Sin nombre: línea sin detalle o producto eliminado
+            if r.quantity is None or r.name is None:
+                continue
+            sale = sales[-1]
+            sale.items.append(f"{r.name} ({r.quantity} {'Caja' if r.is_box_sale else 'Unid'})")
+            sale.profit += self.line_profit(r.unit_price, r.quantity, r.is_box_sale,
+                                               r.cost, r.is_fractionable, r.units_per_box)
+        return sales
+
+    @staticmethod
+    def summarize(sales):
+        """Totales de una lista de sales_history(): venta, ganancia y tickets (sin las anuladas)"""
+        valid = [sale for sale in sales if not sale.voided]
+        return {
+            "total": sum(sale.total for sale in valid),
+            "profit": sum(sale.profit for sale in valid),
+            "tickets": len(valid),
+        }
@@ -0,0 +1,425 @@
+"""
+Cola local de ventas: la caja cobra aunque pharmgest.db esté bloqueada o la
+carpeta compartida no responda.
+
+Cada venta se guarda primero en un SQLite local de la caja (COLA_VENTAS_DB,
+synchronous=FULL: sobrevive a un corte de luz) y el ticket sale de ahí. Luego
+replay() la envía a la BD principal, en orden de cobro:
+
+- Idempotente: cada venta lleva un client_uuid único; si ya está en la BD
+  principal (p.ej. se cortó justo después del commit) solo se marca enviada.
+- Si la BD no está disponible (bloqueada, red caída) se detiene y se
+  reintenta más tarde sin perder el orden.
+- La mercadería ya salió de la tienda: si al llegar falta stock la venta se
+  registra igual, se descuenta lo que haya y queda como "conflicto" para
+  revisar el inventario.
+
+El NCF se asigna al guardar la venta en la cola, de los bloques que la caja
+reservó en la BD principal (services/ncf.py): sale en el ticket aunque la BD
+no responda y, por estar en la misma transacción local que la venta, no deja
+huecos. replay() concilia los bloques y reserva otro cuando quedan menos de
+NCF_RESERVA_MINIMA números; al cierre del día se devuelven los que sobran.
+Un NCF que se entregó y no quedó en ninguna venta (entrada en "error", venta
+de la línea de comandos revertida) se anota en ncf_voids y sync_ncf lo
+informa como anulado (ncf.void_number).
+
+Los bloques se reservan a nombre de la caja: TERMINAL_ID o, si no está
+configurado, el identificador que se genera la primera vez y se guarda en
+caja_id.txt junto a la cola (install_terminal_id). sales.ncf es UNIQUE: un
+NCF repetido no se registra en silencio, la venta queda como "error".
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, date
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from src.pharmgest.config.database import get_db_session
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import COLA_VENTAS_DB, TERMINAL_ID, NCF_RESERVA_MINIMA
+from src.pharmgest.database.models import Sale
+from src.pharmgest.services import ncf
+from src.pharmgest.services.sales import SalesService
+
+PENDING = "pendiente"
+SENT = "enviada"
+CONFLICT = "conflicto"   # Registrada en la BD principal con faltante de stock
+FAILED = "error"         # No se pudo registrar (p.ej. producto eliminado): revisión manual
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS queued_sales (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_uuid TEXT NOT NULL UNIQUE,
+    terminal_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    payment_method TEXT NOT NULL,
+    total REAL NOT NULL,
+    lines TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pendiente',
+    sale_id INTEGER,
+    detail TEXT,
+    synced_at TEXT,
+    ncf TEXT)"""
+
+# Copia local de los bloques de NCF de esta caja: se entregan sin ir a la BD principal
+NCF_OPEN = "abierto"
+NCF_CLOSED = "cerrado"       # Agotado, vencido o devuelto: falta informarlo a la BD principal
+NCF_REPORTED = "informado"
+NCF_SCHEMA = """CREATE TABLE IF NOT EXISTS ncf_blocks (
+    block_id INTEGER PRIMARY KEY,
+    prefix TEXT NOT NULL,
+    next_number INTEGER NOT NULL,
+    last_number INTEGER NOT NULL,
+    expires_on TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'abierto')"""
+# NCF entregados sin venta: cerrado = falta informarlo como anulado a la BD principal
+NCF_VOID_SCHEMA = """CREATE TABLE IF NOT EXISTS ncf_voids (
+    ncf TEXT PRIMARY KEY,
+    reason TEXT,
+    state TEXT NOT NULL DEFAULT 'cerrado')"""
+
+# Identificador de la instalación, en la carpeta de la cola
+TERMINAL_FILE = "caja_id.txt"
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def install_terminal_id(queue_path):
+    """Identificador de esta caja guardado junto a la cola; la primera vez se genera (CAJA-XXXXXXXX)"""
+    path = os.path.join(os.path.dirname(queue_path), TERMINAL_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            terminal_id = f.read().strip()
+        if terminal_id:
+            return terminal_id
+    except FileNotFoundError:
+        pass
+    terminal_id = f"CAJA-{uuid.uuid4().hex[:8].upper()}"
+    partial = path + ".tmp"
+    with open(partial, "w", encoding="utf-8") as f:
+        f.write(terminal_id + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+    logger.info(f"Identificador de esta caja: {terminal_id} (guardado en {path})")
+    return terminal_id
+
+
+class SaleQueue:
+    def __init__(self, path=COLA_VENTAS_DB, terminal_id=TERMINAL_ID):
+        self.path = path
+        self.lock = threading.Lock()
+        self.ncf_adopted = False
+        self.ncf_warned = False
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.terminal_id = terminal_id or install_terminal_id(path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            conn.execute(NCF_SCHEMA)
+            conn.execute(NCF_VOID_SCHEMA)
+            # Colas creadas antes de la numeración fiscal
+            if "ncf" not in {row["name"] for row in conn.execute("PRAGMA table_info(queued_sales)")}:
+                conn.execute("ALTER TABLE queued_sales ADD COLUMN ncf TEXT")
+
+    @contextmanager
+    def _connect(self):
+        """Conexión corta: commit al salir del bloque (rollback si falla) y se cierra"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA synchronous=FULL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def number(self, seq, terminal_id=None):
+        """Número de ticket de una venta en cola: único por caja"""
+        return f"{terminal_id or self.terminal_id}-{seq:06d}"
+
+    def enqueue(self, lines, payment_method="EFECTIVO"):
+        """
+        Guarda la venta en la cola local (solo disco local, sin tocar la BD
+        principal) con el próximo NCF de la caja. Retorna la entrada: seq,
+        number, ncf (None si la caja no tiene números), client_uuid,
+        created_at, payment_method, total e items.
+        """
+        if not lines:
+            raise ValueError("La venta no tiene productos")
+        entry = {
+            "client_uuid": str(uuid.uuid4()),
+            "created_at": datetime.now(),
+            "payment_method": payment_method,
+            "total": sum(line["subtotal"] for line in lines),
+            "items": list(lines),
+        }
+        with self.lock, self._connect() as conn:
+            entry["ncf"] = self._take_ncf(conn)
+            cursor = conn.execute(
+                "INSERT INTO queued_sales (client_uuid, terminal_id, created_at, payment_method, total, lines, ncf) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry["client_uuid"], self.terminal_id, entry["created_at"].isoformat(),
+                 payment_method, entry["total"], json.dumps(entry["items"]), entry["ncf"]))
+            entry["seq"] = cursor.lastrowid
+        entry["number"] = self.number(entry["seq"])
+        return entry
+
+    def entries(self, status=PENDING, limit=None):
+        """Entradas con ese estado, en orden de cobro"""
+        sql = "SELECT * FROM queued_sales WHERE status = ? ORDER BY seq"
+        params = [status]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def entry(self, client_uuid):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM queued_sales WHERE client_uuid = ?", (client_uuid,)).fetchone()
+        return self._entry(row) if row else None
+
+    def counts(self):
+        """{estado: cantidad}"""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM queued_sales GROUP BY status").fetchall())
+
+    def _entry(self, row):
+        entry = dict(row)
+        entry["created_at"] = datetime.fromisoformat(entry["created_at"])
+        entry["items"] = json.loads(entry.pop("lines"))
+        # Con el identificador que tenía la caja al cobrarla (el del ticket impreso)
+        entry["number"] = self.number(entry["seq"], entry["terminal_id"])
+        return entry
+
+    def _mark(self, seq, status, sale_id=None, detail=None):
+        with self.lock, self._connect() as conn:
+            conn.execute("UPDATE queued_sales SET status = ?, sale_id = ?, detail = ?, synced_at = ? WHERE seq = ?",
+                         (status, sale_id, detail, datetime.now().isoformat(), seq))
+
+    def replay(self, session, limit=None):
+        """
+        Envía las ventas pendientes a la BD principal, una transacción por
+        venta y en orden. Retorna {"sent": [...], "conflicts": [...],
+        "failed": [...], "pending": n} con las entradas procesadas en esta
+        pasada; "pending" > 0 si la BD dejó de responder a mitad de camino.
+        """
+        result = {"sent": [], "conflicts": [], "failed": [], "pending": 0}
+        pending = self.entries(PENDING, limit)
+        for index, entry in enumerate(pending):
+            try:
+                if index == 0:
+                    self.sync_ncf(session)
+                if entry["ncf"] is None:
+                    # Cobrada sin números locales: lleva el NCF al llegar a la BD principal
+                    entry["ncf"] = self._assign_ncf(entry["seq"])
+                sale_id, shortages = self._apply(session, entry)
+            except OperationalError as e:
+                # Bloqueada o inaccesible: se reintenta después, sin saltarse ninguna
+                session.rollback()
+                result["pending"] = len(pending) - index
+                logger.warning(f"BD principal no disponible, {result['pending']} ventas siguen en cola: {e}")
+                break
+            except (LookupError, ValueError) as e:
+                session.rollback()
+                entry["detail"] = str(e)
+                self._mark(entry["seq"], FAILED, detail=entry["detail"])
+                if entry["ncf"]:
+                    # Ya salió impreso en el ticket: no se reusa, se informa como anulado
+                    self.void_ncf(entry["ncf"], f"Venta en cola {entry['number']}: {e}")
+                result["failed"].append(entry)
+                logger.error(f"Venta en cola {entry['number']} no se pudo registrar: {e}")
+                continue
+
+            entry["sale_id"] = sale_id
+            if shortages:
+                entry["detail"] = "; ".join(f"{name}: vendidas {units}, había {available}"
+                                            for name, units, available in shortages)
+                self._mark(entry["seq"], CONFLICT, sale_id, entry["detail"])
+                result["conflicts"].append(entry)
+                logger.warning(f"Venta {entry['number']} registrada como #{sale_id} con faltante de stock: "
+                               f"{entry['detail']}")
+            else:
+                self._mark(entry["seq"], SENT, sale_id)
+                result["sent"].append(entry)
+
+        if result["failed"]:
+            try:
+                self.sync_ncf(session, refill=False)
+            except OperationalError as e:
+                # Quedan anotados en ncf_voids: se informan en la próxima sincronización
+                session.rollback()
+                logger.warning(f"NCF anulados sin informar a la BD principal: {e}")
+        return result
+
+    def _apply(self, session, entry):
+        """Registra una entrada en la BD principal (o encuentra la que ya estaba). Hace commit."""
+        existing = session.execute(select(Sale.id).where(Sale.client_uuid == entry["client_uuid"])).scalar()
+        if existing is not None:
+            return existing, []
+        try:
+            sale = SalesService(session).checkout(
+                entry["items"], payment_method=entry["payment_method"], ncf=entry["ncf"],
+                client_uuid=entry["client_uuid"], sale_date=entry["created_at"], allow_shortage=True)
+            session.commit()
+        except IntegrityError:
+            # Otro proceso la registró entre la consulta y el commit, o el NCF ya es de otra venta
+            session.rollback()
+            existing = session.execute(select(Sale.id).where(Sale.client_uuid == entry["client_uuid"])).scalar()
+            if existing is None:
+                raise ValueError(f"El NCF {entry['ncf']} ya figura en otra venta")
+            return existing, []
+        return sale["id"], sale["shortages"]
+
+    def _take_ncf(self, conn):
+        """Próximo NCF de los bloques locales (en la transacción local de `conn`), o None"""
+        row = conn.execute(
+            "SELECT block_id, prefix, next_number FROM ncf_blocks "
+            "WHERE state = ? AND next_number <= last_number AND expires_on >= ? ORDER BY block_id LIMIT 1",
+            (NCF_OPEN, date.today().isoformat())).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE ncf_blocks SET next_number = next_number + 1 WHERE block_id = ?", (row["block_id"],))
+        return ncf.format_ncf(row["prefix"], row["next_number"])
+
+    def take_ncf(self):
+        """Un NCF para una venta que no pasa por la cola (línea de comandos)"""
+        with self.lock, self._connect() as conn:
+            return self._take_ncf(conn)
+
+    def void_ncf(self, number, reason=None):
+        """Anota un NCF entregado que no quedó en ninguna venta; sync_ncf lo informa como anulado"""
+        with self.lock, self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO ncf_voids (ncf, reason) VALUES (?, ?)", (number, reason))
+
+    def return_ncf(self, number, reason=None):
+        """
+        Un NCF que no llegó a imprimirse ni a quedar en una venta (la venta se
+        revirtió): vuelve a su bloque si sigue siendo el último entregado; si
+        no, se anota como anulado.
+        """
+        with self.lock, self._connect() as conn:
+            for row in conn.execute("SELECT block_id, prefix, next_number FROM ncf_blocks WHERE state = ?",
+                                    (NCF_OPEN,)).fetchall():
+                if ncf.format_ncf(row["prefix"], row["next_number"] - 1) == number:
+                    conn.execute("UPDATE ncf_blocks SET next_number = next_number - 1 "
+                                 "WHERE block_id = ? AND next_number = ?", (row["block_id"], row["next_number"]))
+                    return True
+        self.void_ncf(number, reason)
+        return False
+
+    def _assign_ncf(self, seq):
+        with self.lock, self._connect() as conn:
+            number = self._take_ncf(conn)
+            if number is not None:
+                conn.execute("UPDATE queued_sales SET ncf = ? WHERE seq = ?", (number, seq))
+        return number
+
+    def ncf_available(self):
+        """Números que la caja puede entregar sin ir a la BD principal"""
+        with self._connect() as conn:
+            return self._ncf_available(conn)
+
+    @staticmethod
+    def _ncf_available(conn):
+        return conn.execute(
+            "SELECT COALESCE(SUM(last_number - next_number + 1), 0) FROM ncf_blocks "
+            "WHERE state = ? AND next_number <= last_number AND expires_on >= ?",
+            (NCF_OPEN, date.today().isoformat())).fetchone()[0]
+
+    def _store_block(self, block, next_number=None):
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO ncf_blocks (block_id, prefix, next_number, last_number, expires_on) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (block.id, block.sequence.prefix, next_number or block.first_number, block.last_number,
+                 block.sequence.expires_on.isoformat()))
+
+    def sync_ncf(self, session, refill=True):
+        """
+        Concilia los bloques de NCF con la BD principal (hace commit): informa
+        los cerrados (agotados, vencidos o devueltos) y los números anotados
+        en ncf_voids, adopta los que se
+        reservaron sin llegar a la cola (corte justo después del commit, cola
+        reinstalada: sigue después del último NCF que ya tiene una venta) y,
+        con `refill`, reserva otro si quedan menos de NCF_RESERVA_MINIMA.
+        Sin nada que hacer no consulta la BD principal.
+        """
+        with self.lock, self._connect() as conn:
+            conn.execute("UPDATE ncf_blocks SET state = ? WHERE state = ? AND "
+                         "(next_number > last_number OR expires_on < ?)",
+                         (NCF_CLOSED, NCF_OPEN, date.today().isoformat()))
+            closed = conn.execute("SELECT block_id, next_number FROM ncf_blocks WHERE state = ?",
+                                  (NCF_CLOSED,)).fetchall()
+            known = {row["block_id"] for row in conn.execute("SELECT block_id FROM ncf_blocks")}
+            voids = conn.execute("SELECT ncf, reason FROM ncf_voids WHERE state = ?", (NCF_CLOSED,)).fetchall()
+
+        if not self.ncf_adopted:
+            for block in ncf.terminal_blocks(session, self.terminal_id):
+                if block.id not in known:
+                    start = ncf.first_unused(session, block)
+                    logger.info(f"NCF: bloque {block.id} de {self.terminal_id} recuperado de la BD principal "
+                                f"desde {ncf.format_ncf(block.sequence.prefix, start)}")
+                    self._store_block(block, start)
+            self.ncf_adopted = True
+        if closed:
+            for block_id, next_number in closed:
+                ncf.close_block(session, block_id, next_number - 1)
+            session.commit()
+            with self.lock, self._connect() as conn:
+                conn.executemany("UPDATE ncf_blocks SET state = ? WHERE block_id = ?",
+                                 [(NCF_REPORTED, block_id) for block_id, _ in closed])
+        if voids:
+            for number, reason in voids:
+                if ncf.void_number(session, number, self.terminal_id):
+                    logger.warning(f"NCF {number} anulado: {reason or 'entregado sin venta'}")
+            session.commit()
+            with self.lock, self._connect() as conn:
+                conn.executemany("UPDATE ncf_voids SET state = ? WHERE ncf = ?",
+                                 [(NCF_REPORTED, number) for number, _ in voids])
+
+        available = self.ncf_available()
+        if not refill or available >= NCF_RESERVA_MINIMA:
+            return
+        try:
+            block = ncf.reserve_block(session, self.terminal_id)
+            session.commit()
+        except LookupError as e:
+            session.rollback()
+            if not self.ncf_warned:
+                self.ncf_warned = True
+                logger.warning(f"{e} ({self.terminal_id} tiene {available} números)")
+            return
+        self.ncf_warned = False
+        self._store_block(block)
+        logger.info(f"NCF: {self.terminal_id} reservó {ncf.format_ncf(block.sequence.prefix, block.first_number)} "
+                    f"a {ncf.format_ncf(block.sequence.prefix, block.last_number)}")
+
+    def release_ncf(self, session):
+        """Devuelve los números sin usar: la caja deja de entregarlos y se liberan en la BD principal"""
+        with self.lock, self._connect() as conn:
+            conn.execute("UPDATE ncf_blocks SET state = ? WHERE state = ?", (NCF_CLOSED, NCF_OPEN))
+        self.sync_ncf(session, refill=False)
+
+
+def get_sale_queue():
+    """Cola de esta caja (se abre la primera vez que se pide)"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = SaleQueue()
+        return _queue
+
+
+def release_ncf_blocks():
+    """Tarea del cierre del día: los NCF que esta caja no usó vuelven a la BD principal"""
+    with get_db_session() as session:
+        get_sale_queue().release_ncf(session)
+
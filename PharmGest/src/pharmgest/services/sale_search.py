@@ -0,0 +1,133 @@
+"""
+Búsqueda de ventas (activas + archivadas) por fecha, NCF, producto y monto.
+
+Paginación por cursor (keyset): cada página continúa desde la última
+(fecha, id) vista en lugar de usar OFFSET, así que la página 1 y la página
+10.000 cuestan lo mismo. El orden (date DESC, id DESC) coincide con el
+índice ix_sales_date (en SQLite cada índice termina implícitamente en el id).
+
+La consulta se hace por separado sobre main.sales y archivo.sales y las
+dos páginas ya ordenadas se mezclan en Python: sobre la vista all_sales el
+planificador de SQLite no siempre puede usar los índices de cada tabla.
+"""
+import heapq
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, and_, tuple_
+from src.pharmgest.config.settings import SEARCH_PAGE_SIZE
+from src.pharmgest.database.models import Product, Sale, archived_sales, all_sale_details
+
+# Máximo de productos que puede abarcar un filtro por nombre
+MAX_PRODUCT_MATCHES = 50
+# Hasta cuántas coincidencias un filtro (producto o monto) se resuelve como lista de ids
+SELECTIVE_MATCHES_MAX = 2000
+
+
+def find_product_ids(session, text):
+    """Ids de productos cuyo SKU coincide exacto o cuyo nombre contiene `text`"""
+    text = text.strip()
+    if not text:
+        return []
+    exact = session.execute(select(Product.id).where(Product.sku == text)).scalars().all()
+    if exact:
+        return exact
+    return session.execute(
+        select(Product.id).where(Product.name.ilike(f"%{text}%")).limit(MAX_PRODUCT_MATCHES)
+    ).scalars().all()
+
+
+def search_sales(session, date_from=None, date_to=None, ncf=None, product_ids=None,
+                 total_min=None, total_max=None, after=None, limit=SEARCH_PAGE_SIZE):
+    """
+    Una página de ventas que cumplen todos los filtros dados (los None se ignoran).
+
+    - date_from / date_to: fechas (date o datetime); date_to incluye el día completo
+    - ncf: prefijo del comprobante (B01, B0100000123...)
+    - product_ids: ventas que incluyan alguno de esos productos
+    - after: cursor (fecha, id) devuelto por la página anterior
+
+    Retorna (filas, cursor_siguiente); el cursor es None en la última página.
+    """
+    filters = dict(date_from=date_from, date_to=date_to, ncf=ncf, product_ids=product_ids,
+                   total_min=total_min, total_max=total_max, after=after)
+    active = Sale.__table__
+    active_query = _page_query(session, active, **filters)
+    # Una venta que quedó en ambos archivos (archivado interrumpido) sale una sola vez
+    archived_query = _page_query(session, archived_sales, **filters).where(
+        ~select(active.c.id).where(active.c.id == archived_sales.c.id).exists()
+    )
+
+    # Se pide una fila de más para saber si hay otra página sin contar el total
+    pages = [session.execute(query.limit(limit + 1)).all() for query in (active_query, archived_query)]
+    rows = list(heapq.merge(*pages, key=lambda r: (r.date, r.id), reverse=True))
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1].date, rows[-1].id)
+    return rows, None
+
+
+def _page_query(session, sales, date_from, date_to, ncf, product_ids, total_min, total_max, after):
+    """SELECT sobre una tabla de ventas (activa o archivo) con los filtros, ordenado por fecha"""
+    query = select(sales.c.id, sales.c.date, sales.c.total, sales.c.payment_method, sales.c.ncf)
+
+    if date_from is not None:
+        query = query.where(sales.c.date >= _as_datetime(date_from))
+    if date_to is not None:
+        query = query.where(sales.c.date < _as_datetime(date_to) + timedelta(days=1))
+    if ncf:
+        # Rango en lugar de LIKE: así SQLite usa el índice ix_sales_ncf
+        prefix = ncf.strip().upper()
+        query = query.where(sales.c.ncf >= prefix, sales.c.ncf < prefix + "\uffff")
+    if product_ids is not None:
+        query = query.where(_product_filter(session, sales, product_ids))
+    if total_min is not None or total_max is not None:
+        query = query.where(_total_filter(session, sales, total_min, total_max))
+    if after is not None:
+        query = query.where(tuple_(sales.c.date, sales.c.id) < tuple_(*after))
+    return query.order_by(sales.c.date.desc(), sales.c.id.desc())
+
+
+def _is_selective(session, matches):
+    """True si `matches` devuelve pocas filas (la prueba está acotada por LIMIT)"""
+    probe = select(func.count()).select_from(matches.limit(SELECTIVE_MATCHES_MAX).subquery())
+    return session.execute(probe).scalar() < SELECTIVE_MATCHES_MAX
+
+
+def _product_filter(session, sales, product_ids):
+    """
+    Condición "la venta incluye alguno de estos productos".
+
+    Un producto poco vendido se resuelve desde ix_sale_details_product_id
+    (lista corta de ventas). Uno muy vendido aparece en casi cualquier venta:
+    ahí es más barato recorrer las ventas por fecha y comprobar cada una con
+    EXISTS, que corta en cuanto se llena la página.
+    """
+    matches = select(all_sale_details.c.sale_id).where(all_sale_details.c.product_id.in_(product_ids))
+    if _is_selective(session, matches):
+        return sales.c.id.in_(matches)
+    return matches.where(all_sale_details.c.sale_id == sales.c.id).exists()
+
+
+def _total_filter(session, sales, total_min, total_max):
+    """
+    Condición de monto. Un rango estrecho se resuelve con ix_sales_total; uno
+    amplio se evalúa recorriendo por fecha (`total + 0` impide usar el índice,
+    que SQLite elegiría aunque el rango abarque casi toda la tabla).
+    """
+    def in_range(value):
+        conditions = []
+        if total_min is not None:
+            conditions.append(value >= total_min)
+        if total_max is not None:
+            conditions.append(value <= total_max)
+        return and_(*conditions)
+
+    matches = select(sales.c.id).where(in_range(sales.c.total))
+    if _is_selective(session, matches):
+        return sales.c.id.in_(matches)
+    return in_range(sales.c.total + 0)
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day)
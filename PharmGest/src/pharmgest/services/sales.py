@@ -0,0 +1,198 @@
+"""
+Ventas sin interfaz gráfica: armado de líneas del carrito y cobro con FEFO.
+
+La caja (POSWidget), la línea de comandos y los scripts de carga usan este
+mismo código. SalesService trabaja sobre la sesión que recibe y no hace
+commit: quien abre la sesión decide la transacción.
+
+    with get_db_session() as session:
+        sale = SalesService(session).checkout(lines)
+"""
+from sqlalchemy import select, func
+from src.pharmgest.database.models import Product, ProductBatch, Sale, SaleDetail, SaleVoid, StockMovement
+from src.pharmgest.services import stock_ledger, product_search
+from src.pharmgest.services.read_models import CATALOG_COLUMNS, CatalogRow, fetch
+
+
+class InsufficientStockError(ValueError):
+    """No hay stock suficiente para una línea de la venta"""
+
+
+class SalesService:
+    def __init__(self, session):
+        self.session = session
+
+    def search_products(self, text=""):
+        """
+        Filas del catálogo (CatalogRow): todas sin `text`; con `text`, las
+        que mejor coinciden por nombre o SKU (sin tildes, tolera errores de tipeo),
+        de la más a la menos parecida.
+        """
+        query = select(*CATALOG_COLUMNS)
+        if not text:
+            return fetch(self.session, CatalogRow, query)
+        ids = product_search.search_products(self.session, text)
+        if not ids:
+            return []
+        # El índice solo da el orden: precio y stock se leen al día de la BD
+        rows = {row.id: row for row in fetch(self.session, CatalogRow, query.where(Product.id.in_(ids)))}
+        return [rows[product_id] for product_id in ids if product_id in rows]
+
+    @staticmethod
+    def max_quantity(product, box_mode):
+        """Máximo vendible: cajas completas en modo caja (si es fraccionable), si no unidades"""
+        if box_mode and product.is_fractionable and product.units_per_box > 0:
+            return product.total_stock // product.units_per_box
+        return product.total_stock
+
+    @staticmethod
+    def build_line(product, qty, box_mode=True):
+        """
+        Línea del carrito (el mismo dict que usan el POS, la factura y el ticket).
+        En productos fraccionables `box_mode` elige precio de caja o de unidad.
+        """
+        if product.is_fractionable:
+            price = product.box_price if box_mode else product.unit_price
+        else:
+            price = product.price
+            box_mode = True
+        units = qty * product.units_per_box if box_mode and product.is_fractionable else qty
+        return {
+            "id": product.id,
+            "name": f"{product.name} ({'CAJA' if box_mode else 'UNIDAD'})",
+            "price": price,
+            "qty": qty,
+            "units_to_deduct": units,
+            "subtotal": price * qty,
+            "is_box_sale": box_mode,
+        }
+
+    def line_for_sku(self, sku, qty, box_mode=True):
+        """build_line() buscando el producto por SKU (para lotes y la línea de comandos)"""
+        product = self.session.execute(select(Product).where(Product.sku == sku)).scalar_one_or_none()
+        if product is None:
+            raise LookupError(f"No existe un producto con SKU {sku}")
+        return self.build_line(product, qty, box_mode)
+
+    def checkout(self, lines, payment_method="EFECTIVO", ncf=None, client_uuid=None, sale_date=None,
+                 allow_shortage=False):
+        """
+        Registra la venta: cabecera, detalles y descuento de stock por lote
+        (primero vence, primero sale). Retorna un dict con id, date, total,
+        items y shortages; si falta stock lanza InsufficientStockError y no
+        queda nada a medias (la sesión se revierte al salir del context manager).
+
+        allow_shortage=True es para ventas ya entregadas en caja (cola local):
+        se descuenta lo que haya y el faltante se informa en "shortages" como
+        (producto, unidades pedidas, unidades disponibles).
+        """
+        if not lines:
+            raise ValueError("La venta no tiene productos")
+        total = sum(line["subtotal"] for line in lines)
+        sale = Sale(total=total, payment_method=payment_method, ncf=ncf, client_uuid=client_uuid)
+        if sale_date is not None:
+            sale.date = sale_date
+        self.session.add(sale)
+        self.session.flush()
+
+        shortages = []
+        movements = []
+        for line in lines:
+            product = self.session.get(Product, line["id"])
+            if product is None:
+                raise LookupError(f"El producto {line['name']} ya no existe")
+            units = line["units_to_deduct"]
+            if product.total_stock < units:
+                if not allow_shortage:
+                    raise InsufficientStockError(
+                        f"Stock insuficiente para {product.name}. (Tienes {product.total_stock}, pides {units})")
+                shortages.append((product.name, units, product.total_stock))
+                units = max(product.total_stock, 0)
+
+            product.total_stock -= units
+            self.deduct_fefo(product.id, units)
+            movements.append({"product_id": product.id, "quantity": -units,
+                              "reason": stock_ledger.SALE, "reference": str(sale.id)})
+
+            self.session.add(SaleDetail(
+                sale_id=sale.id,
+                product_id=product.id,
+                quantity=line["qty"],
+                unit_price=line["price"],
+                subtotal=line["subtotal"],
+                is_box_sale=line["is_box_sale"],
+            ))
+
+        stock_ledger.record_movements(self.session, movements)
+        self.session.flush()
+        return {"id": sale.id, "date": sale.date, "total": total, "items": lines, "shortages": shortages}
+
+    def void_sale(self, sale_id, reason, user_name=None):
+        """
+        Anula una venta activa: queda registrada en sale_voids (fuera de los
+        totales y del reporte Z) y el stock que descontó vuelve al inventario,
+        al lote que vence último. Lanza LookupError si la venta no existe o ya
+        está archivada y ValueError si ya estaba anulada, falta el motivo o
+        un producto no tiene lotes donde devolver el stock.
+        """
+        reason = (reason or "").strip()
+        if not reason:
+            raise ValueError("Indique el motivo de la anulación")
+        sale = self.session.get(Sale, sale_id)
+        if sale is None:
+            raise LookupError(f"La venta #{sale_id} no existe o ya está archivada")
+        if self.session.get(SaleVoid, sale_id) is not None:
+            raise ValueError(f"La venta #{sale_id} ya está anulada")
+
+        # Lo que se descontó de verdad (con faltantes de la cola local) está en el libro;
+        # filtrar por producto usa el índice (product_id, id)
+        product_ids = {detail.product_id for detail in sale.details}
+        deducted = self.session.execute(
+            select(StockMovement.product_id, -func.sum(StockMovement.quantity))
+            .where(StockMovement.product_id.in_(product_ids), StockMovement.reason == stock_ledger.SALE,
+                   StockMovement.reference == str(sale_id))
+            .group_by(StockMovement.product_id)
+        ).all()
+
+        # Primero el lote de cada producto: si alguno no tiene, no se toca nada
+        returns = []
+        for product_id, units in deducted:
+            product = self.session.get(Product, product_id)
+            if product is None or not units:
+                continue
+            batch = self.session.execute(
+                select(ProductBatch).where(ProductBatch.product_id == product_id)
+                .order_by(ProductBatch.expiry_date.desc()).limit(1)
+            ).scalar_one_or_none()
+            if batch is None:
+                raise ValueError(f"{product.name} no tiene lotes para devolver {units} unidades: "
+                                 f"registre un lote antes de anular la venta #{sale_id}")
+            returns.append((product, batch, units))
+
+        movements = []
+        for product, batch, units in returns:
+            product.total_stock += units
+            batch.stock += units
+            movements.append({"product_id": product.id, "quantity": units,
+                              "reason": stock_ledger.VOID, "reference": str(sale_id)})
+
+        self.session.add(SaleVoid(sale_id=sale_id, reason=reason, user_name=user_name))
+        stock_ledger.record_movements(self.session, movements)
+        self.session.flush()
+        return sale
+
+    def deduct_fefo(self, product_id, units):
+        """Descuenta `units` de los lotes con stock, empezando por el que vence primero"""
+        batches = self.session.execute(
+            select(ProductBatch)
+            .where(ProductBatch.product_id == product_id, ProductBatch.stock > 0)
+            .order_by(ProductBatch.expiry_date)
+        ).scalars()
+        remaining = units
+        for batch in batches:
+            if remaining <= 0:
+                break
+            taken = min(batch.stock, remaining)
+            batch.stock -= taken
+            remaining -= taken
+        return remaining
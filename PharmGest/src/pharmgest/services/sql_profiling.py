@@ -0,0 +1,199 @@
+"""
+Instrumentación de SQL por acción (opcional, apagada por defecto).
+
+Con eventos before/after_cursor_execute de SQLAlchemy (en todos los
+motores) cuenta, por acción, cuántas consultas se hicieron, cuánto tardaron
+y cuáles fueron las más lentas. Una acción es:
+
+- cada tarea del ejecutor de BD, con el nombre de la función enviada
+  ("POSWidget.search_product", "SaleQueue.replay"...);
+- o un bloque `with sql_action("nombre"):` (CLI, scripts, otros hilos).
+
+Si dentro de una misma tarea se repite la misma forma de consulta (mismo
+SQL con otros parámetros) SQL_N1_UMBRAL veces o más, se avisa en el log:
+suele ser un N+1 (una consulta por fila, por ejemplo una relación perezosa
+dentro de un bucle).
+
+Se activa junto con el perfilado (botón del administrador o --perfil): el
+reporte queda como perfil_AAAAMMDD_HHMMSS_sql.txt al lado del .prof.
+"""
+import contextlib
+import contextvars
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import SQL_N1_UMBRAL, SQL_PERFIL_MAS_LENTAS
+
+_enabled = False
+_started_at = None
+_lock = threading.Lock()
+_actions = {}
+_current = contextvars.ContextVar("sql_action", default=None)
+
+SPACES = re.compile(r"\s+")
+BIND_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+SELECT_LIST = re.compile(r"^SELECT .+? FROM ", re.IGNORECASE)
+
+
+def statement_shape(statement):
+    """SQL sin valores: IN (?, ?, ?) y números literales se igualan"""
+    shape = SPACES.sub(" ", statement).strip()
+    shape = BIND_LISTS.sub("(?)", shape)
+    return NUMBERS.sub("?", shape)
+
+
+def _short(statement, width=160):
+    """Para el reporte: sin la lista de columnas, que tapa el FROM/WHERE"""
+    return SELECT_LIST.sub("SELECT … FROM ", statement, count=1)[:width]
+
+
+class ActionStats:
+    def __init__(self, name):
+        self.name = name
+        self.tasks = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self.slowest = []    # heap de (segundos, sql)
+        self.repeated = {}   # forma -> mayor cantidad de repeticiones en una sola tarea
+
+    def add_query(self, seconds, statement):
+        self.queries += 1
+        self.seconds += seconds
+        item = (seconds, SPACES.sub(" ", statement).strip())
+        if len(self.slowest) < SQL_PERFIL_MAS_LENTAS:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+
+class _Task:
+    """Consultas de una tarea; se suman a su acción al terminar (un solo bloqueo)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = []
+        self.shapes = Counter()
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_perfil_inicio", []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("sql_perfil_inicio")
+    if not starts:
+        return  # Se activó con la consulta ya en curso
+    seconds = time.perf_counter() - starts.pop()
+    task = _current.get()
+    if task is not None:
+        task.queries.append((seconds, statement))
+        task.shapes[statement_shape(statement)] += 1
+        return
+    # Fuera de una acción: se agrupa por hilo
+    with _lock:
+        name = f"(sin acción) {threading.current_thread().name}"
+        _stats(name).add_query(seconds, statement)
+
+
+def _stats(name):
+    stats = _actions.get(name)
+    if stats is None:
+        stats = _actions[name] = ActionStats(name)
+    return stats
+
+
+def _finish(task):
+    suspects = [(shape, count) for shape, count in task.shapes.items() if count >= SQL_N1_UMBRAL]
+    with _lock:
+        stats = _stats(task.name)
+        stats.tasks += 1
+        for seconds, statement in task.queries:
+            stats.add_query(seconds, statement)
+        new = []
+        for shape, count in suspects:
+            if shape not in stats.repeated:
+                new.append((shape, count))
+            stats.repeated[shape] = max(count, stats.repeated.get(shape, 0))
+    for shape, count in new:
+        logger.warning(f"Posible N+1 en {task.name}: la misma consulta {count} veces en una tarea: "
+                       f"{_short(shape, 200)}")
+
+
+def action_name(fn):
+    """'POSWidget.search_product' para una lambda definida dentro de ese método"""
+    name = getattr(fn, "__qualname__", None) or type(fn).__name__
+    return ".".join(part for part in name.split(".") if not part.startswith("<")) or name
+
+
+@contextlib.contextmanager
+def sql_action(name):
+    """Agrupa las consultas del bloque bajo `name` (no hace nada si está apagado)"""
+    if not _enabled:
+        yield
+        return
+    task = _Task(name)
+    token = _current.set(task)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        _finish(task)
+
+
+def enable_sql_profiling():
+    """Empieza a medir (desde cero)"""
+    global _enabled, _started_at
+    with _lock:
+        _actions.clear()
+        _started_at = time.perf_counter()
+        if not _enabled:
+            event.listen(Engine, "before_cursor_execute", _before)
+            event.listen(Engine, "after_cursor_execute", _after)
+            _enabled = True
+    logger.info("Instrumentación de SQL activada")
+
+
+def disable_sql_profiling():
+    global _enabled
+    with _lock:
+        if _enabled:
+            event.remove(Engine, "before_cursor_execute", _before)
+            event.remove(Engine, "after_cursor_execute", _after)
+            _enabled = False
+
+
+def is_sql_profiling():
+    return _enabled
+
+
+def sql_report():
+    """Resumen en texto: acciones de mayor a menor tiempo total en SQL"""
+    with _lock:
+        actions = sorted(_actions.values(), key=lambda a: a.seconds, reverse=True)
+        elapsed = time.perf_counter() - _started_at if _started_at else 0
+        lines = [f"Consultas SQL por acción ({elapsed:.1f} s de sesión, "
+                 f"{sum(a.queries for a in actions)} consultas)", ""]
+        for stats in actions:
+            per_task = f" ({stats.queries / stats.tasks:.1f} por tarea)" if stats.tasks else ""
+            lines.append(stats.name)
+            lines.append(f"  {stats.tasks} tareas · {stats.queries} consultas{per_task} · "
+                         f"{stats.seconds * 1000:.1f} ms en total · "
+                         f"{stats.seconds * 1000 / max(stats.queries, 1):.2f} ms por consulta")
+            for seconds, statement in sorted(stats.slowest, reverse=True):
+                lines.append(f"  {seconds * 1000:9.2f} ms  {_short(statement)}")
+            for shape, count in sorted(stats.repeated.items(), key=lambda item: -item[1]):
+                lines.append(f"  ⚠️ Posible N+1: {count} veces en una tarea: {_short(shape)}")
+            lines.append("")
+    return "\n".join(lines)
+
+
+def dump_sql_report(path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(sql_report())
+    return path
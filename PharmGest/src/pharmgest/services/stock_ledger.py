@@ -0,0 +1,122 @@
+"""
+Libro de movimientos de stock (stock_movements) y fotos periódicas (stock_snapshots).
+
+Cada cambio de Product.total_stock deja un movimiento en la MISMA transacción
+(venta, lote recibido, lote dado de baja, ajuste manual...). Nunca se edita ni
+se borra un movimiento: el libro es la auditoría del inventario.
+
+Las fotos guardan el saldo de cada producto hasta cierto movimiento. El stock
+a una fecha es la última foto anterior a esa fecha más los movimientos
+posteriores a ella y hasta la foto siguiente (rango acotado en los dos
+extremos por el índice (product_id, id)), sin recorrer todo el historial.
+"""
+from datetime import datetime
+from sqlalchemy import select, insert, func, text
+from src.pharmgest.config.database import get_db_session
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.database.models import Product, StockMovement, StockSnapshot
+
+OPENING = "apertura"
+SALE = "venta"
+VOID = "anulacion"
+BATCH_IN = "lote"
+BATCH_OUT = "baja_lote"
+ADJUSTMENT = "ajuste"
+NEW_PRODUCT = "alta"
+DELETED = "eliminado"
+
+# Sin foto posterior a la fecha pedida: el rango llega hasta el final del libro
+LAST_MOVEMENT_ID = 2 ** 63 - 1
+
+# Una foto por producto que se movió desde la última toma (límite global: el
+# mayor movement_id ya fotografiado), con el saldo anterior + lo nuevo
+TAKE_SNAPSHOTS = text("""
+    INSERT INTO stock_snapshots (product_id, taken_at, movement_id, stock)
+    SELECT m.product_id, :now, MAX(m.id),
+           COALESCE((SELECT s.stock FROM stock_snapshots s WHERE s.product_id = m.product_id
+                     ORDER BY s.taken_at DESC, s.id DESC LIMIT 1), 0) + SUM(m.quantity)
+    FROM stock_movements m
+    WHERE m.id > (SELECT COALESCE(MAX(movement_id), 0) FROM stock_snapshots)
+    GROUP BY m.product_id
+""")
+
+
+def record_movements(session, movements):
+    """
+    Agrega movimientos al libro en la transacción de `session` (sin commit).
+    `movements`: dicts con product_id, quantity, reason y opcionalmente reference.
+    Los de cantidad 0 se ignoran.
+    """
+    now = datetime.now()
+    rows = [dict(m, date=m.get("date", now), reference=m.get("reference"))
+            for m in movements if m["quantity"]]
+    if rows:
+        session.execute(insert(StockMovement), rows)
+    return len(rows)
+
+
+def record_movement(session, product_id, quantity, reason, reference=None):
+    return record_movements(session, [{"product_id": product_id, "quantity": quantity,
+                                       "reason": reason, "reference": reference}])
+
+
+def take_snapshots(session, taken_at=None):
+    """Foto del saldo de los productos con movimientos nuevos. Retorna cuántas fotos se tomaron."""
+    return session.execute(TAKE_SNAPSHOTS, {"now": taken_at or datetime.now()}).rowcount
+
+
+def snapshot_stock():
+    """Tarea del cierre del día (corre fuera del hilo de la interfaz)"""
+    with get_db_session() as session:
+        count = take_snapshots(session)
+    logger.info(f"Fotos de stock tomadas: {count} productos con movimientos")
+    return count
+
+
+def _last_snapshot(column, at):
+    return (select(column)
+            .where(StockSnapshot.product_id == Product.id, StockSnapshot.taken_at <= at)
+            .order_by(StockSnapshot.taken_at.desc(), StockSnapshot.id.desc())
+            .limit(1)
+            .correlate(Product)  # Dentro de la suma de movimientos también: la foto de ESE producto
+            .scalar_subquery())
+
+
+def _next_snapshot(column, at):
+    return (select(column)
+            .where(StockSnapshot.product_id == Product.id, StockSnapshot.taken_at > at)
+            .order_by(StockSnapshot.taken_at, StockSnapshot.id)
+            .limit(1)
+            .correlate(Product)
+            .scalar_subquery())
+
+
+def stock_at(session, at, product_ids=None):
+    """
+    {product_id: stock} a la fecha `at` (del catálogo completo o de
+    `product_ids`): última foto <= at + movimientos posteriores hasta `at`.
+    Los movimientos de una fecha pasada se leen solo hasta la foto siguiente:
+    los que vinieron después ya no pueden ser de antes de `at`.
+    """
+    after_movement = func.coalesce(_last_snapshot(StockSnapshot.movement_id, at), 0)
+    until_movement = func.coalesce(_next_snapshot(StockSnapshot.movement_id, at), LAST_MOVEMENT_ID)
+    moved = (select(func.coalesce(func.sum(StockMovement.quantity), 0))
+             .where(StockMovement.product_id == Product.id,
+                    StockMovement.id > after_movement,
+                    StockMovement.id <= until_movement,
+                    StockMovement.date <= at)
+             .scalar_subquery())
+    query = select(Product.id, func.coalesce(_last_snapshot(StockSnapshot.stock, at), 0) + moved)
+    if product_ids is not None:
+        query = query.where(Product.id.in_(list(product_ids)))
+    return dict(session.execute(query).all())
+
+
+def movements(session, product_id, date_from=None, date_to=None):
+    """Movimientos de un producto en orden, para auditoría"""
+    query = select(StockMovement).where(StockMovement.product_id == product_id).order_by(StockMovement.id)
+    if date_from is not None:
+        query = query.where(StockMovement.date >= date_from)
+    if date_to is not None:
+        query = query.where(StockMovement.date < date_to)
+    return session.execute(query).scalars().all()
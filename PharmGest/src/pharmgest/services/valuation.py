@@ -0,0 +1,165 @@
+"""
+Valoración del inventario a costo y a precio de venta, por categoría y por
+tramo de vencimiento, calculada en SQL sobre product_batches JOIN products
+(una sola consulta agregada, sin recorrer objetos ORM).
+
+    costo = unidades * costo de la caja / unidades por caja (fraccionables)
+            unidades * costo                                (resto)
+    venta = cajas completas * precio caja + sueltas * precio unidad (fraccionables)
+            unidades * precio                                      (resto)
+
+La valoración de hoy se calcula en vivo y queda en memoria mientras no cambie
+el stock (último movimiento del libro) ni los precios/costos del catálogo; al
+cierre del día se guarda en inventory_valuations y los días cerrados se leen
+de ahí (los lotes solo guardan el stock actual: un día pasado no se recalcula).
+"""
+import csv
+import threading
+from datetime import datetime, date, timedelta
+from sqlalchemy import select, func, case, and_, delete, insert, Float
+from src.pharmgest.config.database import get_db_session
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import VALORACION_TRAMOS_DIAS
+from src.pharmgest.database.models import Product, ProductBatch, Category, InventoryValuation, StockMovement
+
+NO_CATEGORY = "Sin categoría"
+CSV_COLUMNS = ["categoria", "tramo", "unidades", "costo", "venta"]
+
+# Última valoración en vivo: {"key": (día, huella), "rows": [...]}
+_live = {"key": None, "rows": None}
+_live_lock = threading.Lock()
+
+
+def bucket_labels(limits=VALORACION_TRAMOS_DIAS):
+    """Nombre de cada tramo de vencimiento: índice 0 = vencido"""
+    labels = ["Vencido"]
+    previous = 0
+    for limit in limits:
+        labels.append(f"{previous}-{limit} días")
+        previous = limit + 1
+    labels.append(f"Más de {limits[-1]} días")
+    return labels
+
+
+def valuation_query(as_of, limits=VALORACION_TRAMOS_DIAS):
+    # Tramos con fechas límite calculadas aquí: por lote solo se comparan fechas
+    start = datetime(as_of.year, as_of.month, as_of.day)
+    bucket = case((ProductBatch.expiry_date < start, 0),
+                  *[(ProductBatch.expiry_date < start + timedelta(days=limit + 1), i + 1)
+                    for i, limit in enumerate(limits)],
+                  else_=len(limits) + 1)
+    by_box = and_(Product.is_fractionable, Product.units_per_box > 1)
+    cost = case((by_box, ProductBatch.stock * func.coalesce(Product.cost, 0) / Product.units_per_box),
+                else_=ProductBatch.stock * func.coalesce(Product.cost, 0))
+    # Cajas completas (división entera) a precio de caja + sueltas a precio de unidad
+    retail = case((by_box, (ProductBatch.stock // Product.units_per_box) * func.coalesce(Product.box_price, 0)
+                   + (ProductBatch.stock % Product.units_per_box) * func.coalesce(Product.unit_price, 0)),
+                  else_=ProductBatch.stock * Product.price)
+    # Se agrupa por category_id (entero) y el nombre se une después sobre pocas filas
+    totals = (
+        select(Product.category_id.label("category_id"), bucket.label("bucket"),
+               func.sum(ProductBatch.stock).label("units"),
+               func.sum(cost, type_=Float).label("cost"), func.sum(retail, type_=Float).label("retail"))
+        .select_from(ProductBatch)
+        .join(Product, Product.id == ProductBatch.product_id)
+        .where(ProductBatch.stock > 0)
+        .group_by(Product.category_id, bucket)
+        .subquery()
+    )
+    category = func.coalesce(Category.name, NO_CATEGORY)
+    return (
+        select(category, totals.c.bucket, totals.c.units, totals.c.cost, totals.c.retail)
+        .select_from(totals)
+        .outerjoin(Category, Category.id == totals.c.category_id)
+        .order_by(category, totals.c.bucket)
+    )
+
+
+def _row(name, bucket, label, units, cost, retail):
+    return {"categoria": name, "tramo": label, "tramo_indice": bucket, "unidades": units,
+            "costo": round(cost or 0, 2), "venta": round(retail or 0, 2)}
+
+
+def fingerprint(session):
+    """
+    Cambia si cambia algo que entra en la valoración: el stock (todo cambio deja
+    un movimiento en el libro) o precios, costos, cajas y categoría del catálogo
+    (suma ponderada por id: intercambiar valores entre productos también la cambia).
+    """
+    last_movement = session.execute(select(func.max(StockMovement.id))).scalar()
+    catalog = session.execute(select(func.count(), func.total(Product.id * (
+        func.coalesce(Product.cost, 0) + 3 * Product.price + 7 * func.coalesce(Product.box_price, 0)
+        + 11 * func.coalesce(Product.unit_price, 0) + 13 * Product.units_per_box
+        + 17 * func.coalesce(Product.category_id, 0) + 19 * Product.is_fractionable)))).one()
+    return (last_movement, *catalog)
+
+
+def current_valuation(session, as_of=None):
+    """Valoración en vivo de los lotes actuales (vencimientos contados desde `as_of`)"""
+    as_of = as_of or datetime.now()
+    key = (as_of.date(), fingerprint(session))
+    with _live_lock:
+        if _live["key"] == key:
+            return list(_live["rows"])
+    labels = bucket_labels()
+    rows = [_row(name, bucket, labels[bucket], units, cost, retail)
+            for name, bucket, units, cost, retail in session.execute(valuation_query(as_of))]
+    with _live_lock:
+        _live["key"], _live["rows"] = key, rows
+    return list(rows)
+
+
+def inventory_valuation(session, day=None):
+    """
+    Valoración de `day` (date): hoy en vivo, días cerrados desde la caché.
+    Lanza LookupError si ese día no se guardó al cierre.
+    """
+    today = date.today()
+    day = day or today
+    if day >= today:
+        return current_valuation(session)
+    raw = session.execute(
+        select(InventoryValuation.category, InventoryValuation.bucket, InventoryValuation.bucket_label,
+               InventoryValuation.units, InventoryValuation.cost_value, InventoryValuation.retail_value)
+        .where(InventoryValuation.day == day)
+        .order_by(InventoryValuation.category, InventoryValuation.bucket)
+    ).all()
+    if not raw:
+        raise LookupError(f"No hay valoración guardada del {day:%d/%m/%Y} (se guarda al cierre del día)")
+    return [_row(*values) for values in raw]
+
+
+def summarize(rows):
+    """Totales de unidades, costo y venta (y margen potencial)"""
+    cost = sum(row["costo"] for row in rows)
+    retail = sum(row["venta"] for row in rows)
+    return {"unidades": sum(row["unidades"] for row in rows), "costo": cost, "venta": retail,
+            "margen": retail - cost}
+
+
+def store_daily_valuation(day=None):
+    """
+    Tarea del cierre del día: guarda la valoración de `day` (reemplaza si ya
+    estaba). Un cierre atrasado (la caja estaba apagada a la hora del cierre)
+    valora los lotes actuales con los vencimientos contados desde ese día.
+    """
+    day = day or date.today()
+    labels = bucket_labels()
+    with get_db_session() as session:
+        rows = session.execute(valuation_query(day)).all()
+        session.execute(delete(InventoryValuation).where(InventoryValuation.day == day))
+        if rows:
+            session.execute(insert(InventoryValuation), [
+                {"day": day, "category": name, "bucket": bucket, "bucket_label": labels[bucket],
+                 "units": units, "cost_value": cost or 0, "retail_value": retail or 0}
+                for name, bucket, units, cost, retail in rows
+            ])
+    logger.info(f"Valoración de inventario del {day:%d/%m/%Y} guardada ({len(rows)} filas)")
+    return len(rows)
+
+
+def export_valuation(rows, path):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
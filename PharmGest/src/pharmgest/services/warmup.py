@@ -0,0 +1,79 @@
+"""
+Precarga en segundo plano mientras el cajero escribe su usuario y contraseña.
+
+Importa los módulos pesados (reportlab, la ventana principal), abre y calienta
+las conexiones del pool (PRAGMAs, ATTACH del archivo, caché de páginas) y
+trae el catálogo de productos para que el POS se pinte sin ir a la BD.
+También arma el índice de búsqueda por trigramas del catálogo.
+"""
+import importlib
+import threading
+import time
+from sqlalchemy import select
+from src.pharmgest.config.database import engine, analytics_engine
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import WARMUP_CONEXIONES
+from src.pharmgest.services.product_search import get_search_index
+from src.pharmgest.services.read_models import CATALOG_COLUMNS, CatalogRow, fetch
+
+HEAVY_MODULES = [
+    "reportlab.pdfgen.canvas",
+    "reportlab.lib.pagesizes",
+    "src.pharmgest.services.invoice",
+    "src.pharmgest.ui.main_window",
+]
+
+# Consultas que suben a la caché las páginas que leen las primeras pantallas
+PRIME_QUERIES = [
+    "SELECT * FROM products",
+    "SELECT * FROM product_batches",
+    "SELECT * FROM sales ORDER BY id DESC LIMIT 500",
+    "SELECT * FROM sale_details ORDER BY id DESC LIMIT 2000",
+]
+
+
+class WarmUp:
+    def __init__(self):
+        self.done = threading.Event()
+        self.catalog = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="pharmgest-precarga", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            for module in HEAVY_MODULES:
+                importlib.import_module(module)
+            modules_time = time.perf_counter() - start
+
+            # Abrir varias a la vez obliga al pool a crear conexiones distintas. Las
+            # pantallas leen por el motor de solo lectura; el cobro usa una de escritura
+            conns = [engine.connect()] + [analytics_engine.connect() for _ in range(WARMUP_CONEXIONES)]
+            try:
+                for conn in conns:
+                    for sql in PRIME_QUERIES:
+                        conn.exec_driver_sql(sql).fetchall()
+                self.catalog = fetch(conns[-1], CatalogRow, select(*CATALOG_COLUMNS))
+                get_search_index().build(conns[-1])
+            finally:
+                for conn in conns:
+                    conn.close()
+
+            logger.info(f"Precarga lista en {time.perf_counter() - start:.2f}s "
+                        f"(módulos {modules_time:.2f}s, {len(self.catalog)} productos)")
+        except Exception as e:
+            # La precarga es solo una optimización: si falla, la app carga normal
+            logger.warning(f"Precarga incompleta: {e}", exc_info=True)
+        finally:
+            self.done.set()
+
+    def wait(self, timeout):
+        return self.done.wait(timeout)
+
+    def take_catalog(self):
+        """Entrega el catálogo precargado una sola vez (luego el POS consulta la BD)"""
+        catalog, self.catalog = self.catalog, None
+        return catalog
@@ -0,0 +1,360 @@
+"""
+Reporte Z (cierre del día) en PDF: resumen, totales por método de pago,
+margen, anulaciones y el listado de todas las ventas del día.
+
+Los totales salen de consultas agregadas sobre el rango [día, día + 1)
+(índice de fecha de ventas). El listado no se arma entero en memoria: las
+filas se leen por tandas (yield_per) y se entregan a platypus en tablas de
+REPORTE_Z_FILAS_POR_TABLA filas a medida que se dibujan las páginas
+(FlowableStream). Una tabla única de miles de filas se volvería a medir y
+cortar en cada página; las tablas chicas se cortan a lo sumo una vez.
+
+    with get_read_session() as session:
+        write_z_report(session, date.today(), "cierre.pdf")
+"""
+import os
+from collections import namedtuple
+from datetime import datetime, date, time, timedelta
+from itertools import islice
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import (BaseDocTemplate, PageTemplate, Frame, Paragraph, Spacer, Table, TableStyle,
+                                NextPageTemplate, PageBreak)
+from sqlalchemy import select, func, case
+from src.pharmgest.config.database import get_read_session
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import REPORTE_Z_DIR, REPORTE_Z_FILAS_POR_TABLA
+from src.pharmgest.database.models import Product, SaleVoid, all_sales, all_sale_details
+from src.pharmgest.services.reports import ReportService
+
+MARGIN = 50
+ROW_HEIGHT = 14
+# Listado de ventas: (título, ancho, alineación); suma = ancho útil de la carta
+SALE_COLUMNS = (("Hora", 45, "LEFT"), ("Ticket", 55, "LEFT"), ("NCF", 85, "LEFT"), ("Pago", 80, "LEFT"),
+                ("Arts.", 35, "RIGHT"), ("Total", 75, "RIGHT"), ("Margen", 75, "RIGHT"), ("Estado", 62, "LEFT"))
+
+
+VoidRow = namedtuple("VoidRow", "sale_id voided_at reason user_name date ncf total")
+
+
+def day_bounds(day):
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def _in_day(start, end):
+    return (all_sales.c.date >= start) & (all_sales.c.date < end)
+
+
+def _day_lines(session, start, end, valid_only=False):
+    """
+    Ganancia y cantidad de líneas por venta del día. SQLite solo empuja a
+    las ramas del UNION ALL de la vista las condiciones sin subconsultas:
+    primero se busca el rango de ids de las ventas del día y la vista de
+    detalles se acota con sale_id BETWEEN (índice por sale_id en cada rama);
+    el IN deja solo las del día.
+    """
+    day_ids = select(all_sales.c.id).where(_in_day(start, end))
+    first_id, last_id = session.execute(
+        select(func.min(all_sales.c.id), func.max(all_sales.c.id)).where(_in_day(start, end))).one()
+    if valid_only:
+        day_ids = day_ids.where(~select(SaleVoid.sale_id).where(SaleVoid.sale_id == all_sales.c.id).exists())
+    return (
+        select(all_sale_details.c.sale_id, func.count().label("line_count"),
+               func.sum(ReportService.profit_column()).label("margin"))
+        .select_from(all_sale_details)
+        .outerjoin(Product, Product.id == all_sale_details.c.product_id)
+        .where(all_sale_details.c.sale_id.between(first_id or 0, last_id or 0),
+               all_sale_details.c.sale_id.in_(day_ids))
+        .group_by(all_sale_details.c.sale_id)
+        .subquery("lines")
+    )
+
+
+def day_totals(session, day):
+    """
+    Totales del día: tickets, venta, anuladas, margen (sin las anuladas) y
+    primer/último NCF emitido.
+    """
+    start, end = day_bounds(day)
+    voided = SaleVoid.sale_id.is_not(None)
+    row = session.execute(
+        select(func.count(), func.coalesce(func.sum(all_sales.c.total), 0),
+               func.count(SaleVoid.sale_id), func.coalesce(func.sum(case((voided, all_sales.c.total))), 0),
+               func.min(all_sales.c.ncf), func.max(all_sales.c.ncf))
+        .select_from(all_sales).outerjoin(SaleVoid, SaleVoid.sale_id == all_sales.c.id)
+        .where(_in_day(start, end))
+    ).one()
+    lines = _day_lines(session, start, end, valid_only=True)
+    margin = session.execute(select(func.coalesce(func.sum(lines.c.margin), 0))).scalar()
+    tickets, gross, voided_count, voided_total, first_ncf, last_ncf = row
+    net = gross - voided_total
+    valid = tickets - voided_count
+    return {"tickets": valid, "gross": gross, "voided": voided_count, "voided_total": voided_total,
+            "net": net, "margin": margin, "margin_pct": margin / net * 100 if net else 0,
+            "average": net / valid if valid else 0, "first_ncf": first_ncf, "last_ncf": last_ncf}
+
+
+def payment_totals(session, day):
+    """(método, tickets, total) de las ventas no anuladas del día"""
+    start, end = day_bounds(day)
+    return session.execute(
+        select(all_sales.c.payment_method, func.count(), func.sum(all_sales.c.total))
+        .select_from(all_sales).outerjoin(SaleVoid, SaleVoid.sale_id == all_sales.c.id)
+        .where(_in_day(start, end), SaleVoid.sale_id.is_(None))
+        .group_by(all_sales.c.payment_method).order_by(func.sum(all_sales.c.total).desc())
+    ).all()
+
+
+def day_voids(session, day):
+    """
+    Anulaciones registradas en el día (la venta puede ser de un día
+    anterior): (sale_id, voided_at, reason, user_name, date, ncf, total).
+    """
+    start, end = day_bounds(day)
+    voids = session.execute(
+        select(SaleVoid).where(SaleVoid.voided_at >= start, SaleVoid.voided_at < end).order_by(SaleVoid.voided_at)
+    ).scalars().all()
+    # Lista de ids constante: se busca por clave en cada rama de la vista, sin recorrerla
+    sales = {row.id: row for row in session.execute(
+        select(all_sales.c.id, all_sales.c.date, all_sales.c.ncf, all_sales.c.total)
+        .where(all_sales.c.id.in_([v.sale_id for v in voids])))} if voids else {}
+    rows = []
+    for void in voids:
+        sale = sales.get(void.sale_id)
+        rows.append(VoidRow(void.sale_id, void.voided_at, void.reason, void.user_name,
+                            *((sale.date, sale.ncf, sale.total) if sale else (None, None, None))))
+    return rows
+
+
+def day_sales(session, day, batch=500):
+    """
+    Una fila por venta del día, en orden de hora: id, date, ncf,
+    payment_method, total, items, margin y voided. Se lee por tandas de
+    `batch` filas: iterar el resultado sin guardarlo.
+    """
+    start, end = day_bounds(day)
+    lines = _day_lines(session, start, end)
+    query = (
+        select(all_sales.c.id, all_sales.c.date, all_sales.c.ncf, all_sales.c.payment_method, all_sales.c.total,
+               func.coalesce(lines.c.line_count, 0).label("items"), func.coalesce(lines.c.margin, 0).label("margin"),
+               SaleVoid.sale_id.is_not(None).label("voided"))
+        .select_from(all_sales)
+        .outerjoin(lines, lines.c.sale_id == all_sales.c.id)
+        .outerjoin(SaleVoid, SaleVoid.sale_id == all_sales.c.id)
+        .where(_in_day(start, end))
+        .order_by(all_sales.c.date, all_sales.c.id)
+    )
+    return session.execute(query, execution_options={"yield_per": batch})
+
+
+class FlowableStream(list):
+    """
+    Lista de flowables que se llena desde un generador a medida que
+    platypus la consume: build() pregunta len() en cada vuelta y borra el
+    primero ya dibujado, así en memoria solo hay unos pocos a la vez.
+    """
+    def __init__(self, source, ahead=3):
+        super().__init__()
+        self.source = iter(source)
+        self.ahead = ahead
+
+    def __len__(self):
+        missing = self.ahead - super().__len__()
+        if missing > 0 and self.source is not None:
+            chunk = list(islice(self.source, missing))
+            self.extend(chunk)
+            if len(chunk) < missing:
+                self.source = None
+        return super().__len__()
+
+
+def _money(value):
+    return f"-${-value:,.2f}" if value < 0 else f"${value:,.2f}"
+
+
+def _table(rows, widths, header=True, right=(1, -1)):
+    """Tabla chica del resumen; las columnas de right[0] a right[1] van a la derecha"""
+    table = Table(rows, colWidths=widths, hAlign="LEFT")
+    style = [("FONTSIZE", (0, 0), (-1, -1), 9), ("VALIGN", (0, 0), (-1, -1), "TOP"),
+             ("ALIGN", (right[0], 0), (right[1], -1), "RIGHT"),
+             ("LINEBELOW", (0, -1), (-1, -1), 0.5, colors.grey)]
+    if header:
+        style += [("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"), ("LINEBELOW", (0, 0), (-1, 0), 0.5, colors.black)]
+    table.setStyle(TableStyle(style))
+    return table
+
+
+def _summary(session, day, totals, styles):
+    """Primera(s) página(s): resumen, métodos de pago y anulaciones"""
+    yield Paragraph("FARMACIA PHARMGEST", styles["Title"])
+    yield Paragraph(f"REPORTE Z — CIERRE DEL DÍA {day:%d/%m/%Y}", styles["Heading2"])
+    yield Paragraph(f"Generado: {datetime.now():%d/%m/%Y %H:%M}", styles["Normal"])
+    yield Spacer(1, 12)
+
+    ncf_range = f"{totals['first_ncf']} a {totals['last_ncf']}" if totals["first_ncf"] else "—"
+    yield _table([
+        ["Tickets válidos", str(totals["tickets"])],
+        ["Venta bruta", _money(totals["gross"])],
+        ["Anuladas", f"{totals['voided']} ({_money(totals['voided_total'])})"],
+        ["VENTA NETA", _money(totals["net"])],
+        ["Margen", f"{_money(totals['margin'])} ({totals['margin_pct']:.1f}%)"],
+        ["Ticket promedio", _money(totals["average"])],
+        ["NCF emitidos", ncf_range],
+    ], (200, 200), header=False)
+    yield Spacer(1, 18)
+
+    yield Paragraph("Por método de pago", styles["Heading3"])
+    net = totals["net"]
+    yield _table([["Método", "Tickets", "Total", "%"]] + [
+        [method or "—", str(count), _money(total), f"{total / net * 100:.1f}%" if net else "—"]
+        for method, count, total in payment_totals(session, day)
+    ] + [["TOTAL", str(totals["tickets"]), _money(net), ""]], (160, 80, 100, 60))
+    yield Spacer(1, 18)
+
+    yield Paragraph("Anulaciones del día", styles["Heading3"])
+    voids = day_voids(session, day)
+    if not voids:
+        yield Paragraph("Sin anulaciones.", styles["Normal"])
+        return
+    reason_style = styles["BodyText"].clone("motivo", fontSize=8, leading=9)
+    yield _table([["Anulada", "Ticket", "Venta", "NCF", "Total", "Motivo", "Usuario"]] + [
+        [f"{v.voided_at:%H:%M}", f"#{v.sale_id}", f"{v.date:%d/%m %H:%M}" if v.date else "—", v.ncf or "",
+         _money(v.total or 0), Paragraph(v.reason, reason_style), v.user_name or ""]
+        for v in voids
+    ], (45, 50, 65, 85, 65, 140, 62), right=(4, 4))
+
+
+def _sale_tables(rows, size):
+    """El listado en tablas de `size` filas del mismo ancho: una tras otra parecen una sola"""
+    widths = [width for _, width, _ in SALE_COLUMNS]
+    base_style = [("FONTSIZE", (0, 0), (-1, -1), 8), ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                  ("ROWBACKGROUNDS", (0, 0), (-1, -1), [colors.white, colors.HexColor("#F2F2F2")])]
+    base_style += [("ALIGN", (i, 0), (i, -1), align) for i, (_, _, align) in enumerate(SALE_COLUMNS)
+                   if align == "RIGHT"]
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        style = list(base_style)
+        data = []
+        for i, sale in enumerate(chunk):
+            data.append([f"{sale.date:%H:%M}", f"#{sale.id}", sale.ncf or "", sale.payment_method or "",
+                         str(sale.items), _money(sale.total), _money(sale.margin),
+                         "ANULADA" if sale.voided else ""])
+            if sale.voided:
+                style.append(("TEXTCOLOR", (0, i), (-1, i), colors.red))
+        table = Table(data, colWidths=widths, rowHeights=ROW_HEIGHT)
+        table.setStyle(TableStyle(style))
+        yield table
+
+
+def _draw_page(canvas, doc, title=None):
+    """Pie con número de página; en el listado, además, título y columnas arriba"""
+    width, height = letter
+    canvas.saveState()
+    canvas.setFont("Helvetica-Oblique", 8)
+    canvas.drawString(MARGIN, 30, f"PharmGest — Reporte Z {doc.day:%d/%m/%Y}")
+    canvas.drawRightString(width - MARGIN, 30, f"Página {doc.page}")
+    if title:
+        canvas.setFont("Helvetica-Bold", 11)
+        canvas.drawString(MARGIN, height - MARGIN + 10, title)
+        canvas.setFont("Helvetica-Bold", 8)
+        x = MARGIN
+        y = height - MARGIN - 8
+        for label, col_width, align in SALE_COLUMNS:
+            if align == "RIGHT":
+                canvas.drawRightString(x + col_width - 6, y, label)
+            else:
+                canvas.drawString(x + 6, y, label)
+            x += col_width
+        canvas.line(MARGIN, y - 4, width - MARGIN, y - 4)
+    canvas.restoreState()
+
+
+def write_z_report(session, day, target, rows_per_table=REPORTE_Z_FILAS_POR_TABLA):
+    """
+    Dibuja el reporte Z de `day` en `target` (ruta o archivo binario).
+    La sesión queda en uso mientras se dibuja: el listado se lee de a poco.
+    Retorna los totales del día (day_totals).
+    """
+    width, height = letter
+    doc = BaseDocTemplate(target, pagesize=letter, leftMargin=MARGIN, rightMargin=MARGIN,
+                          topMargin=MARGIN, bottomMargin=MARGIN, title=f"Reporte Z {day:%d/%m/%Y}",
+                          author="PharmGest")
+    doc.day = day
+    body = height - 2 * MARGIN
+    doc.addPageTemplates([
+        PageTemplate("resumen", [Frame(MARGIN, MARGIN, width - 2 * MARGIN, body, id="resumen")],
+                     onPage=_draw_page),
+        # Deja lugar arriba para el título y los nombres de columna que dibuja _draw_page
+        PageTemplate("ventas", [Frame(MARGIN, MARGIN, width - 2 * MARGIN, body - 20, id="ventas",
+                                      leftPadding=0, rightPadding=0, topPadding=0)],
+                     onPage=lambda canvas, d: _draw_page(canvas, d, f"Ventas del día {day:%d/%m/%Y}")),
+    ])
+
+    styles = getSampleStyleSheet()
+    totals = day_totals(session, day)
+
+    def flowables():
+        yield from _summary(session, day, totals, styles)
+        yield NextPageTemplate("ventas")
+        yield PageBreak()
+        yield from _sale_tables(iter(day_sales(session, day)), rows_per_table)
+
+    doc.build(FlowableStream(flowables()))
+    return totals
+
+
+def z_report_path(day):
+    return os.path.join(REPORTE_Z_DIR, f"cierre_{day:%Y%m%d}.pdf")
+
+
+def store_z_report(day=None):
+    """
+    Genera el reporte Z en cierres/cierre_AAAAMMDD.pdf (tarea del cierre del
+    día; volver a generarlo lo reemplaza). Retorna la ruta.
+    """
+    day = day or date.today()
+    path = z_report_path(day)
+    os.makedirs(REPORTE_Z_DIR, exist_ok=True)
+    # A un temporal y después reemplazar: nunca queda un PDF a medias con el nombre final
+    partial = path + ".tmp"
+    with get_read_session() as session:
+        totals = write_z_report(session, day, partial)
+    os.replace(partial, path)
+    logger.info(f"Reporte Z {day:%d/%m/%Y}: {totals['tickets']} tickets, "
+                f"${totals['net']:,.2f} netos, {totals['voided']} anuladas -> {path}")
+    return path
+
+
+# Último día con el cierre completo (todas sus tareas bien), junto a los reportes Z
+CLOSED_DAY_FILE = os.path.join(REPORTE_Z_DIR, "ultimo_cierre.txt")
+
+
+def last_closed_day():
+    """
+    Último día cerrado completo. Sin la marca (instalaciones anteriores) se
+    toma el último reporte Z guardado; None si nunca hubo un cierre.
+    """
+    try:
+        with open(CLOSED_DAY_FILE, encoding="utf-8") as f:
+            return datetime.strptime(f.read().strip(), "%Y-%m-%d").date()
+    except (FileNotFoundError, ValueError):
+        pass
+    days = []
+    for name in os.listdir(REPORTE_Z_DIR) if os.path.isdir(REPORTE_Z_DIR) else []:
+        try:
+            days.append(datetime.strptime(name, "cierre_%Y%m%d.pdf").date())
+        except ValueError:
+            continue  # .tmp a medias u otros archivos
+    return max(days, default=None)
+
+
+def save_closed_day(day):
+    os.makedirs(REPORTE_Z_DIR, exist_ok=True)
+    partial = CLOSED_DAY_FILE + ".tmp"
+    with open(partial, "w", encoding="utf-8") as f:
+        f.write(f"{day:%Y-%m-%d}\n")
+    os.replace(partial, CLOSED_DAY_FILE)
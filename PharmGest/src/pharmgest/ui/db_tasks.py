@@ -0,0 +1,65 @@
+"""
+Puente entre los Future del ejecutor de base de datos y el hilo de Qt.
+
+    when_done(get_executor().read(load), self, self.show_rows,
+              error_message="Error al cargar los datos.")
+
+El resultado (o el error) se entrega con una señal: Qt la encola y el slot
+corre en el hilo de la interfaz, nunca en el hilo de la base de datos.
+"""
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtWidgets import QMessageBox
+from sqlalchemy.exc import SQLAlchemyError
+from src.pharmgest.config.logging_config import logger
+
+
+class FutureWatcher(QObject):
+    finished = pyqtSignal(object)
+
+    def __init__(self, owner, on_result, on_error):
+        # Hijo de `owner`: si la ventana se cierra antes del resultado, no se llama a nadie
+        super().__init__(owner)
+        self.on_result = on_result
+        self.on_error = on_error
+        self.finished.connect(self.deliver)
+
+    def notify(self, future):
+        """Se llama desde el hilo de la base de datos"""
+        try:
+            self.finished.emit(future)
+        except RuntimeError:
+            pass  # El dueño (y este objeto) ya fueron destruidos
+
+    def deliver(self, future):
+        self.deleteLater()
+        error = future.exception()
+        if error is None:
+            # Un error al pintar el resultado se maneja igual que uno de la consulta
+            try:
+                self.on_result(future.result())
+                return
+            except Exception as e:
+                error = e
+        self.on_error(error)
+
+
+def show_db_error(owner, error, message):
+    """Manejo de errores de siempre: log + mensaje (de BD o inesperado)"""
+    if isinstance(error, SQLAlchemyError):
+        logger.error(f"{message} {error}", exc_info=error)
+        QMessageBox.critical(owner, "Error de Base de Datos", message)
+    else:
+        logger.error(f"Error inesperado: {error}", exc_info=error)
+        QMessageBox.critical(owner, "Error", f"Error inesperado: {str(error)}")
+
+
+def when_done(future, owner, on_result, on_error=None, error_message="Ocurrió un error en la base de datos."):
+    """
+    Llama a on_result(resultado) en el hilo de la interfaz cuando `future`
+    termine. Si falla, on_error(excepción) o, por defecto, show_db_error().
+    """
+    if on_error is None:
+        on_error = lambda error: show_db_error(owner, error, error_message)
+    watcher = FutureWatcher(owner, on_result, on_error)
+    future.add_done_callback(watcher.notify)
+    return watcher
@@ -5,11 +5,11 @@ from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget,
                            QAbstractItemView, QGroupBox)
 from PyQt6.QtCore import Qt, QDate
 from PyQt6.QtGui import QColor, QIcon
-from sqlalchemy.exc import SQLAlchemyError
-from src.pharmgest.config.database import SessionLocal, get_db_session
 from src.pharmgest.config.logging_config import logger
 from src.pharmgest.config.settings import DIAS_VENCIMIENTO_ADVERTENCIA
-from src.pharmgest.database.models import Product, ProductBatch
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.services.inventory import InventoryService
+from src.pharmgest.ui.db_tasks import when_done
 
 class BatchDialog(QDialog):
     def __init__(self, parent=None, product_id=None):
@@ -82,71 +82,65 @@ class BatchDialog(QDialog):
         self.load_data()
 
     def load_data(self):
-        try:
-            with get_db_session() as session:
-                product = session.get(Product, self.product_id)
-                
-                if not product:
-                    QMessageBox.warning(self, "Error", "Producto no encontrado")
-                    self.close()
-                    return
-                
-                # Actualizar info
-                if product.is_fractionable:
-                    self.lbl_qty_unit.setText(f"Cajas (x{product.units_per_box}):")
-                    info_text = f"📦 {product.name} | Total: {product.stock_display}"
-                else:
-                    self.lbl_qty_unit.setText("Unidades:")
-                    info_text = f"📦 {product.name} | Total: {product.total_stock}"
-                    
-                self.lbl_info.setText(info_text)
-                
-                # Cargar lotes
-                batches = session.query(ProductBatch).filter_by(product_id=self.product_id)\
-                    .order_by(ProductBatch.expiry_date).all()
-                
-                self.table.setRowCount(0)
-                today = datetime.now().date()
-                
-                for row, batch in enumerate(batches):
-                    self.table.insertRow(row)
-                    self.table.setItem(row, 0, QTableWidgetItem(str(batch.id)))
-                    self.table.setItem(row, 1, QTableWidgetItem(batch.batch_code))
-                    
-                    expiry = batch.expiry_date.date()
-                    self.table.setItem(row, 2, QTableWidgetItem(expiry.strftime("%d/%m/%Y")))
-                    self.table.setItem(row, 3, QTableWidgetItem(str(batch.stock)))
-                    
-                    # Semáforo
-                    days_left = (expiry - today).days
-                    status = QTableWidgetItem()
-                    if days_left < 0:
-                        status.setText("🚫 VENCIDO")
-                        status.setBackground(QColor("#ffcccc")) # Rojo suave
-                        status.setForeground(QColor("#000000")) # Texto negro
-                    elif days_left < DIAS_VENCIMIENTO_ADVERTENCIA:
-                        status.setText(f"⚠️ {days_left} días")
-                        status.setBackground(QColor("#fff4cc")) # Amarillo suave
-                        status.setForeground(QColor("#000000"))
-                    else:
-                        status.setText("✅ OK")
-                        # Si usas tema oscuro, el texto blanco está bien por defecto
-                    
-                    self.table.setItem(row, 4, status)
-                    
-                    # BOTÓN BORRAR
-                    btn_del = QPushButton("🗑️")
-                    btn_del.setCursor(Qt.CursorShape.PointingHandCursor)
-                    btn_del.setStyleSheet("border: none; background: transparent; font-size: 14px;")
-                    btn_del.setToolTip("Eliminar Lote (Restará el stock)")
-                    btn_del.clicked.connect(lambda _, b_id=batch.id: self.delete_batch(b_id))
-                    self.table.setCellWidget(row, 5, btn_del)
-        except SQLAlchemyError as e:
-            logger.error(f"Error al cargar lotes: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error de Base de Datos", "Error al cargar los lotes.")
-        except Exception as e:
-            logger.error(f"Error inesperado al cargar lotes: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error", f"Error inesperado: {str(e)}")
+        def run(session):
+            service = InventoryService(session)
+            return service.product_row(self.product_id), service.batches(self.product_id)
+
+        future = get_executor().read(run)
+        when_done(future, self, lambda data: self.show_data(*data), error_message="Error al cargar los lotes.")
+
+    def show_data(self, product, batches):
+        if not product:
+            QMessageBox.warning(self, "Error", "Producto no encontrado")
+            self.close()
+            return
+
+        # Actualizar info
+        if product.is_fractionable:
+            self.lbl_qty_unit.setText(f"Cajas (x{product.units_per_box}):")
+            info_text = f"📦 {product.name} | Total: {product.stock_display}"
+        else:
+            self.lbl_qty_unit.setText("Unidades:")
+            info_text = f"📦 {product.name} | Total: {product.total_stock}"
+
+        self.lbl_info.setText(info_text)
+
+        self.table.setRowCount(0)
+        today = datetime.now().date()
+
+        for row, batch in enumerate(batches):
+            self.table.insertRow(row)
+            self.table.setItem(row, 0, QTableWidgetItem(str(batch.id)))
+            self.table.setItem(row, 1, QTableWidgetItem(batch.batch_code))
+
+            expiry = batch.expiry_date.date()
+            self.table.setItem(row, 2, QTableWidgetItem(expiry.strftime("%d/%m/%Y")))
+            self.table.setItem(row, 3, QTableWidgetItem(str(batch.stock)))
+
+            # Semáforo
+            days_left = (expiry - today).days
+            status = QTableWidgetItem()
+            if days_left < 0:
+                status.setText("🚫 VENCIDO")
+                status.setBackground(QColor("#ffcccc")) # Rojo suave
+                status.setForeground(QColor("#000000")) # Texto negro
+            elif days_left < DIAS_VENCIMIENTO_ADVERTENCIA:
+                status.setText(f"⚠️ {days_left} días")
+                status.setBackground(QColor("#fff4cc")) # Amarillo suave
+                status.setForeground(QColor("#000000"))
+            else:
+                status.setText("✅ OK")
+                # Si usas tema oscuro, el texto blanco está bien por defecto
+
+            self.table.setItem(row, 4, status)
+
+            # BOTÓN BORRAR
+            btn_del = QPushButton("🗑️")
+            btn_del.setCursor(Qt.CursorShape.PointingHandCursor)
+            btn_del.setStyleSheet("border: none; background: transparent; font-size: 14px;")
+            btn_del.setToolTip("Eliminar Lote (Restará el stock)")
+            btn_del.clicked.connect(lambda _, b_id=batch.id: self.delete_batch(b_id))
+            self.table.setCellWidget(row, 5, btn_del)
 
     def add_batch(self):
         code = self.input_code.text()
@@ -159,48 +153,20 @@ class BatchDialog(QDialog):
         expiry = self.input_date.date().toPyDate()
         expiry_dt = datetime(expiry.year, expiry.month, expiry.day)
         
-        try:
-            with get_db_session() as session:
-                product = session.get(Product, self.product_id)
-                
-                if product is None:
-                    QMessageBox.warning(self, "Error", "Producto no encontrado")
-                    return
-            
-            # 1. Calcular cuánto stock real entra
-            real_stock_to_add = qty_input
-            if product.is_fractionable:
-                real_stock_to_add = qty_input * product.units_per_box
-
-                # 2. Crear el Lote
-                new_batch = ProductBatch(
-                    product_id=self.product_id,
-                    batch_code=code,
-                    stock=real_stock_to_add,
-                    expiry_date=expiry_dt
-                )
-                session.add(new_batch)
-                session.flush() # Para obtener el ID antes del commit
-                
-                # 3. RECALCULAR STOCK TOTAL DESDE CERO (Fuente de Verdad)
-                # Esto corrige cualquier error matemático previo
-                all_batches = session.query(ProductBatch).filter_by(product_id=self.product_id).all()
-                total_real = sum(b.stock for b in all_batches)
-                
-                product.total_stock = total_real
-                # El commit se hace automáticamente al salir del context manager
-            
-            # Limpiar y recargar
-            self.input_code.clear()
-            self.input_qty.setValue(1)
-            self.load_data()
-            
-        except SQLAlchemyError as e:
-            logger.error(f"Error de BD al agregar lote: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error de Base de Datos", "Error al agregar el lote.")
-        except Exception as e:
-            logger.error(f"Error inesperado al agregar lote: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error", f"Error inesperado: {str(e)}")
+        # Crea el lote y recalcula el stock total (fuente de verdad) en la misma transacción
+        future = get_executor().write(
+            lambda session: InventoryService(session).add_batch(self.product_id, code, qty_input, expiry_dt))
+        when_done(future, self, self.batch_added, error_message="Error al agregar el lote.")
+
+    def batch_added(self, added):
+        if added is None:
+            QMessageBox.warning(self, "Error", "Producto no encontrado")
+            return
+        
+        # Limpiar y recargar
+        self.input_code.clear()
+        self.input_qty.setValue(1)
+        self.load_data()
 
     def delete_batch(self, batch_id):
         confirm = QMessageBox.question(
@@ -210,30 +176,12 @@ class BatchDialog(QDialog):
         )
         
         if confirm == QMessageBox.StandardButton.Yes:
-            try:
-                with get_db_session() as session:
-                    batch = session.get(ProductBatch, batch_id)
-                    if batch:
-                        # 1. Borrar Lote
-                        session.delete(batch)
-                        session.flush()
-                        
-                        # 2. RECALCULAR STOCK TOTAL DESDE CERO
-                        product = session.get(Product, self.product_id)
-                        if product:
-                            all_batches = session.query(ProductBatch).filter_by(product_id=self.product_id).all()
-                            total_real = sum(b.stock for b in all_batches)
-                            
-                            product.total_stock = total_real
-                            # El commit se hace automáticamente al salir del context manager
-                    else:
-                        QMessageBox.warning(self, "Error", "Lote no encontrado")
-                        return
-                
-                self.load_data()
-            except SQLAlchemyError as e:
-                logger.error(f"Error de BD al eliminar lote: {e}", exc_info=True)
-                QMessageBox.critical(self, "Error de Base de Datos", "Error al eliminar el lote.")
-            except Exception as e:
-                logger.error(f"Error inesperado al eliminar lote: {e}", exc_info=True)
-                QMessageBox.critical(self, "Error", f"Error inesperado: {str(e)}")
\ No newline at end of file
+            # Borra el lote y recalcula el stock total desde cero
+            future = get_executor().write(lambda session: InventoryService(session).delete_batch(batch_id))
+            when_done(future, self, self.batch_deleted, error_message="Error al eliminar el lote.")
+
+    def batch_deleted(self, deleted):
+        if not deleted:
+            QMessageBox.warning(self, "Error", "Lote no encontrado")
+            return
+        self.load_data()
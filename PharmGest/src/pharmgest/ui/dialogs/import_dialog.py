@@ -0,0 +1,136 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget,
+                           QTableWidgetItem, QLabel, QPushButton, QHeaderView,
+                           QFileDialog, QMessageBox, QProgressBar, QAbstractItemView)
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtGui import QColor
+from src.pharmgest.config.settings import IMPORT_PREVIEW_MAX_ROWS
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.services.catalog_import import preview_import, import_price_list
+from src.pharmgest.ui.db_tasks import when_done, show_db_error
+
+class ImportCatalogDialog(QDialog):
+    """Importa listas de precios de proveedores: vista previa primero, luego aplica"""
+    progress_changed = pyqtSignal(int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Importar Lista de Precios (CSV)")
+        self.resize(900, 600)
+        self.file_path = None
+        self.progress_changed.connect(self.update_progress)
+
+        layout = QVBoxLayout(self)
+
+        # --- SELECCIÓN DE ARCHIVO ---
+        header = QHBoxLayout()
+        self.lbl_file = QLabel("Ningún archivo seleccionado")
+        btn_browse = QPushButton("📂 Elegir CSV...")
+        btn_browse.clicked.connect(self.choose_file)
+        header.addWidget(self.lbl_file)
+        header.addStretch()
+        header.addWidget(btn_browse)
+        layout.addLayout(header)
+
+        hint = QLabel("Columnas: sku, nombre, precio (obligatorias) · costo, precio_caja, "
+                      "precio_unidad, unidades_caja, fraccionable (opcionales)")
+        hint.setStyleSheet("color: gray; font-size: 11px;")
+        layout.addWidget(hint)
+
+        # --- RESUMEN DE LA SIMULACIÓN ---
+        self.lbl_summary = QLabel("")
+        self.lbl_summary.setStyleSheet("font-size: 14px; font-weight: bold; margin: 5px;")
+        layout.addWidget(self.lbl_summary)
+
+        # --- TABLA DE DIFERENCIAS ---
+        self.table = QTableWidget()
+        self.table.setColumnCount(4)
+        self.table.setHorizontalHeaderLabels(["SKU", "Producto", "Tipo", "Cambios"])
+        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.progress = QProgressBar()
+        self.progress.setValue(0)
+        layout.addWidget(self.progress)
+
+        # --- BOTONES ---
+        footer = QHBoxLayout()
+        footer.addStretch()
+        btn_cancel = QPushButton("Cancelar")
+        btn_cancel.clicked.connect(self.reject)
+        self.btn_apply = QPushButton("✅ Aplicar Importación")
+        self.btn_apply.setEnabled(False)
+        self.btn_apply.setStyleSheet("background-color: #28a745; color: white; font-weight: bold; padding: 6px;")
+        self.btn_apply.clicked.connect(self.apply_import)
+        footer.addWidget(btn_cancel)
+        footer.addWidget(self.btn_apply)
+        layout.addLayout(footer)
+
+    def update_progress(self, done, total):
+        self.progress.setMaximum(max(total, 1))
+        self.progress.setValue(done)
+
+    def choose_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Lista de precios", "", "CSV (*.csv *.txt)")
+        if not path:
+            return
+        self.file_path = path
+        self.lbl_file.setText(path)
+        self.run_preview()
+
+    def run_preview(self):
+        self.btn_apply.setEnabled(False)
+        self.table.setRowCount(0)
+        # El avance llega desde el hilo de la base de datos: se pasa por una señal
+        path = self.file_path
+        future = get_executor().read(lambda session: preview_import(path, self.progress_changed.emit))
+        when_done(future, self, self.show_preview, self.preview_failed)
+
+    def preview_failed(self, e):
+        if isinstance(e, ValueError):
+            QMessageBox.warning(self, "Archivo inválido", str(e))
+        else:
+            show_db_error(self, e, "Error al comparar con el catálogo actual.")
+
+    def show_preview(self, summary):
+        self.lbl_summary.setText(
+            f"🆕 Nuevos: {summary['nuevos']}   ✏️ Actualizados: {summary['actualizados']}   "
+            f"➖ Sin cambios: {summary['sin_cambios']}   ⚠️ Errores: {len(summary['errores'])}"
+        )
+
+        # Errores primero (limitados igual que las diferencias), luego los cambios
+        rows = [("", "", f"LÍNEA {line}", msg)
+                for line, msg in summary["errores"][:IMPORT_PREVIEW_MAX_ROWS]]
+        rows += summary["cambios"]
+        self.table.setRowCount(len(rows))
+        for r, (sku, name, kind, detail) in enumerate(rows):
+            items = [QTableWidgetItem(sku), QTableWidgetItem(name),
+                     QTableWidgetItem(kind), QTableWidgetItem(detail)]
+            if kind == "NUEVO":
+                items[2].setForeground(QColor("#28a745"))
+            elif kind.startswith("LÍNEA"):
+                for item in items:
+                    item.setBackground(QColor("#ffcccc"))
+                    item.setForeground(QColor("#000000"))
+            for c, item in enumerate(items):
+                self.table.setItem(r, c, item)
+
+        self.btn_apply.setEnabled(summary["nuevos"] + summary["actualizados"] > 0)
+
+    def apply_import(self):
+        confirm = QMessageBox.question(self, "Confirmar", "¿Aplicar la lista de precios al catálogo?",
+                                       QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirm != QMessageBox.StandardButton.Yes:
+            return
+
+        self.btn_apply.setEnabled(False)
+        path = self.file_path
+        future = get_executor().write(lambda session: import_price_list(path, self.progress_changed.emit))
+        when_done(future, self, self.import_done,
+                  error_message="La importación se detuvo. Los bloques anteriores ya quedaron guardados.")
+
+    def import_done(self, result):
+        QMessageBox.information(self, "Importación Completa",
+                                f"✅ {result['procesados']} productos importados.\n"
+                                f"⚠️ {len(result['errores'])} líneas con errores fueron omitidas.")
+        self.accept()
@@ -2,8 +2,9 @@ from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QLineEdit,
                            QPushButton, QMessageBox)
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFont
-from src.pharmgest.config.database import SessionLocal
+from src.pharmgest.database.executor import get_executor
 from src.pharmgest.database.models import User
+from src.pharmgest.ui.db_tasks import when_done
 
 class LoginDialog(QDialog):
     def __init__(self):
@@ -60,10 +61,11 @@ class LoginDialog(QDialog):
             QMessageBox.warning(self, "Error", "Ingresa usuario y contraseña")
             return
             
-        session = SessionLocal()
-        user = session.query(User).filter(User.username == username).first()
-        session.close()
-        
+        future = get_executor().read(lambda session: session.query(User).filter(User.username == username).first())
+        when_done(future, self, lambda user: self.login_checked(user, password),
+                  error_message="No se pudo verificar el usuario.")
+
+    def login_checked(self, user, password):
         if user and user.password_hash == password:
             # GUARDAMOS QUIÉN ES ANTES DE CERRAR
             self.current_user_role = user.role
@@ -1,10 +1,15 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QFormLayout, 
                            QLineEdit, QDoubleSpinBox, QSpinBox, 
-                           QDialogButtonBox, QMessageBox, QCheckBox, QGroupBox, QLabel)
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from src.pharmgest.config.database import SessionLocal, get_db_session
+                           QDialogButtonBox, QMessageBox, QCheckBox, QGroupBox, QLabel, QComboBox)
+from sqlalchemy.exc import IntegrityError
 from src.pharmgest.config.logging_config import logger
+from src.pharmgest.database.executor import get_executor
 from src.pharmgest.database.models import Product
+from src.pharmgest.services import stock_ledger
+from src.pharmgest.services.categories import category_names, category_by_name, invalidate_category_counts
+from src.pharmgest.services.product_search import get_search_index
+from src.pharmgest.services.inventory import InventoryService
+from src.pharmgest.ui.db_tasks import when_done, show_db_error
 
 class ProductDialog(QDialog):
     def __init__(self, parent=None, product_id=None):
@@ -24,6 +29,11 @@ class ProductDialog(QDialog):
         
         self.name_input = QLineEdit()
         self.name_input.setPlaceholderText("Nombre comercial")
+
+        # Se puede elegir una existente o escribir una nueva (se crea al guardar)
+        self.category_input = QComboBox()
+        self.category_input.setEditable(True)
+        self.category_input.lineEdit().setPlaceholderText("Sin categoría")
         
         # Precio Venta
         self.price_input = QDoubleSpinBox()
@@ -44,6 +54,7 @@ class ProductDialog(QDialog):
         
         form_basic.addRow("SKU / Código:", self.sku_input)
         form_basic.addRow("Nombre:", self.name_input)
+        form_basic.addRow("Categoría:", self.category_input)
         form_basic.addRow("Precio Venta (Público):", self.price_input)
         form_basic.addRow("Costo Compra (Interno):", self.cost_input)
         form_basic.addRow(self.lbl_stock, self.stock_input)
@@ -86,13 +97,26 @@ class ProductDialog(QDialog):
             QDialogButtonBox.StandardButton.Save | 
             QDialogButtonBox.StandardButton.Cancel
         )
+        self.btn_save = buttons.button(QDialogButtonBox.StandardButton.Save)
         buttons.accepted.connect(self.save_product)
         buttons.rejected.connect(self.reject)
         layout.addWidget(buttons)
 
+        self.load_categories()
         if self.product_id:
             self.load_product_data()
 
+    def load_categories(self):
+        future = get_executor().read(category_names)
+        when_done(future, self, self.show_categories, error_message="Error al cargar las categorías.")
+
+    def show_categories(self, names):
+        # El producto puede haber llegado antes: conservar lo que ya muestra
+        current = self.category_input.currentText()
+        self.category_input.clear()
+        self.category_input.addItems(names)
+        self.category_input.setCurrentText(current)
+
     def toggle_fraction_fields(self, checked):
         self.spin_units_box.setEnabled(checked)
         self.spin_box_price.setEnabled(checked)
@@ -108,41 +132,46 @@ class ProductDialog(QDialog):
             self.stock_input.setSuffix(" Unidades Globales")
 
     def load_product_data(self):
-        try:
-            with get_db_session() as session:
-                product = session.get(Product, self.product_id)
-                if product:
-                    self.sku_input.setText(product.sku)
-                    self.name_input.setText(product.name)
-                    self.price_input.setValue(product.price)
-                    self.cost_input.setValue(product.cost if product.cost else 0.0)
-                    self.stock_input.setValue(product.total_stock)
-                    
-                    # Al cargar, activamos/desactivamos y cambiamos el texto
-                    self.chk_fractionable.setChecked(product.is_fractionable)
-                    self.toggle_fraction_fields(product.is_fractionable)
-                    
-                    self.spin_units_box.setValue(product.units_per_box)
-                    self.spin_box_price.setValue(product.box_price)
-                    self.spin_unit_price.setValue(product.unit_price)
-                    
-                    self.setWindowTitle(f"Editar: {product.name}")
-                else:
-                    QMessageBox.warning(self, "Error", "Producto no encontrado")
-                    self.reject()
-        except SQLAlchemyError as e:
-            logger.error(f"Error al cargar producto: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error de Base de Datos", "Error al cargar los datos del producto.")
-            self.reject()
-        except Exception as e:
-            logger.error(f"Error inesperado al cargar producto: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error", f"Error inesperado: {str(e)}")
+        def load(session):
+            product = session.get(Product, self.product_id)
+            category = product.category.name if product is not None and product.category else ""
+            return product, category
+
+        future = get_executor().read(load)
+        when_done(future, self, lambda result: self.show_product(*result), self.load_failed)
+
+    def show_product(self, product, category=""):
+        if product:
+            self.sku_input.setText(product.sku)
+            self.name_input.setText(product.name)
+            self.category_input.setCurrentText(category)
+            self.price_input.setValue(product.price)
+            self.cost_input.setValue(product.cost if product.cost else 0.0)
+            self.stock_input.setValue(product.total_stock)
+
+            # Al cargar, activamos/desactivamos y cambiamos el texto
+            self.chk_fractionable.setChecked(product.is_fractionable)
+            self.toggle_fraction_fields(product.is_fractionable)
+
+            self.spin_units_box.setValue(product.units_per_box)
+            self.spin_box_price.setValue(product.box_price)
+            self.spin_unit_price.setValue(product.unit_price)
+
+            self.setWindowTitle(f"Editar: {product.name}")
+        else:
+            QMessageBox.warning(self, "Error", "Producto no encontrado")
             self.reject()
 
+    def load_failed(self, e):
+        show_db_error(self, e, "Error al cargar los datos del producto.")
+        self.reject()
+
     def save_product(self):
-        # ... (El método save_product queda IGUAL que antes) ...
+        if not self.btn_save.isEnabled():
+            return  # El guardado anterior todavía no terminó
         sku = self.sku_input.text()
         name = self.name_input.text()
+        category = self.category_input.currentText().strip()
         price = self.price_input.value()
         cost = self.cost_input.value()
         stock = self.stock_input.value()
@@ -156,47 +185,63 @@ class ProductDialog(QDialog):
             QMessageBox.warning(self, "Error", "El SKU y Nombre son obligatorios")
             return
 
-        try:
-            with get_db_session() as session:
-                if self.product_id:
-                    product = session.get(Product, self.product_id)
-                    if product is None:
-                        QMessageBox.warning(self, "Error", "Producto no encontrado")
-                        return
-                    
-                    product.sku = sku
-                    product.name = name
-                    product.price = price
-                    product.cost = cost
-                    product.total_stock = stock
-                    
-                    product.is_fractionable = is_frac
-                    product.units_per_box = units_box
-                    product.box_price = box_price
-                    product.unit_price = unit_price
-                    
-                    if is_frac and units_box > 0:
-                        product.stock = stock // units_box
-                    else:
-                        product.stock = stock
+        def save(session):
+            category_id = category_by_name(session, category).id if category else None
+            if self.product_id:
+                product = session.get(Product, self.product_id)
+                if product is None:
+                    return None
+
+                product.sku = sku
+                product.name = name
+                product.category_id = category_id
+                product.price = price
+                product.cost = cost
+                InventoryService(session).set_stock(product, stock)
+
+                product.is_fractionable = is_frac
+                product.units_per_box = units_box
+                product.box_price = box_price
+                product.unit_price = unit_price
+
+                if is_frac and units_box > 0:
+                    product.stock = stock // units_box
                 else:
-                    new_product = Product(
-                        sku=sku, name=name, price=price, cost=cost,
-                        total_stock=stock,
-                        is_fractionable=is_frac, units_per_box=units_box,
-                        box_price=box_price, unit_price=unit_price,
-                        stock=stock if not is_frac else stock // units_box
-                    )
-                    session.add(new_product)
-                # El commit se hace automáticamente al salir del context manager
-            self.accept()
-        except IntegrityError as e:
-            logger.error(f"Error de integridad al guardar producto: {e}", exc_info=True)
+                    product.stock = stock
+                return product.id
+            else:
+                new_product = Product(
+                    sku=sku, name=name, category_id=category_id, price=price, cost=cost,
+                    total_stock=0,
+                    is_fractionable=is_frac, units_per_box=units_box,
+                    box_price=box_price, unit_price=unit_price,
+                    stock=stock if not is_frac else stock // units_box
+                )
+                session.add(new_product)
+                InventoryService(session).set_stock(new_product, stock, stock_ledger.NEW_PRODUCT)
+                session.flush()
+                return new_product.id
+
+        # Un segundo clic antes de la respuesta crearía el producto dos veces
+        self.btn_save.setEnabled(False)
+        future = get_executor().write(save)
+        when_done(future, self, self.product_saved, self.save_failed)
+
+    def product_saved(self, product_id):
+        self.btn_save.setEnabled(True)
+        if product_id is None:
+            QMessageBox.warning(self, "Error", "Producto no encontrado")
+            return
+        # Ya confirmado: el buscador del POS lo encuentra con el nombre nuevo
+        get_search_index().update_product(product_id, self.name_input.text(), self.sku_input.text())
+        invalidate_category_counts()
+        self.accept()
+
+    def save_failed(self, e):
+        self.btn_save.setEnabled(True)
+        if isinstance(e, IntegrityError):
+            logger.error(f"Error de integridad al guardar producto: {e}", exc_info=e)
             QMessageBox.critical(self, "Error", 
                                "El SKU ya existe. Por favor, use un código único.")
-        except SQLAlchemyError as e:
-            logger.error(f"Error de BD al guardar producto: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error de Base de Datos", "Error al guardar el producto.")
-        except Exception as e:
-            logger.error(f"Error inesperado al guardar producto: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error", f"Error inesperado: {str(e)}")
\ No newline at end of file
+        else:
+            show_db_error(self, e, "Error al guardar el producto.")
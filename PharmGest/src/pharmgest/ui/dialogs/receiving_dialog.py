@@ -0,0 +1,208 @@
+from datetime import datetime
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget,
+                           QTableWidgetItem, QLabel, QPushButton, QHeaderView,
+                           QDateEdit, QLineEdit, QSpinBox, QMessageBox, QGroupBox,
+                           QFileDialog, QAbstractItemView)
+from PyQt6.QtCore import Qt, QDate
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.services.inventory import (InventoryService, find_products_by_sku,
+                                              read_delivery_csv, units_for)
+from src.pharmgest.ui.db_tasks import when_done, show_db_error
+
+def fetch_products(session, skus):
+    """{sku: datos mínimos del producto} para la caché del diálogo. Corre en el hilo de lectura."""
+    return {sku: {"id": p.id, "name": p.name,
+                  "is_fractionable": p.is_fractionable, "units_per_box": p.units_per_box}
+            for sku, p in find_products_by_sku(session, skus).items()}
+
+
+class ReceivingDialog(QDialog):
+    """Recepción de mercancía: una nota de entrega completa en una sola transacción"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Recepción de Mercancía")
+        self.resize(950, 600)
+
+        # Líneas pendientes: dicts con sku, product_id, name, batch_code, expiry_date, qty, units
+        self.lines = []
+        # Caché de productos ya buscados durante esta recepción (sku -> datos)
+        self.products = {}
+
+        layout = QVBoxLayout(self)
+
+        # --- LOTE ACTUAL + ESCÁNER ---
+        group_box = QGroupBox("📷 Escanear Productos")
+        group_box.setStyleSheet("QGroupBox { font-weight: bold; margin-top: 10px; }")
+        form_layout = QHBoxLayout(group_box)
+
+        self.input_code = QLineEdit()
+        self.input_code.setPlaceholderText("Lote (Ej: L-2025-X)")
+
+        self.input_date = QDateEdit()
+        self.input_date.setCalendarPopup(True)
+        self.input_date.setDate(QDate.currentDate().addDays(365))
+
+        self.input_qty = QSpinBox()
+        self.input_qty.setRange(1, 10000)
+
+        self.input_scan = QLineEdit()
+        self.input_scan.setPlaceholderText("Escanea o escribe el SKU y presiona Enter...")
+        self.input_scan.returnPressed.connect(self.scan_product)
+
+        form_layout.addWidget(QLabel("Lote:"))
+        form_layout.addWidget(self.input_code)
+        form_layout.addWidget(QLabel("Vence:"))
+        form_layout.addWidget(self.input_date)
+        form_layout.addWidget(QLabel("Cant:"))
+        form_layout.addWidget(self.input_qty)
+        form_layout.addWidget(self.input_scan, 2)
+        layout.addWidget(group_box)
+
+        btn_csv = QPushButton("📂 Cargar Nota de Entrega (CSV)")
+        btn_csv.setToolTip("Columnas: sku, lote, vence, cantidad")
+        btn_csv.clicked.connect(self.load_csv)
+        layout.addWidget(btn_csv, alignment=Qt.AlignmentFlag.AlignLeft)
+
+        # --- TABLA DE LÍNEAS ---
+        self.table = QTableWidget()
+        self.table.setColumnCount(7)
+        self.table.setHorizontalHeaderLabels(["SKU", "Producto", "Lote", "Vence", "Cant.", "Unid. Reales", "X"])
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        # --- PIE ---
+        footer = QHBoxLayout()
+        self.lbl_summary = QLabel("0 líneas")
+        self.lbl_summary.setStyleSheet("font-size: 14px; font-weight: bold;")
+        self.btn_save = QPushButton("✅ Registrar Entrada")
+        self.btn_save.setStyleSheet("background-color: #28a745; color: white; font-weight: bold; padding: 8px 15px;")
+        self.btn_save.clicked.connect(self.save_delivery)
+        footer.addWidget(self.lbl_summary)
+        footer.addStretch()
+        footer.addWidget(self.btn_save)
+        layout.addLayout(footer)
+
+        self.input_scan.setFocus()
+
+    def lookup_products(self, skus, then, error_message):
+        """Busca en la BD solo los SKUs que aún no están en la caché local y luego llama a then()"""
+        missing = [sku for sku in set(skus) if sku not in self.products]
+        if not missing:
+            then()
+            return
+        future = get_executor().read(fetch_products, missing)
+        when_done(future, self, lambda found: self.products_found(found, then), error_message=error_message)
+
+    def products_found(self, found, then):
+        self.products.update(found)
+        then()
+
+    def add_line(self, sku, batch_code, expiry_date, qty):
+        product = self.products[sku]
+        for line in self.lines:
+            if line["sku"] == sku and line["batch_code"] == batch_code and line["expiry_date"] == expiry_date:
+                line["qty"] += qty
+                break
+        else:
+            line = {"sku": sku, "product_id": product["id"], "name": product["name"],
+                    "batch_code": batch_code, "expiry_date": expiry_date, "qty": qty}
+            self.lines.append(line)
+        line["units"] = units_for(product["is_fractionable"], product["units_per_box"], line["qty"])
+
+    def scan_product(self):
+        sku = self.input_scan.text().strip()
+        code = self.input_code.text().strip()
+        if not sku:
+            return
+        if not code:
+            QMessageBox.warning(self, "Error", "Escribe primero el código de lote.")
+            self.input_code.setFocus()
+            return
+
+        expiry = self.input_date.date().toPyDate()
+        expiry_dt = datetime(expiry.year, expiry.month, expiry.day)
+        qty = self.input_qty.value()
+        self.lookup_products([sku], lambda: self.add_scanned(sku, code, expiry_dt, qty),
+                             "No se pudo buscar el producto.")
+        self.input_scan.clear()
+        self.input_scan.setFocus()
+
+    def add_scanned(self, sku, code, expiry_dt, qty):
+        if sku not in self.products:
+            QMessageBox.warning(self, "No encontrado", f"No existe un producto con SKU {sku}")
+        else:
+            self.add_line(sku, code, expiry_dt, qty)
+            self.refresh_table()
+
+    def load_csv(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Nota de entrega", "", "CSV (*.csv *.txt)")
+        if not path:
+            return
+        try:
+            rows, errors = read_delivery_csv(path)
+        except ValueError as e:
+            QMessageBox.warning(self, "Archivo inválido", str(e))
+            return
+        self.lookup_products((row["sku"] for row in rows), lambda: self.add_csv_rows(rows, errors),
+                             "No se pudieron buscar los productos.")
+
+    def add_csv_rows(self, rows, errors):
+        for row in rows:
+            if row["sku"] in self.products:
+                self.add_line(row["sku"], row["batch_code"], row["expiry_date"], row["qty"])
+            else:
+                errors.append((None, f"SKU desconocido: {row['sku']}"))
+        self.refresh_table()
+
+        if errors:
+            detail = "\n".join(f"Línea {n}: {msg}" if n else msg for n, msg in errors[:20])
+            QMessageBox.warning(self, "Líneas omitidas", f"{len(errors)} líneas no se cargaron:\n\n{detail}")
+
+    def remove_line(self, index):
+        self.lines.pop(index)
+        self.refresh_table()
+
+    def refresh_table(self):
+        self.table.setRowCount(len(self.lines))
+        total_units = 0
+        for row, line in enumerate(self.lines):
+            self.table.setItem(row, 0, QTableWidgetItem(line["sku"]))
+            self.table.setItem(row, 1, QTableWidgetItem(line["name"]))
+            self.table.setItem(row, 2, QTableWidgetItem(line["batch_code"]))
+            self.table.setItem(row, 3, QTableWidgetItem(line["expiry_date"].strftime("%d/%m/%Y")))
+            self.table.setItem(row, 4, QTableWidgetItem(str(line["qty"])))
+            self.table.setItem(row, 5, QTableWidgetItem(str(line["units"])))
+
+            btn_rem = QPushButton("❌")
+            btn_rem.setStyleSheet("color: red; font-weight: bold;")
+            btn_rem.clicked.connect(lambda _, r=row: self.remove_line(r))
+            self.table.setCellWidget(row, 6, btn_rem)
+            total_units += line["units"]
+        self.lbl_summary.setText(f"{len(self.lines)} líneas | {total_units} unidades")
+
+    def save_delivery(self):
+        if not self.btn_save.isEnabled():
+            return  # La entrega anterior todavía se está guardando
+        if not self.lines:
+            QMessageBox.warning(self, "Vacío", "No hay líneas para registrar.")
+            return
+
+        rows = [{"product_id": line["product_id"], "batch_code": line["batch_code"],
+                 "stock": line["units"], "expiry_date": line["expiry_date"]}
+                for line in self.lines]
+        # Hasta la respuesta no se puede volver a enviar: serían lotes y stock duplicados
+        self.btn_save.setEnabled(False)
+        future = get_executor().write(lambda session: InventoryService(session).receive(rows))
+        when_done(future, self, self.delivery_saved, self.delivery_failed)
+
+    def delivery_saved(self, count):
+        logger.info(f"Entrega registrada: {count} lotes")
+        QMessageBox.information(self, "Entrada Registrada", f"✅ {count} lotes registrados.")
+        self.accept()
+
+    def delivery_failed(self, e):
+        self.btn_save.setEnabled(True)
+        show_db_error(self, e, "No se registró la entrega. Ningún lote fue guardado.")
@@ -0,0 +1,122 @@
+import time
+from datetime import datetime
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+                           QLabel, QPushButton, QHeaderView, QSpinBox, QFileDialog, QMessageBox,
+                           QAbstractItemView)
+from PyQt6.QtGui import QColor
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.config.settings import (REORDER_VENTANA_DIAS, REORDER_DIAS_ENTREGA, REORDER_DIAS_COBERTURA,
+                                           COLOR_STOCK_CRITICO, COLOR_STOCK_BAJO, COLOR_TEXT)
+from src.pharmgest.services.reorder import purchase_list, export_purchase_list
+from src.pharmgest.ui.db_tasks import when_done
+
+HEADERS = ["SKU", "Producto", "Stock", "Venta/día", "Días de cobertura", "Punto de pedido",
+           "Sugerido (unid.)", "Sugerido (cajas)", "Costo est."]
+
+class ReorderDialog(QDialog):
+    """Lista de compra sugerida según la velocidad de venta de cada producto"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Sugerencia de Compra")
+        self.resize(1000, 600)
+        self.items = []
+
+        layout = QVBoxLayout(self)
+
+        # --- PARÁMETROS ---
+        params = QHBoxLayout()
+        self.spin_window = self.add_spin(params, "Historial (días):", REORDER_VENTANA_DIAS, 7, 365)
+        self.spin_lead = self.add_spin(params, "Entrega proveedor (días):", REORDER_DIAS_ENTREGA, 0, 90)
+        self.spin_cover = self.add_spin(params, "Cubrir (días):", REORDER_DIAS_COBERTURA, 1, 180)
+        btn_calc = QPushButton("🔄 Calcular")
+        btn_calc.clicked.connect(self.calculate)
+        params.addWidget(btn_calc)
+        params.addStretch()
+        layout.addLayout(params)
+
+        self.lbl_summary = QLabel("")
+        self.lbl_summary.setStyleSheet("font-size: 14px; font-weight: bold; margin: 5px;")
+        layout.addWidget(self.lbl_summary)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(HEADERS))
+        self.table.setHorizontalHeaderLabels(HEADERS)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        footer = QHBoxLayout()
+        footer.addStretch()
+        self.btn_export = QPushButton("💾 Exportar CSV")
+        self.btn_export.setEnabled(False)
+        self.btn_export.clicked.connect(self.export_csv)
+        btn_close = QPushButton("Cerrar")
+        btn_close.clicked.connect(self.accept)
+        footer.addWidget(self.btn_export)
+        footer.addWidget(btn_close)
+        layout.addLayout(footer)
+
+        self.calculate()
+
+    def add_spin(self, layout, label, value, minimum, maximum):
+        spin = QSpinBox()
+        spin.setRange(minimum, maximum)
+        spin.setValue(value)
+        layout.addWidget(QLabel(label))
+        layout.addWidget(spin)
+        return spin
+
+    def calculate(self):
+        params = {"days": self.spin_window.value(), "lead_days": self.spin_lead.value(),
+                  "cover_days": self.spin_cover.value()}
+
+        def run(session):
+            start = time.perf_counter()
+            items = purchase_list(session, **params)
+            return items, (time.perf_counter() - start) * 1000
+
+        self.btn_export.setEnabled(False)
+        future = get_executor().read(run)
+        when_done(future, self, lambda result: self.show_items(*result, params["lead_days"]),
+                  error_message="No se pudo calcular la sugerencia de compra.")
+
+    def show_items(self, items, elapsed_ms, lead_days):
+        self.items = items
+        self.table.setRowCount(len(self.items))
+        for row, item in enumerate(self.items):
+            values = [item["sku"], item["nombre"], str(item["stock"]), f"{item['velocidad_diaria']:,.2f}",
+                      f"{item['dias_cobertura']:,.1f}", str(item["punto_pedido"]),
+                      str(item["sugerido_unidades"]), str(item["sugerido_cajas"]),
+                      f"${item['costo_estimado']:,.2f}"]
+            # Se agota antes de que llegue el pedido = crítico
+            if item["dias_cobertura"] <= lead_days:
+                color = QColor(COLOR_STOCK_CRITICO)
+            elif item["dias_cobertura"] <= lead_days * 2:
+                color = QColor(COLOR_STOCK_BAJO)
+            else:
+                color = None
+            for col, value in enumerate(values):
+                cell = QTableWidgetItem(value)
+                if color:
+                    cell.setBackground(color)
+                    cell.setForeground(QColor(COLOR_TEXT))
+                self.table.setItem(row, col, cell)
+
+        total_cost = sum(item["costo_estimado"] for item in self.items)
+        self.lbl_summary.setText(f"{len(self.items)} productos a pedir · Costo estimado: ${total_cost:,.2f} "
+                                 f"· calculado en {elapsed_ms:.0f} ms")
+        self.btn_export.setEnabled(bool(self.items))
+
+    def export_csv(self):
+        default_name = f"pedido_sugerido_{datetime.now():%Y%m%d}.csv"
+        path, _ = QFileDialog.getSaveFileName(self, "Guardar lista de compra", default_name, "CSV (*.csv)")
+        if not path:
+            return
+        try:
+            export_purchase_list(self.items, path)
+            QMessageBox.information(self, "Exportado", f"Lista de compra guardada en:\n{path}")
+        except OSError as e:
+            logger.error(f"Error al exportar lista de compra: {e}", exc_info=True)
+            QMessageBox.critical(self, "Error", f"No se pudo guardar el archivo.\n{e}")
@@ -0,0 +1,158 @@
+import os
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+                           QLabel, QPushButton, QHeaderView, QMessageBox, QInputDialog)
+from sqlalchemy import select
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.database.models import Product, SaleVoid, all_sales, all_sale_details
+from src.pharmgest.services.invoice import get_invoice_file
+from src.pharmgest.services.sales import SalesService
+from src.pharmgest.services.receipt import reprint_receipt
+from src.pharmgest.ui.db_tasks import when_done
+
+def load_sale_detail(session, sale_id):
+    """(cabecera, líneas) de la venta, o None si no existe. Corre en el hilo de lectura."""
+    # Las vistas unificadas también encuentran ventas ya archivadas
+    sale = session.execute(
+        select(all_sales.c.total, all_sales.c.ncf, SaleVoid.reason.label("void_reason"))
+        .outerjoin(SaleVoid, SaleVoid.sale_id == all_sales.c.id)
+        .where(all_sales.c.id == sale_id)
+    ).first()
+    if sale is None:
+        return None
+    details = session.execute(
+        select(all_sale_details.c.quantity, all_sale_details.c.unit_price,
+               all_sale_details.c.subtotal, Product.name)
+        .select_from(all_sale_details)
+        .outerjoin(Product, Product.id == all_sale_details.c.product_id)
+        .where(all_sale_details.c.sale_id == sale_id)
+        .order_by(all_sale_details.c.id)
+    ).all()
+    return sale, details
+
+
+def open_sale_detail(owner, sale_id, user_name=None, on_voided=None):
+    """
+    Carga la venta en segundo plano y abre el detalle cuando llega.
+    Con `user_name` el detalle permite anular la venta; `on_voided` se
+    llama después de anularla (p.ej. para recargar la lista).
+    """
+    def show(data):
+        if data is None:
+            QMessageBox.warning(owner, "Error", "Venta no encontrada.")
+            return
+        SaleDetailDialog(sale_id, *data, user_name=user_name, on_voided=on_voided, parent=owner).exec()
+
+    future = get_executor().read(load_sale_detail, sale_id)
+    when_done(future, owner, show, error_message="Ocurrió un error al cargar el detalle de la venta.")
+
+
+class SaleDetailDialog(QDialog):
+    """
+    Detalle completo de una venta (activa o archivada): líneas, total y
+    botones para abrir la factura PDF, reimprimir el ticket o anular la venta.
+    Lo usan el historial de ventas y el buscador de ventas (open_sale_detail).
+    """
+    def __init__(self, sale_id, sale, details, user_name=None, on_voided=None, parent=None):
+        super().__init__(parent)
+        self.sale_id = sale_id
+        self.user_name = user_name
+        self.on_voided = on_voided
+        self.setWindowTitle(f"Detalle Factura #{sale_id}")
+        self.resize(500, 400)
+
+        d_layout = QVBoxLayout(self)
+
+        det_table = QTableWidget()
+        det_table.setColumnCount(4)
+        det_table.setHorizontalHeaderLabels(["Cant.", "Producto", "P. Unit", "Subtotal"])
+        det_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+
+        det_table.setRowCount(len(details))
+        for r, det in enumerate(details):
+            det_table.setItem(r, 0, QTableWidgetItem(str(det.quantity)))
+            prod_name = det.name if det.name is not None else "Producto Eliminado"
+            det_table.setItem(r, 1, QTableWidgetItem(prod_name))
+            det_table.setItem(r, 2, QTableWidgetItem(f"${det.unit_price:,.2f}"))
+            det_table.setItem(r, 3, QTableWidgetItem(f"${det.subtotal:,.2f}"))
+
+        d_layout.addWidget(det_table)
+        if sale.ncf:
+            d_layout.addWidget(QLabel(f"NCF: {sale.ncf}"))
+        d_layout.addWidget(QLabel(f"<b>TOTAL FACTURA: ${sale.total:,.2f}</b>"))
+        if sale.void_reason is not None:
+            lbl_void = QLabel(f"ANULADA: {sale.void_reason}")
+            lbl_void.setStyleSheet("color: red; font-weight: bold;")
+            d_layout.addWidget(lbl_void)
+
+        buttons = QHBoxLayout()
+        btn_pdf = QPushButton("🧾 Ver Factura PDF")
+        btn_pdf.clicked.connect(self.open_invoice)
+        buttons.addWidget(btn_pdf)
+
+        btn_ticket = QPushButton("🖨️ Reimprimir Ticket")
+        btn_ticket.clicked.connect(self.reprint_ticket)
+        buttons.addWidget(btn_ticket)
+
+        if user_name is not None and sale.void_reason is None:
+            self.btn_void = QPushButton("🚫 Anular Venta")
+            self.btn_void.clicked.connect(self.void_sale)
+            buttons.addWidget(self.btn_void)
+        d_layout.addLayout(buttons)
+
+    def open_invoice(self):
+        """Abre la factura guardada (suelta o dentro del zip del mes) o la genera desde la BD"""
+        future = get_executor().read(lambda session: get_invoice_file(self.sale_id))
+        when_done(future, self, self.show_invoice, self.invoice_failed)
+
+    def show_invoice(self, pdf_path):
+        if pdf_path is None:
+            QMessageBox.warning(self, "Error", "Venta no encontrada.")
+            return
+        os.startfile(os.path.abspath(pdf_path))
+
+    def invoice_failed(self, e):
+        logger.error(f"Error al abrir factura {self.sale_id}: {e}", exc_info=e)
+        QMessageBox.warning(self, "Aviso", f"No se pudo abrir la factura.\nError: {e}")
+
+    def void_sale(self):
+        """Anula la venta (con motivo): sale de los totales y del reporte Z y devuelve el stock"""
+        reason, ok = QInputDialog.getText(self, "Anular Venta",
+                                          f"Motivo de la anulación de la venta #{self.sale_id}:")
+        if not ok or not reason.strip():
+            return
+        self.btn_void.setEnabled(False)
+        future = get_executor().write(
+            lambda session: SalesService(session).void_sale(self.sale_id, reason, self.user_name))
+        when_done(future, self, self.sale_voided, self.void_failed)
+
+    def sale_voided(self, sale):
+        QMessageBox.information(self, "Venta Anulada", f"La venta #{self.sale_id} quedó anulada.")
+        if self.on_voided:
+            self.on_voided()
+        self.accept()
+
+    def void_failed(self, e):
+        self.btn_void.setEnabled(True)
+        if isinstance(e, (LookupError, ValueError)):
+            QMessageBox.warning(self, "Aviso", str(e))
+        else:
+            logger.error(f"Error al anular la venta {self.sale_id}: {e}", exc_info=e)
+            QMessageBox.critical(self, "Error", f"No se pudo anular la venta.\nError: {e}")
+
+    def reprint_ticket(self):
+        """Reenvía el ticket ESC/POS de la venta a la impresora configurada"""
+        future = get_executor().read(lambda session: reprint_receipt(self.sale_id))
+        when_done(future, self, self.ticket_sent, self.ticket_failed)
+
+    def ticket_sent(self, destination):
+        if destination is None:
+            QMessageBox.information(self, "Ticket", "Los tickets están desactivados o la venta no existe.")
+
+    def ticket_failed(self, e):
+        if isinstance(e, OSError):
+            logger.warning(f"No se pudo reimprimir el ticket {self.sale_id}: {e}")
+            QMessageBox.warning(self, "Impresora", f"No se pudo imprimir el ticket.\nError: {e}")
+        else:
+            logger.error(f"Error al leer la venta {self.sale_id} para el ticket: {e}", exc_info=e)
+            QMessageBox.critical(self, "Error", "No se pudo leer la venta.")
@@ -0,0 +1,121 @@
+import time
+from datetime import date
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+                           QLabel, QPushButton, QHeaderView, QDateEdit, QFileDialog, QMessageBox,
+                           QAbstractItemView)
+from PyQt6.QtCore import QDate
+from PyQt6.QtGui import QColor
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import COLOR_STOCK_CRITICO, COLOR_TEXT
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.services.valuation import inventory_valuation, summarize, export_valuation
+from src.pharmgest.ui.db_tasks import when_done, show_db_error
+
+HEADERS = ["Categoría", "Vencimiento", "Unidades", "Valor a costo", "Valor a venta"]
+
+class ValuationDialog(QDialog):
+    """Valor del inventario a costo y a precio de venta, por categoría y tramo de vencimiento"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Valoración de Inventario")
+        self.resize(900, 600)
+        self.rows = []
+
+        layout = QVBoxLayout(self)
+
+        # --- PARÁMETROS ---
+        params = QHBoxLayout()
+        params.addWidget(QLabel("Día:"))
+        self.date_edit = QDateEdit(QDate.currentDate())
+        self.date_edit.setCalendarPopup(True)
+        self.date_edit.setDisplayFormat("dd/MM/yyyy")
+        self.date_edit.setMaximumDate(QDate.currentDate())
+        params.addWidget(self.date_edit)
+        btn_calc = QPushButton("🔄 Calcular")
+        btn_calc.clicked.connect(self.calculate)
+        params.addWidget(btn_calc)
+        params.addWidget(QLabel("Hoy se calcula en vivo; los días anteriores son los guardados al cierre."))
+        params.addStretch()
+        layout.addLayout(params)
+
+        self.lbl_summary = QLabel("")
+        self.lbl_summary.setStyleSheet("font-size: 14px; font-weight: bold; margin: 5px;")
+        layout.addWidget(self.lbl_summary)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(HEADERS))
+        self.table.setHorizontalHeaderLabels(HEADERS)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        footer = QHBoxLayout()
+        footer.addStretch()
+        self.btn_export = QPushButton("💾 Exportar CSV")
+        self.btn_export.setEnabled(False)
+        self.btn_export.clicked.connect(self.export_csv)
+        btn_close = QPushButton("Cerrar")
+        btn_close.clicked.connect(self.accept)
+        footer.addWidget(self.btn_export)
+        footer.addWidget(btn_close)
+        layout.addLayout(footer)
+
+        self.calculate()
+
+    def calculate(self):
+        day = self.date_edit.date().toPyDate()
+
+        def run(session):
+            start = time.perf_counter()
+            rows = inventory_valuation(session, day)
+            return rows, (time.perf_counter() - start) * 1000
+
+        def failed(error):
+            # Día sin valoración guardada: no es un error de la BD
+            if isinstance(error, LookupError):
+                self.show_rows([], 0, day, str(error))
+            else:
+                show_db_error(self, error, "No se pudo calcular la valoración del inventario.")
+
+        self.btn_export.setEnabled(False)
+        future = get_executor().read(run)
+        when_done(future, self, lambda result: self.show_rows(*result, day), on_error=failed)
+
+    def show_rows(self, rows, elapsed_ms, day, message=None):
+        self.rows = rows
+        self.table.setRowCount(len(rows))
+        for row, item in enumerate(rows):
+            values = [item["categoria"], item["tramo"], f"{item['unidades']:,}",
+                      f"${item['costo']:,.2f}", f"${item['venta']:,.2f}"]
+            # Tramo 0 = lotes vencidos
+            expired = item["tramo_indice"] == 0
+            for col, value in enumerate(values):
+                cell = QTableWidgetItem(value)
+                if expired:
+                    cell.setBackground(QColor(COLOR_STOCK_CRITICO))
+                    cell.setForeground(QColor(COLOR_TEXT))
+                self.table.setItem(row, col, cell)
+
+        if message:
+            self.lbl_summary.setText(message)
+        else:
+            totals = summarize(rows)
+            origin = "en vivo" if day >= date.today() else "guardada al cierre"
+            self.lbl_summary.setText(f"{totals['unidades']:,} unidades · Costo: ${totals['costo']:,.2f} "
+                                     f"· Venta: ${totals['venta']:,.2f} · Margen: ${totals['margen']:,.2f} "
+                                     f"· {origin}, {elapsed_ms:.0f} ms")
+        self.btn_export.setEnabled(bool(rows))
+
+    def export_csv(self):
+        day = self.date_edit.date().toPyDate()
+        default_name = f"valoracion_inventario_{day:%Y%m%d}.csv"
+        path, _ = QFileDialog.getSaveFileName(self, "Guardar valoración", default_name, "CSV (*.csv)")
+        if not path:
+            return
+        try:
+            export_valuation(self.rows, path)
+            QMessageBox.information(self, "Exportado", f"Valoración guardada en:\n{path}")
+        except OSError as e:
+            logger.error(f"Error al exportar valoración: {e}", exc_info=True)
+            QMessageBox.critical(self, "Error", f"No se pudo guardar el archivo.\n{e}")
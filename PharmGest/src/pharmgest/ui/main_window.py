@@ -1,15 +1,27 @@
+import os
 from PyQt6.QtWidgets import (QMainWindow, QTabWidget, QWidget, QVBoxLayout, QHBoxLayout, 
                            QTableWidget, QTableWidgetItem, QPushButton, QHeaderView, 
                            QLabel, QMessageBox)
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QColor
-from src.pharmgest.config.database import SessionLocal, get_db_session
+from src.pharmgest.config.logging_config import logger
 from src.pharmgest.config.settings import STOCK_CRITICO, STOCK_BAJO, COLOR_STOCK_CRITICO, COLOR_STOCK_BAJO, COLOR_TEXT
-from src.pharmgest.database.models import Product
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.services.categories import invalidate_category_counts
+from src.pharmgest.services.inventory import InventoryService
+from src.pharmgest.services.product_search import get_search_index
+from src.pharmgest.services.profiling import start_profiling, stop_profiling, is_profiling
+from src.pharmgest.ui.db_tasks import when_done
+from src.pharmgest.ui.maintenance_scheduler import MaintenanceScheduler
 from src.pharmgest.ui.pos_widget import POSWidget
 from src.pharmgest.ui.sales_history import SalesHistoryWidget
+from src.pharmgest.ui.sale_search import SaleSearchWidget
 from src.pharmgest.ui.dialogs.product_dialog import ProductDialog
 from src.pharmgest.ui.dialogs.batch_dialog import BatchDialog
+from src.pharmgest.ui.dialogs.import_dialog import ImportCatalogDialog
+from src.pharmgest.ui.dialogs.receiving_dialog import ReceivingDialog
+from src.pharmgest.ui.dialogs.reorder_dialog import ReorderDialog
+from src.pharmgest.ui.dialogs.valuation_dialog import ValuationDialog
 
 # --- WIDGET DE INVENTARIO MEJORADO ---
 class InventoryWidget(QWidget):
@@ -38,6 +50,30 @@ class InventoryWidget(QWidget):
             btn_add.setStyleSheet("background-color: #28a745; color: white; font-weight: bold; padding: 6px;")
             btn_add.clicked.connect(lambda: self.open_product_dialog())
             header.addWidget(btn_add)
+
+            btn_import = QPushButton("📥 Importar Lista de Precios")
+            btn_import.setToolTip("Carga masiva de productos y precios desde un CSV del proveedor")
+            btn_import.setStyleSheet("padding: 6px;")
+            btn_import.clicked.connect(self.open_import_dialog)
+            header.addWidget(btn_import)
+
+            btn_receive = QPushButton("🚚 Recibir Mercancía")
+            btn_receive.setToolTip("Registrar una nota de entrega completa (escáner o CSV)")
+            btn_receive.setStyleSheet("padding: 6px;")
+            btn_receive.clicked.connect(self.open_receiving_dialog)
+            header.addWidget(btn_receive)
+
+            btn_reorder = QPushButton("🛒 Sugerencia de Compra")
+            btn_reorder.setToolTip("Qué pedir y cuánto, según la velocidad de venta de cada producto")
+            btn_reorder.setStyleSheet("padding: 6px;")
+            btn_reorder.clicked.connect(self.open_reorder_dialog)
+            header.addWidget(btn_reorder)
+
+            btn_valuation = QPushButton("💰 Valoración")
+            btn_valuation.setToolTip("Valor del inventario a costo y a venta, por categoría y vencimiento")
+            btn_valuation.setStyleSheet("padding: 6px;")
+            btn_valuation.clicked.connect(self.open_valuation_dialog)
+            header.addWidget(btn_valuation)
             
         layout.addLayout(header)
         
@@ -59,27 +95,29 @@ class InventoryWidget(QWidget):
 
     def load_data(self):
         """Lee la BD y rellena la tabla con SEMÁFORO DE STOCK"""
-        with get_db_session() as session:
-            products = session.query(Product).all()
-            self.table.setRowCount(0)
-            
-            for row, p in enumerate(products):
+        future = get_executor().read(lambda session: InventoryService(session).product_list())
+        when_done(future, self, self.show_products, error_message="Error al cargar el inventario.")
+
+    def show_products(self, products):
+        self.table.setRowCount(0)
+
+        for row, p in enumerate(products):
             self.table.insertRow(row)
-            
+
             # Definimos items
             item_id = QTableWidgetItem(str(p.id))
             item_sku = QTableWidgetItem(p.sku)
             item_name = QTableWidgetItem(p.name)
-            
+
             # Stock Inteligente
-            stock_text = getattr(p, "stock_display", str(p.total_stock))
+            stock_text = p.stock_display
             item_stock = QTableWidgetItem(f"${p.price:.2f} | Stock: {stock_text}")
-            
+
             # --- LÓGICA DEL SEMÁFORO 🚦 ---
             # Color de fondo por defecto (transparente/tema)
             bg_color = None
             text_color = None
-            
+
             if p.total_stock <= STOCK_CRITICO:
                 # ROJO SUAVE (Crítico)
                 bg_color = QColor(COLOR_STOCK_CRITICO)
@@ -88,7 +126,7 @@ class InventoryWidget(QWidget):
                 # AMARILLO SUAVE (Advertencia)
                 bg_color = QColor(COLOR_STOCK_BAJO)
                 text_color = QColor(COLOR_TEXT)
-            
+
             # Aplicar colores a todas las celdas de la fila
             items = [item_id, item_sku, item_name, item_stock]
             for item in items:
@@ -96,33 +134,33 @@ class InventoryWidget(QWidget):
                     item.setBackground(bg_color)
                 if text_color:
                     item.setForeground(text_color)
-            
+
             self.table.setItem(row, 0, item_id)
             self.table.setItem(row, 1, item_sku)
             self.table.setItem(row, 2, item_name)
             self.table.setItem(row, 3, item_stock)
-            
+
             # Botones de Acción (Admin) - Se mantienen igual
             if self.user_role == "admin":
                 actions_widget = QWidget()
                 actions_layout = QHBoxLayout(actions_widget)
                 actions_layout.setContentsMargins(2, 2, 2, 2)
-                
+
                 # Re-creamos los botones igual que antes...
                 btn_batch = QPushButton("📅")
                 btn_batch.setStyleSheet("background-color: #6c757d; color: white;")
                 btn_batch.setToolTip("Lotes / Vencimiento")
                 btn_batch.clicked.connect(lambda _, pid=p.id: self.open_batch_dialog(pid))
-                
+
                 btn_edit = QPushButton("✏️")
                 btn_edit.setToolTip("Editar Producto")
                 btn_edit.clicked.connect(lambda _, pid=p.id: self.open_product_dialog(pid))
-                
+
                 btn_del = QPushButton("🗑️")
                 btn_del.setStyleSheet("color: red;")
                 btn_del.setToolTip("Borrar Producto")
                 btn_del.clicked.connect(lambda _, pid=p.id: self.delete_product(pid))
-                
+
                 actions_layout.addWidget(btn_batch)
                 actions_layout.addWidget(btn_edit)
                 actions_layout.addWidget(btn_del)
@@ -142,26 +180,41 @@ class InventoryWidget(QWidget):
         if dialog.exec(): 
             self.load_data()
 
+    def open_import_dialog(self):
+        dialog = ImportCatalogDialog(self)
+        if dialog.exec():
+            self.load_data()
+
+    def open_receiving_dialog(self):
+        dialog = ReceivingDialog(self)
+        if dialog.exec():
+            self.load_data()
+
+    def open_reorder_dialog(self):
+        ReorderDialog(self).exec()
+
+    def open_valuation_dialog(self):
+        ValuationDialog(self).exec()
+
     def delete_product(self, pid):
         confirm = QMessageBox.question(self, "Confirmar", "¿Eliminar producto?", 
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if confirm == QMessageBox.StandardButton.Yes:
-            try:
-                with get_db_session() as session:
-                    product = session.get(Product, pid)
-                    if product:
-                        session.delete(product)
-                    else:
-                        QMessageBox.warning(self, "Error", "Producto no encontrado")
-                        return
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error al eliminar producto: {str(e)}")
-                return
-            self.load_data()
+            future = get_executor().write(lambda session: InventoryService(session).delete_product(pid))
+            when_done(future, self, lambda deleted: self.product_deleted(pid, deleted),
+                      lambda e: QMessageBox.critical(self, "Error", f"Error al eliminar producto: {str(e)}"))
+
+    def product_deleted(self, pid, deleted):
+        if not deleted:
+            QMessageBox.warning(self, "Error", "Producto no encontrado")
+            return
+        get_search_index().remove_product(pid)
+        invalidate_category_counts()
+        self.load_data()
             
 # --- CLASE PRINCIPAL ---
 class MainWindow(QMainWindow):
-    def __init__(self, user_role="vendedor", user_name="Usuario"):
+    def __init__(self, user_role="vendedor", user_name="Usuario", catalog=None):
         super().__init__()
         self.user_role = user_role
         self.setWindowTitle(f"PharmGest ERP - Usuario: {user_name} ({user_role.upper()})")
@@ -171,7 +224,7 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.tabs)
         
         # 1. POS
-        self.pos_widget = POSWidget()
+        self.pos_widget = POSWidget(catalog=catalog)
         self.tabs.addTab(self.pos_widget, "💰 Punto de Venta")
         
         # 2. INVENTARIO (Aquí es donde fallaba antes)
@@ -180,10 +233,57 @@ class MainWindow(QMainWindow):
         
         # 3. HISTORIAL (SOLO ADMIN)
         if self.user_role == "admin":
-            self.history_widget = SalesHistoryWidget()
+            self.history_widget = SalesHistoryWidget(user_name=user_name)
             self.tabs.addTab(self.history_widget, "📊 Historial de Ventas")
+            self.search_widget = SaleSearchWidget(user_name=user_name)
+            self.tabs.addTab(self.search_widget, "🔎 Buscar Ventas")
         
         self.tabs.currentChanged.connect(self.refresh_tabs)
+        
+        # MANTENIMIENTO DE BD (checkpoints, optimize, respaldos) en segundo plano
+        self.maintenance = MaintenanceScheduler(self)
+        if self.user_role == "admin":
+            self.lbl_db_status = QLabel("")
+            self.statusBar().addPermanentWidget(self.lbl_db_status)
+            self.maintenance.metrics_updated.connect(self.show_db_metrics)
+            
+            # Perfilado bajo demanda (cProfile del hilo de la interfaz)
+            self.btn_profile = QPushButton("⏺ Perfilar")
+            self.btn_profile.setCheckable(True)
+            self.btn_profile.setChecked(is_profiling())
+            self.btn_profile.setToolTip("Graba un perfil de rendimiento hasta volver a presionar")
+            self.btn_profile.toggled.connect(self.toggle_profiling)
+            self.statusBar().addPermanentWidget(self.btn_profile)
+
+    def show_db_metrics(self, metrics):
+        text = f"WAL: {metrics['wal_bytes'] / 1024:,.0f} KB"
+        last = metrics["ultimo_checkpoint"]
+        if last:
+            text += (f" | Último checkpoint {last['modo']} {last['fecha'].strftime('%H:%M')}: "
+                     f"{last['frames_movidos']} frames en {last['duracion_ms']:.0f} ms")
+        self.lbl_db_status.setText(text)
+
+    def toggle_profiling(self, checked):
+        if checked:
+            start_profiling()
+            self.btn_profile.setText("⏹ Detener perfil")
+            return
+        self.btn_profile.setText("⏺ Perfilar")
+        try:
+            path = stop_profiling()
+        except OSError as e:
+            logger.error(f"No se pudo guardar el perfil: {e}", exc_info=True)
+            QMessageBox.warning(self, "Perfil", f"No se pudo guardar el perfil.\n{e}")
+            return
+        if path:
+            QMessageBox.information(self, "Perfil guardado",
+                                    f"Perfil guardado en:\n{os.path.abspath(path)}\n\n"
+                                    "Resumen legible en el archivo .txt del mismo nombre y "
+                                    "consultas SQL por acción en el _sql.txt.")
+
+    def closeEvent(self, event):
+        self.maintenance.shutdown()
+        super().closeEvent(event)
 
     def refresh_tabs(self, index):
         current_widget = self.tabs.currentWidget()
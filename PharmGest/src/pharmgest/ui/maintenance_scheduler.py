@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from PyQt6.QtCore import QObject, QTimer, QEvent, pyqtSignal
+from PyQt6.QtWidgets import QApplication
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import (MANT_REVISION_SEGUNDOS, MANT_INACTIVIDAD_SEGUNDOS,
+                                           MANT_WAL_MINIMO_BYTES, MANT_OPTIMIZE_HORAS, HORA_CIERRE_DIA,
+                                           MANT_REINTENTO_CIERRE_MINUTOS,
+                                           BACKUP_AUTOMATICO, BACKUP_INTERVALO_MINUTOS)
+from src.pharmgest.services.backup import run_backup
+from src.pharmgest.services.invoice import organize_invoices
+from src.pharmgest.services.ncf import void_expired_ncf
+from src.pharmgest.services.sale_queue import release_ncf_blocks
+from src.pharmgest.services.stock_ledger import snapshot_stock
+from src.pharmgest.services.valuation import store_daily_valuation
+from src.pharmgest.services.z_report import store_z_report, last_closed_day, save_closed_day
+from src.pharmgest.services.maintenance import (checkpoint, optimize, day_close_maintenance,
+                                                wal_size_bytes, get_metrics)
+
+# Cierre del día: foto del stock, valoración y reporte Z de cada día que se cierra, NCF sin
+# usar devueltos y vencidos anulados, checkpoint TRUNCATE + ANALYZE y ordenar/empaquetar facturas
+DAILY_CLOSE_TASKS = [store_daily_valuation, store_z_report]
+CLOSE_TASKS = [release_ncf_blocks, void_expired_ncf, day_close_maintenance, organize_invoices]
+
+def day_close_tasks(days):
+    """Tareas del cierre de `days`: las diarias una vez por día, el resto una sola vez"""
+    return ([snapshot_stock] + [partial(task, day) for day in days for task in DAILY_CLOSE_TASKS]
+            + CLOSE_TASKS)
+
+def task_name(task):
+    if isinstance(task, partial):
+        return f"{task_name(task.func)}({', '.join(map(str, task.args))})"
+    return getattr(task, "__name__", repr(task))
+
+def due_close_day(now):
+    """Último día que ya debería estar cerrado a la hora `now`"""
+    return now.date() if now.hour >= HORA_CIERRE_DIA else now.date() - timedelta(days=1)
+
+# Eventos que cuentan como "el cajero está usando la caja"
+INPUT_EVENTS = (QEvent.Type.KeyPress, QEvent.Type.MouseButtonPress, QEvent.Type.Wheel)
+
+class MaintenanceScheduler(QObject):
+    """
+    Programa el mantenimiento de la BD sin congelar la interfaz:
+    checkpoints pasivos cuando la caja está inactiva, foto y valoración del stock,
+    reporte Z, NCF, TRUNCATE + ANALYZE y empaquetado de facturas al cierre del día,
+    PRAGMA optimize periódico y respaldos automáticos.
+    Las tareas corren en un hilo aparte; las métricas se emiten al terminar.
+    El día queda cerrado cuando todas sus tareas terminan bien: las que
+    fallan se reintentan cada MANT_REINTENTO_CIERRE_MINUTOS. Al abrir, los días
+    que quedaron sin cerrar (la caja se apagó antes de HORA_CIERRE_DIA) se
+    cierran en ese momento.
+    """
+    metrics_updated = pyqtSignal(dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        now = time.monotonic()
+        self.last_input = now
+        self.last_optimize = now
+        self.last_backup = now
+        # Sin cierres anteriores no hay atrasados: el primero es el de hoy
+        self.last_day_close = last_closed_day() or datetime.now().date() - timedelta(days=1)
+        self.close_day = None       # Último día del cierre en curso
+        self.close_pending = []     # Tareas de ese cierre que todavía no terminaron bien
+        self.close_retry_at = 0.0
+        self.busy = False
+
+        QApplication.instance().installEventFilter(self)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(MANT_REVISION_SEGUNDOS * 1000)
+        QTimer.singleShot(0, self.tick)  # Cierres atrasados sin esperar la primera revisión
+
+    def eventFilter(self, obj, event):
+        if event.type() in INPUT_EVENTS:
+            self.last_input = time.monotonic()
+        return False
+
+    def is_idle(self):
+        return time.monotonic() - self.last_input >= MANT_INACTIVIDAD_SEGUNDOS
+
+    def tick(self):
+        if self.busy:
+            return
+        now = time.monotonic()
+        tasks = []
+
+        due = due_close_day(datetime.now())
+        on_done = None
+        if self.last_day_close < due:
+            if self.close_day != due:
+                self.start_day_close(due)
+            if now >= self.close_retry_at:
+                tasks += self.close_pending
+                on_done = self.day_close_done
+        elif self.is_idle() and wal_size_bytes() >= MANT_WAL_MINIMO_BYTES:
+            tasks.append(lambda: checkpoint("PASSIVE"))
+
+        if now - self.last_optimize >= MANT_OPTIMIZE_HORAS * 3600:
+            self.last_optimize = now
+            tasks.append(optimize)
+
+        if BACKUP_AUTOMATICO and now - self.last_backup >= BACKUP_INTERVALO_MINUTOS * 60:
+            self.last_backup = now
+            tasks.append(run_backup)
+
+        if tasks:
+            self.run_in_background(tasks, on_done)
+        else:
+            self.metrics_updated.emit(get_metrics())
+
+    def run_day_close_now(self):
+        """
+        Cierre del día manual (mismo trabajo que el automático de HORA_CIERRE_DIA).
+        Retorna False si ya hay mantenimiento corriendo: no se lanzan dos a la vez.
+        """
+        if self.busy:
+            return False
+        self.start_day_close(datetime.now().date())
+        self.run_in_background(self.close_pending, self.day_close_done)
+        return True
+
+    def start_day_close(self, day):
+        """Cierre de los días después del último cerrado hasta `day` (o solo `day` si ya estaba)"""
+        first = min(self.last_day_close + timedelta(days=1), day)
+        days = [first + timedelta(days=n) for n in range((day - first).days + 1)]
+        if len(days) > 1:
+            logger.warning(f"Cierres atrasados: del {first:%d/%m/%Y} al {day:%d/%m/%Y}")
+        self.close_day = day
+        self.close_pending = day_close_tasks(days)
+        self.close_retry_at = 0.0
+
+    def day_close_done(self, failed):
+        """Corre en el hilo de mantenimiento: el día se cierra solo si no falló ninguna tarea"""
+        self.close_pending = [task for task in self.close_pending if task in failed]
+        if self.close_pending:
+            self.close_retry_at = time.monotonic() + MANT_REINTENTO_CIERRE_MINUTOS * 60
+            logger.warning(f"Cierre del día {self.close_day:%d/%m/%Y} incompleto, se reintenta en "
+                           f"{MANT_REINTENTO_CIERRE_MINUTOS} min: {', '.join(task_name(t) for t in self.close_pending)}")
+        else:
+            self.last_day_close = self.close_day
+            try:
+                save_closed_day(self.close_day)
+            except OSError as e:
+                logger.warning(f"No se pudo guardar la marca del cierre del {self.close_day:%d/%m/%Y}: {e}")
+
+    def run_in_background(self, tasks, on_done=None):
+        """Corre las tareas en orden; si una falla se registra y siguen las demás. on_done(fallidas) al terminar."""
+        self.busy = True
+        tasks = list(tasks)
+
+        def worker():
+            failed = []
+            try:
+                for task in tasks:
+                    try:
+                        task()
+                    except Exception as e:
+                        failed.append(task)
+                        logger.error(f"Error en tarea de mantenimiento {task_name(task)}: {e}", exc_info=True)
+                if on_done:
+                    on_done(failed)
+            finally:
+                self.busy = False
+                self.metrics_updated.emit(get_metrics())
+
+        threading.Thread(target=worker, name="pharmgest-mantenimiento", daemon=True).start()
+
+    def shutdown(self):
+        """Al cerrar la app: SQLite recomienda PRAGMA optimize antes de cerrar conexiones"""
+        self.timer.stop()
+        QApplication.instance().removeEventFilter(self)
+        try:
+            optimize()
+        except Exception as e:
+            logger.warning(f"No se pudo ejecutar PRAGMA optimize al cerrar: {e}")
@@ -1,21 +1,83 @@
 import os
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, 
                            QTableWidget, QTableWidgetItem, QPushButton, QLabel, 
-                           QHeaderView, QMessageBox, QInputDialog)
-from PyQt6.QtCore import Qt
-from src.pharmgest.config.database import SessionLocal
-from src.pharmgest.database.models import Product, Sale, SaleDetail, ProductBatch
-from src.pharmgest.services.invoice import generate_invoice_pdf
+                           QHeaderView, QMessageBox, QInputDialog, QListWidget, QListWidgetItem)
+from PyQt6.QtCore import Qt, QTimer
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.database.models import Product
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import INVOICE_MODO, COLA_REINTENTO_SEG, MAX_RESULTS_PER_PAGE
+from src.pharmgest.services.categories import category_counts, products_in_category
+from src.pharmgest.services.invoice import generate_invoice_pdf, get_invoice_file
+from src.pharmgest.services.receipt import print_receipt
+from src.pharmgest.services.sale_queue import get_sale_queue, PENDING
+from src.pharmgest.services.sales import SalesService
+from src.pharmgest.ui.db_tasks import when_done
+
+# Elemento "Todos los productos" del panel de categorías (None = sin categoría)
+ALL_PRODUCTS = "todos"
+
+
+def save_and_print(lines, total, amount_paid, change):
+    """
+    Corre en el hilo de la caja: guarda la venta en la cola local e imprime el
+    ticket (ESC/POS). Retorna (entrada, error de la impresora o None): si la
+    impresora falla, la venta ya está guardada.
+    """
+    entry = get_sale_queue().enqueue(lines)
+    try:
+        print_receipt(entry["number"], entry["items"], total, sale_date=entry["created_at"],
+                      amount_paid=amount_paid, change=change, ncf=entry["ncf"])
+    except OSError as e:
+        logger.warning(f"No se pudo imprimir el ticket de la venta {entry['number']}: {e}")
+        return entry, e
+    return entry, None
+
+
+def store_invoices(entries):
+    """Corre en el hilo de la caja: guarda el PDF de las ventas que ya llegaron a la BD principal"""
+    for entry in entries:
+        generate_invoice_pdf(entry["sale_id"], entry["items"], entry["total"], sale_date=entry["created_at"],
+                             ncf=entry["ncf"])
+
 
 class POSWidget(QWidget):
-    def __init__(self):
+    def __init__(self, catalog=None):
         super().__init__()
         self.cart = [] 
+        self.search_seq = 0
+        # Categoría que se está navegando y última fila cargada (nombre, id) para la página siguiente
+        self.category = ALL_PRODUCTS
+        self.category_after = None
+        # Catálogo precargado durante el login (filas con los mismos atributos que Product)
+        self.preloaded_catalog = catalog
+        # Ventas cobradas que todavía no llegan a la BD principal (cola local)
+        self.queued = 0
+        self.invoice_wanted = None
         self.init_ui()
+        when_done(get_executor().local(lambda: get_sale_queue().counts().get(PENDING, 0)), self,
+                  self.queue_counted, lambda e: logger.warning(f"No se pudo leer la cola de ventas: {e}", exc_info=e))
+
+        # Lo que quedó en cola (de esta sesión o de una anterior) se reintenta solo
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.retry_sync)
+        self.sync_timer.start(COLA_REINTENTO_SEG * 1000)
+        self.retry_sync()
+        # NCF listos antes de la primera venta (reserva un bloque si la caja tiene pocos)
+        when_done(get_executor().write(get_sale_queue().sync_ncf), self, lambda _: None,
+                  lambda e: logger.warning(f"No se pudieron reservar NCF al iniciar: {e}"))
 
     def init_ui(self):
         main_layout = QHBoxLayout(self)
 
+        # --- PANEL DE CATEGORÍAS ---
+        category_panel = QWidget()
+        category_layout = QVBoxLayout(category_panel)
+        self.category_list = QListWidget()
+        self.category_list.itemClicked.connect(self.select_category)
+        category_layout.addWidget(QLabel("📂 Categorías:"))
+        category_layout.addWidget(self.category_list)
+
         # --- IZQUIERDA: BUSCADOR ---
         left_panel = QWidget()
         left_layout = QVBoxLayout(left_panel)
@@ -32,10 +94,15 @@ class POSWidget(QWidget):
         self.results_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
         self.results_table.setColumnHidden(0, True)
         self.results_table.doubleClicked.connect(self.add_to_cart)
+
+        self.btn_more = QPushButton("⬇ Más resultados")
+        self.btn_more.clicked.connect(self.load_category_page)
+        self.btn_more.hide()
         
         left_layout.addWidget(lbl_search)
         left_layout.addWidget(self.search_input)
         left_layout.addWidget(self.results_table)
+        left_layout.addWidget(self.btn_more)
         
         # --- DERECHA: CARRITO ---
         right_panel = QWidget()
@@ -54,6 +121,11 @@ class POSWidget(QWidget):
         self.lbl_total.setStyleSheet("font-size: 30px; font-weight: bold; color: #28a745; margin: 10px;")
         self.lbl_total.setAlignment(Qt.AlignmentFlag.AlignRight)
         
+        self.lbl_queue = QLabel()
+        self.lbl_queue.setStyleSheet("color: #d9822b; font-weight: bold;")
+        self.lbl_queue.setAlignment(Qt.AlignmentFlag.AlignRight)
+        self.lbl_queue.hide()
+        
         btn_pay = QPushButton("💸 COBRAR / PAGAR")
         btn_pay.setStyleSheet("background-color: #0078D7; color: white; padding: 15px; font-size: 16px; font-weight: bold;")
         btn_pay.clicked.connect(self.process_sale)
@@ -61,23 +133,93 @@ class POSWidget(QWidget):
         right_layout.addWidget(lbl_cart)
         right_layout.addWidget(self.cart_table)
         right_layout.addWidget(self.lbl_total)
+        right_layout.addWidget(self.lbl_queue)
         right_layout.addWidget(btn_pay)
 
-        main_layout.addWidget(left_panel, 6)
+        main_layout.addWidget(category_panel, 2)
+        main_layout.addWidget(left_panel, 5)
         main_layout.addWidget(right_panel, 4)
         
         self.search_product()
+        self.load_categories()
+
+    def load_categories(self):
+        """Conteos por categoría (en caché: solo se recuentan si cambió el inventario)"""
+        future = get_executor().read(category_counts)
+        when_done(future, self, self.show_categories, error_message="Error al cargar las categorías.")
+
+    def show_categories(self, categories):
+        self.category_list.clear()
+        item = QListWidgetItem("Todos los productos")
+        item.setData(Qt.ItemDataRole.UserRole, ALL_PRODUCTS)
+        self.category_list.addItem(item)
+        for category in categories:
+            item = QListWidgetItem(f"{category['name']} ({category['products']} · "
+                                   f"{category['in_stock']} con stock)")
+            item.setData(Qt.ItemDataRole.UserRole, category["id"])
+            self.category_list.addItem(item)
+            if category["id"] == self.category:
+                self.category_list.setCurrentItem(item)
+
+    def select_category(self, item):
+        self.search_input.clear()
+        self.category = item.data(Qt.ItemDataRole.UserRole)
+        self.refresh_results()
+
+    def refresh_results(self):
+        """Vuelve a cargar lo que se está viendo: la búsqueda o la primera página de la categoría"""
+        if self.category == ALL_PRODUCTS:
+            self.search_product()
+        else:
+            self.category_after = None
+            self.load_category_page()
+
+    def load_category_page(self):
+        self.search_seq += 1
+        seq = self.search_seq
+        category_id, after = self.category, self.category_after
+        future = get_executor().read(lambda session: products_in_category(session, category_id, after))
+        when_done(future, self, lambda products: self.show_category_page(seq, products, after is not None),
+                  error_message="Error al cargar los productos de la categoría.")
+
+    def show_category_page(self, seq, products, append):
+        if seq != self.search_seq:
+            return
+        self.fill_results(products, append)
+        if products:
+            self.category_after = (products[-1].name, products[-1].id)
+        self.btn_more.setVisible(len(products) == MAX_RESULTS_PER_PAGE)
 
     def search_product(self):
         query_text = self.search_input.text()
-        session = SessionLocal()
-        query = session.query(Product)
+        # Una búsqueda escrita es sobre todo el catálogo
         if query_text:
-            query = query.filter(Product.name.ilike(f"%{query_text}%") | Product.sku.ilike(f"%{query_text}%"))
-        products = query.all()
+            self.category = ALL_PRODUCTS
+            self.category_list.clearSelection()
+        self.btn_more.hide()
+        
+        # Primera carga: usar el catálogo precargado y no tocar la BD
+        if not query_text and self.preloaded_catalog is not None:
+            products, self.preloaded_catalog = self.preloaded_catalog, None
+            self.fill_results(products)
+            return
         
-        self.results_table.setRowCount(0)
-        for row, p in enumerate(products):
+        # Si llegan respuestas desordenadas (Enter varias veces), solo vale la última
+        self.search_seq += 1
+        seq = self.search_seq
+        future = get_executor().read(lambda session: SalesService(session).search_products(query_text))
+        when_done(future, self, lambda products: self.show_search_results(seq, products),
+                  error_message="Error al buscar productos.")
+
+    def show_search_results(self, seq, products):
+        if seq == self.search_seq:
+            self.fill_results(products)
+
+    def fill_results(self, products, append=False):
+        """Pinta las filas; con `append` las agrega debajo (página siguiente)"""
+        first = self.results_table.rowCount() if append else 0
+        self.results_table.setRowCount(first)
+        for row, p in enumerate(products, start=first):
             self.results_table.insertRow(row)
             self.results_table.setItem(row, 0, QTableWidgetItem(str(p.id)))
             self.results_table.setItem(row, 1, QTableWidgetItem(p.name))
@@ -90,19 +232,22 @@ class POSWidget(QWidget):
             
             # FIX 1: Mostrar siempre el stock global real
             self.results_table.setItem(row, 3, QTableWidgetItem(str(p.total_stock)))
-            
-        session.close()
 
     def add_to_cart(self):
         row = self.results_table.currentRow()
         if row < 0: return
         
         product_id = int(self.results_table.item(row, 0).text())
-        session = SessionLocal()
-        product = session.query(Product).get(product_id)
-        
+        future = get_executor().read(lambda session: session.get(Product, product_id))
+        when_done(future, self, self.choose_quantity, error_message="Error al cargar el producto.")
+
+    def choose_quantity(self, product):
+        """Modo de venta y cantidad (la sesión ya está cerrada: los diálogos no retienen la BD)"""
+        if product is None:
+            QMessageBox.warning(self, "Error", "Producto no encontrado")
+            return
+
         is_box_mode = True 
-        final_price = product.price
         
         # FIX 2: Verificar si es fraccionable y mostrar diálogo de elección
         if product.is_fractionable:
@@ -112,46 +257,19 @@ class POSWidget(QWidget):
                 items, 0, False)
             
             if not ok: 
-                session.close()
                 return
             
-            if "UNIDAD" in item:
-                is_box_mode = False
-                final_price = product.unit_price
-            else:
-                final_price = product.box_price
+            is_box_mode = "UNIDAD" not in item
 
-        # Calcular Stock Máximo
-        if is_box_mode:
-            if product.is_fractionable and product.units_per_box > 0:
-                max_stock = product.total_stock // product.units_per_box
-            else:
-                max_stock = product.total_stock # Si no es fraccionable, se asume que el stock total es de cajas
-        else:
-            max_stock = product.total_stock # Venta por unidad
+        max_stock = SalesService.max_quantity(product, is_box_mode)
 
         # Diálogo de cantidad con texto dinámico
         label_unit = "Cajas" if is_box_mode else "Unidades"
         qty, ok = QInputDialog.getInt(self, "Cantidad", f"¿Cuántas {label_unit}?", 1, 1, max_stock)
         
         if ok:
-            subtotal = final_price * qty
-            units_to_deduct = qty
-            if is_box_mode and product.is_fractionable:
-                units_to_deduct = qty * product.units_per_box
-            
-            self.cart.append({
-                "id": product.id,
-                "name": f"{product.name} ({'CAJA' if is_box_mode else 'UNIDAD'})",
-                "price": final_price,
-                "qty": qty,
-                "units_to_deduct": units_to_deduct,
-                "subtotal": subtotal,
-                "is_box_sale": is_box_mode
-            })
+            self.cart.append(SalesService.build_line(product, qty, is_box_mode))
             self.update_cart_ui()
-            
-        session.close()
 
     def remove_from_cart(self, index):
         self.cart.pop(index)
@@ -195,90 +313,128 @@ class POSWidget(QWidget):
             
         change = amount_paid - total
         
-        print("--- INICIANDO PROCESO DE VENTA ---") # Debug
-
-        session = SessionLocal()
-        try:
-            print("1. Creando venta...")
-            new_sale = Sale(total=total)
-            session.add(new_sale)
-            session.flush()
-            
-            print("2. Procesando productos...")
-            for item in self.cart:
-                product = session.query(Product).get(item["id"])
-                qty_needed = item["units_to_deduct"]
-                
-                if product.total_stock < qty_needed:
-                    raise Exception(f"Stock insuficiente para {product.name}. (Tienes {product.total_stock}, pides {qty_needed})")
-                
-                product.total_stock -= qty_needed
-                
-                # Algoritmo FEFO
-                batches = session.query(ProductBatch).filter(
-                    ProductBatch.product_id == product.id,
-                    ProductBatch.stock > 0
-                ).order_by(ProductBatch.expiry_date).all()
-                
-                remaining_to_deduct = qty_needed
-                for batch in batches:
-                    if remaining_to_deduct <= 0: break
-                    if batch.stock >= remaining_to_deduct:
-                        batch.stock -= remaining_to_deduct
-                        remaining_to_deduct = 0
-                    else:
-                        remaining_to_deduct -= batch.stock
-                        batch.stock = 0
-                
-                # Crear detalle (Asegúrate que tu BD tenga la columna is_box_sale)
-                detail = SaleDetail(
-                    sale_id=new_sale.id, 
-                    product_id=product.id,
-                    quantity=item["qty"], 
-                    unit_price=item["price"],
-                    subtotal=item["subtotal"],
-                    is_box_sale=item["is_box_sale"]
-                )
-                session.add(detail)
-            
-            print("3. Guardando en Base de Datos (Commit)...")
-            session.commit()
-            print("✅ Venta Guardada Exitosamente.")
-            
-            # Generar PDF
-            print("4. Generando PDF...")
-            pdf_path = generate_invoice_pdf(new_sale.id, self.cart, total)
-            
-            # Mensaje de Éxito
-            msg = (f"✅ Venta #{new_sale.id} registrada.\n\n"
-                   f"💰 Recibido: ${amount_paid:,.2f}\n"
-                   f"💵 SU CAMBIO: ${change:,.2f}\n\n"
-                   f"¿Ver Factura?")
-                   
-            reply = QMessageBox.question(self, "Venta Exitosa", msg,
-                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-            
-            if reply == QMessageBox.StandardButton.Yes:
-                print(f"5. Intentando abrir PDF: {pdf_path}")
-                try:
-                    os.startfile(os.path.abspath(pdf_path))
-                except Exception as e_pdf:
-                    print(f"⚠️ Error al abrir PDF: {e_pdf}")
-                    QMessageBox.warning(self, "Aviso", f"La venta se hizo, pero no se pudo abrir el PDF automáticamente.\nError: {e_pdf}")
-
-            # Limpieza
-            self.cart = []
-            self.update_cart_ui()
-            self.search_product()
-            
-        except Exception as e:
-            session.rollback()
-            print(f"❌ ERROR CRÍTICO: {str(e)}")
-            # Si el error es de columnas faltantes, damos una pista clara
-            if "no column" in str(e) or "no such table" in str(e):
-                QMessageBox.critical(self, "Error de Base de Datos", 
-                    f"Tu base de datos está desactualizada.\n\nSOLUCIÓN: Borra el archivo 'pharmgest.db' y reinicia el programa.\n\nDetalle: {e}")
-            else:
-                QMessageBox.critical(self, "Error en Venta", f"Ocurrió un error:\n{str(e)}")
-        finally:
-            session.close()
\ No newline at end of file
+        # La venta se guarda primero en la cola local de la caja (disco local, en el hilo
+        # de la caja): cobrar no depende de que la BD compartida esté libre o accesible.
+        # El carrito se vacía ya; si no se pudo guardar, vuelve
+        lines = list(self.cart)
+        self.cart = []
+        self.update_cart_ui()
+        future = get_executor().local(save_and_print, lines, total, amount_paid, change)
+        when_done(future, self, lambda saved: self.sale_saved(*saved, amount_paid, change),
+                  lambda e: self.sale_failed(lines, e))
+
+    def sale_failed(self, lines, e):
+        logger.error(f"No se pudo guardar la venta en la cola local: {e}", exc_info=e)
+        self.cart = lines + self.cart
+        self.update_cart_ui()
+        QMessageBox.critical(self, "Error en Venta", f"No se pudo guardar la venta en esta caja.\nError: {e}")
+
+    def sale_saved(self, entry, printer_error, amount_paid, change):
+        self.queued += 1
+        self.update_queue_label()
+        if printer_error is not None:
+            QMessageBox.warning(self, "Impresora",
+                                f"La venta se guardó, pero no se pudo imprimir el ticket.\nError: {printer_error}")
+        self.sync_queue()
+
+        # Mensaje de Éxito
+        msg = (f"✅ Venta {entry['number']} registrada.\n"
+               f"{'NCF: ' + entry['ncf'] if entry['ncf'] else 'Sin NCF (la caja no tiene números)'}\n\n"
+               f"💰 Recibido: ${amount_paid:,.2f}\n"
+               f"💵 SU CAMBIO: ${change:,.2f}\n\n"
+               f"¿Ver Factura?")
+               
+        reply = QMessageBox.question(self, "Venta Exitosa", msg,
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        
+        if reply == QMessageBox.StandardButton.Yes:
+            # La factura lleva el número de la BD principal: se abre cuando la venta llegue
+            # (queue_synced), o ya, si llegó mientras se mostraba el mensaje
+            self.invoice_wanted = entry["client_uuid"]
+            future = get_executor().local(get_sale_queue().entry, entry["client_uuid"])
+            when_done(future, self, self.invoice_entry_loaded, lambda e: None)
+
+    def invoice_entry_loaded(self, synced):
+        if synced["client_uuid"] == self.invoice_wanted and synced["sale_id"] is not None:
+            self.invoice_wanted = None
+            self.open_invoice(synced["sale_id"])
+
+    def queue_counted(self, pending):
+        self.queued += pending
+        self.update_queue_label()
+
+    def sync_queue(self):
+        """Envía la cola local a la BD principal en el hilo de escritura (en orden, idempotente)"""
+        future = get_executor().write(get_sale_queue().replay)
+        when_done(future, self, self.queue_synced, self.queue_sync_failed)
+
+    def retry_sync(self):
+        if self.queued:
+            self.sync_queue()
+
+    def queue_synced(self, result):
+        registered = result["sent"] + result["conflicts"] + result["failed"]
+        self.queued = max(result["pending"], self.queued - len(registered))
+        self.update_queue_label()
+
+        wanted = None
+        for entry in result["sent"] + result["conflicts"]:
+            if entry["client_uuid"] == self.invoice_wanted:
+                self.invoice_wanted = None
+                wanted = entry["sale_id"]
+
+        # Generar PDF en el hilo de la caja (en modo "memoria" no se guarda: se genera desde
+        # la BD al abrirlo). La factura pedida se abre cuando su PDF ya está escrito
+        stored = result["sent"] + result["conflicts"]
+        if INVOICE_MODO == "archivo" and stored:
+            future = get_executor().local(store_invoices, stored)
+            when_done(future, self, lambda _: self.open_invoice(wanted) if wanted else None,
+                      lambda e: self.invoices_failed(e, wanted))
+        elif wanted:
+            self.open_invoice(wanted)
+
+        if registered:
+            self.refresh_results()
+            self.load_categories()
+
+        if result["conflicts"]:
+            detail = "\n".join(f"{e['number']} (#{e['sale_id']}): {e['detail']}" for e in result["conflicts"])
+            QMessageBox.warning(self, "Conflicto de Stock",
+                f"Estas ventas se registraron con faltante de stock. Revise el inventario:\n\n{detail}")
+        if result["failed"]:
+            detail = "\n".join(f"{e['number']}: {e['detail']}" for e in result["failed"])
+            QMessageBox.critical(self, "Error en Venta",
+                f"Estas ventas no se pudieron registrar en la base de datos:\n\n{detail}")
+
+        if self.invoice_wanted and result["pending"]:
+            self.invoice_wanted = None
+            QMessageBox.information(self, "Venta en Cola",
+                "La base de datos no está disponible: la factura se podrá abrir cuando la venta se envíe.")
+
+    def invoices_failed(self, e, wanted):
+        # Sin PDF guardado la factura se genera desde la BD al abrirla
+        logger.warning(f"No se pudieron guardar las facturas de la cola: {e}", exc_info=e)
+        if wanted:
+            self.open_invoice(wanted)
+
+    def queue_sync_failed(self, e):
+        # La venta sigue en la cola local; el temporizador vuelve a intentar
+        logger.warning(f"No se pudo enviar la cola de ventas: {e}", exc_info=e)
+        self.update_queue_label()
+        if self.invoice_wanted:
+            self.invoice_wanted = None
+            QMessageBox.information(self, "Venta en Cola",
+                "La base de datos no está disponible: la factura se podrá abrir cuando la venta se envíe.")
+
+    def update_queue_label(self):
+        self.lbl_queue.setText(f"⏳ {self.queued} venta(s) en cola, sin enviar a la base de datos")
+        self.lbl_queue.setVisible(self.queued > 0)
+
+    def open_invoice(self, sale_id):
+        future = get_executor().read(lambda session: get_invoice_file(sale_id))
+        when_done(future, self, lambda pdf_path: os.startfile(os.path.abspath(pdf_path)),
+                  lambda e_pdf: self.invoice_failed(sale_id, e_pdf))
+
+    def invoice_failed(self, sale_id, e_pdf):
+        logger.warning(f"No se pudo abrir la factura de la venta {sale_id}: {e_pdf}")
+        QMessageBox.warning(self, "Aviso", f"La venta se hizo, pero no se pudo abrir el PDF automáticamente.\nError: {e_pdf}")
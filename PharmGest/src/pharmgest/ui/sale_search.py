@@ -0,0 +1,164 @@
+import time
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+                           QLabel, QLineEdit, QPushButton, QHeaderView, QDateEdit, QCheckBox,
+                           QMessageBox)
+from PyQt6.QtCore import QDate
+from PyQt6.QtGui import QDoubleValidator
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.services.sale_search import search_sales, find_product_ids
+from src.pharmgest.ui.db_tasks import when_done
+from src.pharmgest.ui.dialogs.sale_detail_dialog import open_sale_detail
+
+def fetch_page(session, filters, after):
+    """(filas, siguiente_cursor, ms) de una página. Corre en el hilo de lectura."""
+    start = time.perf_counter()
+    rows, next_cursor = search_sales(session, after=after, **filters)
+    return rows, next_cursor, (time.perf_counter() - start) * 1000
+
+
+class SaleSearchWidget(QWidget):
+    """
+    Buscador de ventas por rango de fechas, NCF, producto y monto.
+    Muestra una página a la vez; "Más resultados" continúa desde la última
+    venta mostrada (paginación por cursor, sin OFFSET).
+    """
+    def __init__(self, user_name=None):
+        super().__init__()
+        self.user_name = user_name
+        self.filters = None
+        self.next_cursor = None
+        layout = QVBoxLayout(self)
+
+        # --- FILTROS ---
+        filters_row = QHBoxLayout()
+
+        self.chk_dates = QCheckBox("Fechas:")
+        self.date_from = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.date_to = QDateEdit(QDate.currentDate())
+        for date_edit in (self.date_from, self.date_to):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("dd/MM/yyyy")
+        filters_row.addWidget(self.chk_dates)
+        filters_row.addWidget(self.date_from)
+        filters_row.addWidget(QLabel("a"))
+        filters_row.addWidget(self.date_to)
+
+        self.input_ncf = QLineEdit()
+        self.input_ncf.setPlaceholderText("NCF (o prefijo)")
+        filters_row.addWidget(self.input_ncf)
+
+        self.input_product = QLineEdit()
+        self.input_product.setPlaceholderText("Producto (nombre o SKU)")
+        filters_row.addWidget(self.input_product)
+
+        self.input_min = QLineEdit()
+        self.input_min.setPlaceholderText("Monto mín.")
+        self.input_max = QLineEdit()
+        self.input_max.setPlaceholderText("Monto máx.")
+        for amount in (self.input_min, self.input_max):
+            amount.setValidator(QDoubleValidator(0, 1e9, 2))
+            amount.setMaximumWidth(100)
+            amount.returnPressed.connect(self.search)
+            filters_row.addWidget(amount)
+
+        for line_edit in (self.input_ncf, self.input_product):
+            line_edit.returnPressed.connect(self.search)
+
+        btn_search = QPushButton("🔎 Buscar")
+        btn_search.setStyleSheet("background-color: #0078D7; color: white; padding: 6px;")
+        btn_search.clicked.connect(self.search)
+        filters_row.addWidget(btn_search)
+        layout.addLayout(filters_row)
+
+        # --- RESULTADOS ---
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["ID", "Fecha", "NCF", "Método de Pago", "Total"])
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.doubleClicked.connect(self.show_details)
+        layout.addWidget(self.table)
+
+        footer = QHBoxLayout()
+        self.lbl_status = QLabel("Defina los filtros y presione Buscar.")
+        footer.addWidget(self.lbl_status)
+        footer.addStretch()
+        self.btn_more = QPushButton("Más resultados ▼")
+        self.btn_more.setEnabled(False)
+        self.btn_more.clicked.connect(self.load_more)
+        footer.addWidget(self.btn_more)
+        layout.addLayout(footer)
+
+    def read_filters(self):
+        """Filtros de la pantalla como argumentos de search_sales (None = sin filtro)"""
+        filters = {}
+        if self.chk_dates.isChecked():
+            filters["date_from"] = self.date_from.date().toPyDate()
+            filters["date_to"] = self.date_to.date().toPyDate()
+        if self.input_ncf.text().strip():
+            filters["ncf"] = self.input_ncf.text()
+        for key, line_edit in (("total_min", self.input_min), ("total_max", self.input_max)):
+            text = line_edit.text().strip().replace(",", ".")
+            if text:
+                filters[key] = float(text)
+        return filters
+
+    def search(self):
+        try:
+            filters = self.read_filters()
+        except ValueError:
+            QMessageBox.warning(self, "Filtro inválido", "Revise los montos.")
+            return
+
+        product_text = self.input_product.text().strip()
+
+        def run(session):
+            if product_text:
+                filters["product_ids"] = find_product_ids(session, product_text)
+                if not filters["product_ids"]:
+                    return None
+            return fetch_page(session, filters, after=None)
+
+        self.btn_more.setEnabled(False)
+        future = get_executor().read(run)
+        when_done(future, self, lambda page: self.show_first_page(filters, product_text, page),
+                  error_message="Ocurrió un error al buscar ventas.")
+
+    def show_first_page(self, filters, product_text, page):
+        self.table.setRowCount(0)
+        if page is None:
+            self.next_cursor = None
+            self.lbl_status.setText(f"Ningún producto coincide con '{product_text}'.")
+            return
+        self.filters = filters
+        self.show_page(page)
+
+    def load_more(self):
+        if self.filters is None or self.next_cursor is None:
+            return
+        self.btn_more.setEnabled(False)
+        future = get_executor().read(fetch_page, self.filters, after=self.next_cursor)
+        when_done(future, self, self.show_page, error_message="Ocurrió un error al buscar ventas.")
+
+    def show_page(self, page):
+        rows, self.next_cursor, elapsed_ms = page
+
+        first = self.table.rowCount()
+        self.table.setRowCount(first + len(rows))
+        for offset, sale in enumerate(rows):
+            row = first + offset
+            self.table.setItem(row, 0, QTableWidgetItem(str(sale.id)))
+            self.table.setItem(row, 1, QTableWidgetItem(sale.date.strftime("%d/%m/%Y %H:%M")))
+            self.table.setItem(row, 2, QTableWidgetItem(sale.ncf or ""))
+            self.table.setItem(row, 3, QTableWidgetItem(sale.payment_method or ""))
+            self.table.setItem(row, 4, QTableWidgetItem(f"${sale.total:,.2f}"))
+
+        self.btn_more.setEnabled(self.next_cursor is not None)
+        more = " (hay más)" if self.next_cursor is not None else ""
+        self.lbl_status.setText(f"{self.table.rowCount()} ventas mostradas{more} — {elapsed_ms:.0f} ms")
+
+    def show_details(self):
+        row = self.table.currentRow()
+        if row < 0:
+            return
+        open_sale_detail(self, int(self.table.item(row, 0).text()), user_name=self.user_name)
@@ -1,16 +1,20 @@
+import os
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
-                           QTableWidgetItem, QLabel, QHeaderView, QFrame, QDialog, QMessageBox)
-from PyQt6.QtCore import Qt
-from sqlalchemy.orm import joinedload
-from sqlalchemy.exc import SQLAlchemyError
-from src.pharmgest.config.database import SessionLocal, get_db_session
+                           QTableWidgetItem, QLabel, QHeaderView, QFrame, QMessageBox,
+                           QPushButton, QDateEdit)
+from PyQt6.QtCore import Qt, QDate
 from src.pharmgest.config.logging_config import logger
 from src.pharmgest.config.settings import PRICE_DECIMALS
-from src.pharmgest.database.models import Sale, SaleDetail, Product
+from src.pharmgest.database.executor import get_executor
+from src.pharmgest.services.reports import ReportService
+from src.pharmgest.services.z_report import store_z_report
+from src.pharmgest.ui.db_tasks import when_done
+from src.pharmgest.ui.dialogs.sale_detail_dialog import open_sale_detail
 
 class SalesHistoryWidget(QWidget):
-    def __init__(self):
+    def __init__(self, user_name=None):
         super().__init__()
+        self.user_name = user_name
         layout = QVBoxLayout(self)
 
         # --- 1. PANEL DE RESUMEN (KPIs) ---
@@ -27,6 +31,19 @@ class SalesHistoryWidget(QWidget):
         
         layout.addLayout(self.stats_layout)
 
+        # Reporte Z (cierre del día) de la fecha elegida
+        z_layout = QHBoxLayout()
+        z_layout.addStretch()
+        z_layout.addWidget(QLabel("Cierre del día:"))
+        self.z_date = QDateEdit(QDate.currentDate())
+        self.z_date.setCalendarPopup(True)
+        self.z_date.setDisplayFormat("dd/MM/yyyy")
+        z_layout.addWidget(self.z_date)
+        self.btn_z = QPushButton("🧾 Reporte Z")
+        self.btn_z.clicked.connect(self.open_z_report)
+        z_layout.addWidget(self.btn_z)
+        layout.addLayout(z_layout)
+
         # --- 2. TABLA DE HISTORIAL ---
         self.table = QTableWidget()
         self.table.setColumnCount(5)
@@ -59,87 +76,40 @@ class SalesHistoryWidget(QWidget):
         return card
 
     def load_history(self):
-        try:
-            with get_db_session() as session:
-                # Optimización: Cargar ventas con detalles y productos en una sola consulta
-                # Evita el problema N+1 de consultas
-                sales = session.query(Sale)\
-                    .options(joinedload(Sale.details).joinedload(SaleDetail.product))\
-                    .order_by(Sale.date.desc())\
-                    .all()
-                
-                self.table.setRowCount(0)
-                total_ventas = 0
-                total_ganancia = 0
-                
-                for row, sale in enumerate(sales):
-                    self.table.insertRow(row)
-                    
-                    # Calcular ganancia de esta venta específica
-                    ganancia_venta = 0
-                    items_names = []
-                    
-                    for detail in sale.details:
-                        # El producto ya está cargado gracias a joinedload
-                        prod = detail.product
-                        if prod:
-                            # --- MEJORA VISUAL: Indicar si fue Caja o Unidad ---
-                            tipo_venta = "Caja" if detail.is_box_sale else "Unid"
-                            items_names.append(f"{prod.name} ({detail.quantity} {tipo_venta})")
-                            
-                            # --- CORRECCIÓN MATEMÁTICA CRÍTICA ---
-                            costo_base = prod.cost if prod.cost else 0
-                            
-                            if detail.is_box_sale:
-                                # Si es venta por CAJA, restamos el costo completo
-                                costo_aplicable = costo_base
-                            else:
-                                # Si es venta por UNIDAD, dividimos el costo entre las unidades que trae la caja
-                                if prod.is_fractionable and prod.units_per_box > 0:
-                                    costo_aplicable = costo_base / prod.units_per_box
-                                else:
-                                    costo_aplicable = costo_base # Evitar división por cero si no está configurado
-                            
-                            # Cálculo: (Precio al que se vendió - Costo real proporcional) * Cantidad
-                            utilidad = (detail.unit_price - costo_aplicable) * detail.quantity
-                            
-                            # Ajuste rápido: Si el costo es 0 (no configurado), marcamos ganancia 0 para alertar
-                            if costo_base == 0:
-                                utilidad = 0 
-                            
-                            ganancia_venta += utilidad
-
-                    # Acumuladores globales
-                    total_ventas += sale.total
-                    total_ganancia += ganancia_venta
-                    
-                    # Llenar celdas
-                    self.table.setItem(row, 0, QTableWidgetItem(str(sale.id)))
-                    self.table.setItem(row, 1, QTableWidgetItem(sale.date.strftime("%d/%m %H:%M")))
-                    self.table.setItem(row, 2, QTableWidgetItem(", ".join(items_names))) # Resumen rápido
-                    self.table.setItem(row, 3, QTableWidgetItem(f"${sale.total:,.2f}"))
-                    
-                    # Columna Ganancia (Colorizada)
-                    item_ganancia = QTableWidgetItem(f"${ganancia_venta:,.2f}")
-                    if ganancia_venta > 0:
-                        item_ganancia.setForeground(Qt.GlobalColor.darkGreen)
-                    elif ganancia_venta < 0:
-                        item_ganancia.setForeground(Qt.GlobalColor.red) # ROJO si hay pérdida real
-                    else:
-                        item_ganancia.setForeground(Qt.GlobalColor.gray) # Gris si es 0 (o falta costo)
-                    self.table.setItem(row, 4, item_ganancia)
-
-                # Actualizar Cards Superiores
-                self.card_total.value_label.setText(f"${total_ventas:,.2f}")
-                self.card_profit.value_label.setText(f"${total_ganancia:,.2f}")
-                self.card_count.value_label.setText(str(len(sales)))
-        except SQLAlchemyError as e:
-            logger.error(f"Error al cargar historial de ventas: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error de Base de Datos", 
-                               "Ocurrió un error al cargar el historial de ventas.")
-        except Exception as e:
-            logger.error(f"Error inesperado al cargar historial: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error", f"Error inesperado: {str(e)}")
+        future = get_executor().read(lambda session: ReportService(session).sales_history())
+        when_done(future, self, self.show_history,
+                  error_message="Ocurrió un error al cargar el historial de ventas.")
+
+    def show_history(self, sales):
+        summary = ReportService.summarize(sales)
+
+        self.table.setRowCount(len(sales))
+        for row, sale in enumerate(sales):
+            self.table.setItem(row, 0, QTableWidgetItem(str(sale.id)))
+            self.table.setItem(row, 1, QTableWidgetItem(sale.date.strftime("%d/%m %H:%M")))
+            self.table.setItem(row, 2, QTableWidgetItem(", ".join(sale.items))) # Resumen rápido
+            self.table.setItem(row, 3, QTableWidgetItem(f"${sale.total:,.2f}"))
+
+            # Columna Ganancia (Colorizada)
+            profit = sale.profit
+            item_ganancia = QTableWidgetItem(f"${profit:,.2f}")
+            if profit > 0:
+                item_ganancia.setForeground(Qt.GlobalColor.darkGreen)
+            elif profit < 0:
+                item_ganancia.setForeground(Qt.GlobalColor.red) # ROJO si hay pérdida real
+            else:
+                item_ganancia.setForeground(Qt.GlobalColor.gray) # Gris si es 0 (o falta costo)
+            self.table.setItem(row, 4, item_ganancia)
+
+            if sale.voided:
+                self.table.item(row, 2).setText("ANULADA - " + self.table.item(row, 2).text())
+                for col in range(self.table.columnCount()):
+                    self.table.item(row, col).setForeground(Qt.GlobalColor.red)
+
+        # Actualizar Cards Superiores
+        self.card_total.value_label.setText(f"${summary['total']:,.2f}")
+        self.card_profit.value_label.setText(f"${summary['profit']:,.2f}")
+        self.card_count.value_label.setText(str(summary['tickets']))
 
     def show_details(self):
         """Muestra el detalle completo de una factura en un diálogo"""
@@ -154,41 +124,20 @@ class SalesHistoryWidget(QWidget):
             QMessageBox.warning(self, "Error", "No se pudo obtener el ID de la venta seleccionada.")
             return
         
-        try:
-            with get_db_session() as session:
-                sale = session.get(Sale, sale_id)
-                
-                if sale is None:
-                    QMessageBox.warning(self, "Error", "Venta no encontrada.")
-                    return
-                
-                dialog = QDialog(self)
-                dialog.setWindowTitle(f"Detalle Factura #{sale_id}")
-                dialog.resize(500, 400)
-                d_layout = QVBoxLayout(dialog)
-                
-                det_table = QTableWidget()
-                det_table.setColumnCount(4)
-                det_table.setHorizontalHeaderLabels(["Cant.", "Producto", "P. Unit", "Subtotal"])
-                det_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
-                
-                det_table.setRowCount(0)
-                for r, det in enumerate(sale.details):
-                    det_table.insertRow(r)
-                    det_table.setItem(r, 0, QTableWidgetItem(str(det.quantity)))
-                    prod_name = det.product.name if det.product else "Producto Eliminado"
-                    det_table.setItem(r, 1, QTableWidgetItem(prod_name))
-                    det_table.setItem(r, 2, QTableWidgetItem(f"${det.unit_price:,.2f}"))
-                    det_table.setItem(r, 3, QTableWidgetItem(f"${det.subtotal:,.2f}"))
-                    
-                d_layout.addWidget(det_table)
-                d_layout.addWidget(QLabel(f"<b>TOTAL FACTURA: ${sale.total:,.2f}</b>"))
-                
-                dialog.exec()
-        except SQLAlchemyError as e:
-            logger.error(f"Error al cargar detalle de venta: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error de Base de Datos", 
-                               "Ocurrió un error al cargar el detalle de la venta.")
-        except Exception as e:
-            logger.error(f"Error inesperado al mostrar detalles: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error", f"Error inesperado: {str(e)}")
\ No newline at end of file
+        open_sale_detail(self, sale_id, user_name=self.user_name, on_voided=self.load_history)
+
+    def open_z_report(self):
+        """Genera el reporte Z del día elegido (en segundo plano) y lo abre"""
+        day = self.z_date.date().toPyDate()
+        self.btn_z.setEnabled(False)
+        future = get_executor().read(lambda session: store_z_report(day))
+        when_done(future, self, self.show_z_report, self.z_report_failed)
+
+    def show_z_report(self, pdf_path):
+        self.btn_z.setEnabled(True)
+        os.startfile(os.path.abspath(pdf_path))
+
+    def z_report_failed(self, e):
+        self.btn_z.setEnabled(True)
+        logger.error(f"Error al generar el reporte Z: {e}", exc_info=e)
+        QMessageBox.warning(self, "Aviso", f"No se pudo generar el reporte Z.\nError: {e}")
@@ -0,0 +1,106 @@
+import linecache
+import os
+import sys
+import threading
+import time
+import traceback
+from PyQt6.QtCore import QObject, QTimer
+from src.pharmgest.config.logging_config import logger
+from src.pharmgest.config.settings import WATCHDOG_UMBRAL_MS, WATCHDOG_LATIDO_MS
+
+# Carpeta del código de la app: para encontrar el manejador culpable en la pila
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class StallWatchdog(QObject):
+    """
+    Detecta congelamientos de la interfaz.
+
+    Un QTimer en el hilo principal marca un "latido" cada WATCHDOG_LATIDO_MS.
+    Un hilo vigilante revisa el último latido: si pasan más de
+    WATCHDOG_UMBRAL_MS sin latir, el bucle de eventos está bloqueado y se
+    captura la pila del hilo principal (sys._current_frames) para registrar
+    qué manejador lo bloquea (load_history, process_sale...).
+    """
+    def __init__(self, parent=None, threshold_ms=WATCHDOG_UMBRAL_MS):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.main_thread_id = threading.main_thread().ident
+        self.last_beat = time.monotonic()
+        self.stalls = 0
+        self.running = True
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.beat)
+        self.timer.start(WATCHDOG_LATIDO_MS)
+
+        self.thread = threading.Thread(target=self.watch, name="pharmgest-watchdog", daemon=True)
+        self.thread.start()
+
+    def beat(self):
+        self.last_beat = time.monotonic()
+
+    def watch(self):
+        check_every = WATCHDOG_LATIDO_MS / 1000 / 2
+        stalled_since = None
+        handler = None
+        while self.running:
+            time.sleep(check_every)
+            blocked = time.monotonic() - self.last_beat
+            if blocked >= self.threshold:
+                if stalled_since is None:
+                    stalled_since = self.last_beat
+                    handler, stack = self.capture_main_stack()
+                    self.stalls += 1
+                    logger.warning(f"Interfaz congelada más de {blocked * 1000:.0f} ms en {handler}\n"
+                                   f"Pila del hilo principal:\n{stack}")
+            elif stalled_since is not None:
+                duration = self.last_beat - stalled_since
+                logger.warning(f"Congelamiento terminado: {duration * 1000:.0f} ms en {handler}")
+                stalled_since = None
+
+    def capture_main_stack(self):
+        """(manejador_culpable, texto_de_la_pila) del hilo principal en este instante"""
+        frame = sys._current_frames().get(self.main_thread_id)
+        if frame is None:
+            return "desconocido", ""
+        summary = traceback.extract_stack(frame)
+        return self.find_handler(frame), "".join(traceback.format_list(summary))
+
+    @staticmethod
+    def find_handler(frame):
+        """
+        Slot o método de la app que Qt llamó y que todavía no devolvió el
+        control: el marco que sigue a la última llamada a .exec() (app.exec o
+        un diálogo modal). Si además está dentro de otra función de la app
+        (p.ej. process_sale -> generate_invoice_pdf) se indican ambas.
+        """
+        app_frames = []
+        while frame is not None:
+            if os.path.abspath(frame.f_code.co_filename).startswith(APP_ROOT):
+                app_frames.append(frame)
+            frame = frame.f_back
+        if not app_frames:
+            return "código externo"
+        app_frames.reverse()  # del más externo al más interno
+
+        handler = None
+        for outer, inner in zip(app_frames, app_frames[1:]):
+            if ".exec(" in linecache.getline(outer.f_code.co_filename, outer.f_lineno):
+                handler = inner
+        innermost = app_frames[-1]
+        handler = handler or innermost  # arranque: todavía no hay bucle de eventos
+
+        text = StallWatchdog.describe(handler)
+        if innermost is not handler:
+            text += f" -> {StallWatchdog.describe(innermost)}"
+        return text
+
+    @staticmethod
+    def describe(frame):
+        code = frame.f_code
+        name = getattr(code, "co_qualname", code.co_name)
+        return f"{name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+    def shutdown(self):
+        self.running = False
+        self.timer.stop()
@@ -0,0 +1,44 @@
+"""
+Las pruebas corren sobre una BD nueva en una carpeta temporal: DB_PATH, el
+archivo y los logs son relativos a la carpeta actual, así que se cambia antes
+de importar la aplicación (la BD real no se toca).
+
+    python -m pytest -q          (desde la carpeta PharmGest)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+FOLDER = tempfile.mkdtemp(prefix="pharmgest_tests_")
+os.chdir(FOLDER)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from src.pharmgest.database.migrations import upgrade_schema
+    upgrade_schema()
+    yield
+    from src.pharmgest.config.database import engine, analytics_engine
+    engine.dispose()
+    analytics_engine.dispose()
+    os.chdir(ROOT)
+    shutil.rmtree(FOLDER, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    """Cada prueba empieza sin ventas, productos, libro de stock ni numeración"""
+    from sqlalchemy import delete
+    from src.pharmgest.config.database import engine
+    from src.pharmgest.database.models import (NcfBlock, NcfSequence, Product, ProductBatch, Sale, SaleDetail,
+                                               SaleVoid, StockMovement, StockSnapshot)
+    with engine.begin() as conn:
+        for model in (SaleVoid, SaleDetail, Sale, StockMovement, StockSnapshot, ProductBatch, Product, NcfBlock,
+                      NcfSequence):
+            conn.execute(delete(model))
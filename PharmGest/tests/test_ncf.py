@@ -0,0 +1,228 @@
+"""
+Numeración fiscal por bloques (services/ncf.py) y su uso desde la cola local
+de la caja (services/sale_queue.py): reservas y cierres concurrentes, envío
+de ventas con faltante o que no se pueden registrar, y una caja que perdió
+su cola local.
+"""
+import threading
+import time
+from datetime import date, datetime
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.exc import OperationalError
+from src.pharmgest.config.database import SessionLocal, engine, get_db_session
+from src.pharmgest.database.models import NcfBlock, NcfSequence, Product, Sale
+from src.pharmgest.services import ncf
+from src.pharmgest.services.inventory import InventoryService
+from src.pharmgest.services.sale_queue import SaleQueue, SENT, CONFLICT, FAILED, install_terminal_id
+from src.pharmgest.services.sales import SalesService
+
+
+def add_sequence(first=1, last=1000):
+    with get_db_session() as session:
+        ncf.add_sequence(session, "B02", first, last, date(2099, 12, 31))
+
+
+def add_product(stock, sku="7501031311309"):
+    with get_db_session() as session:
+        product = Product(sku=sku, name=f"Producto {sku}", price=100.0, cost=60.0, total_stock=0)
+        session.add(product)
+        session.flush()
+        InventoryService(session).add_batch(product.id, "L-1", stock, datetime(2099, 1, 1))
+        return product.id
+
+
+def sale_line(product_id, qty):
+    with get_db_session() as session:
+        return SalesService(session).build_line(session.get(Product, product_id), qty, False)
+
+
+def synced_queue(path, terminal_id="CAJA-A"):
+    queue = SaleQueue(str(path), terminal_id)
+    with get_db_session() as session:
+        queue.sync_ncf(session)
+    return queue
+
+
+def replay(queue):
+    with get_db_session() as session:
+        return queue.replay(session)
+
+
+def voided():
+    with get_db_session() as session:
+        return ncf.voided_ranges(session)
+
+
+def retry_locked(work):
+    """Como la caja: si la BD está ocupada, se reintenta"""
+    while True:
+        session = SessionLocal()
+        try:
+            result = work(session)
+            session.commit()
+            return result
+        except OperationalError:
+            session.rollback()
+            time.sleep(0.005)
+        finally:
+            session.close()
+
+
+@pytest.fixture
+def interleaved():
+    """Una pausa antes de cada sentencia: los hilos se intercalan entre la lectura y la escritura"""
+    def pause(*args):
+        time.sleep(0.001)
+    event.listen(engine, "before_cursor_execute", pause)
+    yield
+    event.remove(engine, "before_cursor_execute", pause)
+
+
+def run_threads(count, target):
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def worker(index):
+        barrier.wait()
+        try:
+            target(index)
+        except Exception as e:  # se revisa en el hilo principal
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_concurrent_reservations_never_overlap(interleaved):
+    add_sequence(1, 10000)
+    reserved = []
+
+    def reserve(index):
+        def work(session):
+            block = ncf.reserve_block(session, f"CAJA-{index}", size=20)
+            return block.terminal_id, block.first_number, block.last_number
+        for _ in range(5):
+            reserved.append(retry_locked(work))
+
+    run_threads(8, reserve)
+
+    ranges = sorted((first, last) for _, first, last in reserved)
+    assert len(ranges) == 40
+    assert ranges == [(n, n + 19) for n in range(1, 801, 20)]
+    with get_db_session() as session:
+        assert session.execute(select(NcfSequence.next_number)).scalar_one() == 801
+        rows = session.execute(select(NcfBlock.terminal_id, NcfBlock.first_number, NcfBlock.last_number)).all()
+    assert sorted(map(tuple, rows)) == sorted(reserved)
+
+
+def test_concurrent_close_releases_the_rest_once(interleaved):
+    add_sequence()
+    with get_db_session() as session:
+        block_id = ncf.reserve_block(session, "CAJA-A", size=50).id
+
+    run_threads(4, lambda index: retry_locked(lambda session: ncf.close_block(session, block_id, 10)))
+
+    with get_db_session() as session:
+        blocks = session.execute(
+            select(NcfBlock.status, NcfBlock.first_number, NcfBlock.last_number).order_by(NcfBlock.id)).all()
+        assert [tuple(row) for row in blocks] == [(ncf.USED, 1, 10), (ncf.RELEASED, 11, 50)]
+        # Otra caja toma los números devueltos antes que el contador
+        block = ncf.reserve_block(session, "CAJA-B")
+        assert (block.first_number, block.last_number, block.terminal_id) == (11, 50, "CAJA-B")
+
+
+def test_replay_registers_conflicts_and_voids_failed_numbers(tmp_path):
+    product_id = add_product(5)
+    add_sequence()
+    queue = synced_queue(tmp_path / "cola.db")
+    sold = queue.enqueue([sale_line(product_id, 2)])
+    short = queue.enqueue([sale_line(product_id, 4)])
+    gone = queue.enqueue([dict(sale_line(product_id, 1), id=999999, name="Producto borrado")])
+    assert [sold["ncf"], short["ncf"], gone["ncf"]] == ["B0200000001", "B0200000002", "B0200000003"]
+
+    result = replay(queue)
+
+    assert [e["client_uuid"] for e in result["sent"]] == [sold["client_uuid"]]
+    assert [e["client_uuid"] for e in result["conflicts"]] == [short["client_uuid"]]
+    assert [e["client_uuid"] for e in result["failed"]] == [gone["client_uuid"]]
+    assert result["pending"] == 0
+    with get_db_session() as session:
+        assert session.execute(select(Sale.ncf).order_by(Sale.id)).scalars().all() == ["B0200000001",
+                                                                                        "B0200000002"]
+        assert session.get(Product, product_id).total_stock == 0
+    # El NCF impreso en el ticket que no se registró queda informado como anulado
+    assert voided() == [("B0200000003", "B0200000003")]
+
+    # Otra pasada no reenvía nada ni lo anula dos veces
+    assert replay(queue) == {"sent": [], "conflicts": [], "failed": [], "pending": 0}
+    with get_db_session() as session:
+        queue.sync_ncf(session)
+    assert voided() == [("B0200000003", "B0200000003")]
+    assert queue.counts() == {SENT: 1, CONFLICT: 1, FAILED: 1}
+    assert queue.take_ncf() == "B0200000004"
+
+
+def test_duplicate_ncf_fails_without_voiding_the_other_sale(tmp_path):
+    product_id = add_product(10)
+    add_sequence()
+    queue = synced_queue(tmp_path / "cola.db")
+    with get_db_session() as session:
+        session.add(Sale(total=1.0, ncf="B0200000001"))
+    entry = queue.enqueue([sale_line(product_id, 1)])
+
+    result = replay(queue)
+
+    assert [e["client_uuid"] for e in result["failed"]] == [entry["client_uuid"]]
+    assert "B0200000001" in result["failed"][0]["detail"]
+    assert voided() == []
+
+
+def test_lost_queue_resumes_after_last_used_number(tmp_path):
+    product_id = add_product(100)
+    add_sequence()
+    queue = synced_queue(tmp_path / "cola.db")
+    for _ in range(3):
+        queue.enqueue([sale_line(product_id, 1)])
+    queue.enqueue([dict(sale_line(product_id, 1), id=999999)])
+    result = replay(queue)
+    assert (len(result["sent"]), len(result["failed"])) == (3, 1)
+
+    # Disco de la caja reemplazado: cola nueva, mismo identificador. Sigue después del
+    # último NCF con venta o anulado, sin reservar otro bloque
+    restored = synced_queue(tmp_path / "nueva" / "cola.db")
+    assert restored.take_ncf() == "B0200000005"
+    with get_db_session() as session:
+        assert session.execute(select(NcfBlock.id).where(NcfBlock.status == ncf.ASSIGNED)).scalars().all() \
+            == [ncf.terminal_blocks(session, "CAJA-A")[0].id]
+
+    # Otra caja no adopta esos números: reserva los suyos
+    other = synced_queue(tmp_path / "otra" / "cola.db", "CAJA-B")
+    assert other.take_ncf() == "B0200000051"
+
+
+def test_return_ncf_gives_back_the_last_number_or_voids_it(tmp_path):
+    add_sequence()
+    queue = synced_queue(tmp_path / "cola.db")
+    first = queue.take_ncf()
+    assert queue.return_ncf(first)
+    assert queue.take_ncf() == first
+
+    queue.take_ncf()
+    # Ya no es el último entregado: no se puede devolver, se informa como anulado
+    assert not queue.return_ncf(first)
+    with get_db_session() as session:
+        queue.sync_ncf(session)
+    assert voided() == [(first, first)]
+
+
+def test_install_terminal_id_is_generated_once_per_folder(tmp_path):
+    (tmp_path / "caja1").mkdir()
+    first = install_terminal_id(str(tmp_path / "caja1" / "cola.db"))
+    assert first.startswith("CAJA-")
+    assert install_terminal_id(str(tmp_path / "caja1" / "cola.db")) == first
+    assert SaleQueue(str(tmp_path / "caja2" / "cola.db")).terminal_id not in (first, None)
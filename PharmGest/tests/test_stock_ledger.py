@@ -0,0 +1,83 @@
+"""
+Stock a una fecha (services/stock_ledger.py): la última foto anterior más los
+movimientos entre esa foto y la siguiente, sin leer el resto del libro.
+"""
+from datetime import datetime
+from sqlalchemy import event
+from src.pharmgest.config.database import engine, get_db_session
+from src.pharmgest.database.models import Product
+from src.pharmgest.services import stock_ledger
+
+
+def add_product(sku="7501031311309"):
+    with get_db_session() as session:
+        product = Product(sku=sku, name=f"Producto {sku}", price=100.0, cost=60.0, total_stock=0)
+        session.add(product)
+        session.flush()
+        return product.id
+
+
+def move(product_id, quantity, day):
+    with get_db_session() as session:
+        stock_ledger.record_movements(session, [{"product_id": product_id, "quantity": quantity,
+                                                 "reason": stock_ledger.ADJUSTMENT,
+                                                 "date": datetime(2026, 3, day, 12)}])
+
+
+def snapshot(day):
+    with get_db_session() as session:
+        stock_ledger.take_snapshots(session, datetime(2026, 3, day, 23))
+
+
+def stock_at(day, hour=23):
+    with get_db_session() as session:
+        return stock_ledger.stock_at(session, datetime(2026, 3, day, hour))
+
+
+def test_stock_at_adds_movements_after_each_products_last_snapshot():
+    product_id = add_product()
+    other_id = add_product("7790001000012")
+    move(product_id, 10, 1)
+    move(other_id, 20, 1)
+    snapshot(1)
+    move(product_id, -3, 2)
+    move(product_id, 5, 3)
+    snapshot(3)  # Solo el primero se movió: el otro sigue con la foto del día 1
+    move(product_id, -4, 4)
+    move(other_id, -2, 4)
+
+    assert stock_at(1) == {product_id: 10, other_id: 20}
+    assert stock_at(2, hour=6) == {product_id: 10, other_id: 20}
+    assert stock_at(2) == {product_id: 7, other_id: 20}
+    assert stock_at(3) == {product_id: 12, other_id: 20}
+    assert stock_at(4) == {product_id: 8, other_id: 18}
+
+
+def test_past_date_reads_only_movements_between_two_snapshots():
+    product_id = add_product()
+    move(product_id, 10, 1)
+    snapshot(1)
+    move(product_id, -3, 2)
+    snapshot(3)
+    # Registrado después de la foto del día 3 con fecha del día 2 (reloj atrasado):
+    # la consulta del día 2 no llega hasta él
+    move(product_id, 100, 2)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        assert stock_at(2) == {product_id: 7}
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    statement, parameters = statements[-1]
+    with engine.connect() as conn:
+        plan = " | ".join(row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement,
+                                                                 parameters))
+    # Búsqueda por índice acotada en los dos extremos, no un recorrido del libro
+    assert "stock_movements USING INDEX ix_stock_movements_product_id_id (product_id=? AND id>? AND id<?)" in plan
+    assert "SCAN stock_snapshots" not in plan